@@ -1,20 +1,41 @@
 import pandas as pd
 
-df = pd.read_parquet("data/interim/spy_eod.parquet")
+from src.loaders import compile_market
 
-# For now, let's focus on *puts* only,
-# and also, for a start, let's not overcomplicate this with the Greeks
+# Both puts and calls (one row per contract, with the quotes of both),
+# and their Greeks, e.g. to pick the contracts by their delta
 
 cols = [
     "[QUOTE_DATE]",
     "[UNDERLYING_LAST]",
     "[EXPIRE_DATE]",
+    "[DTE]",
     "[STRIKE]",
     "[P_BID]",  # assume we always operate on bid/ask prices
     "[P_ASK]",
     "[STRIKE_DISTANCE]",  # okay, perhaps these will be convenient
     "[STRIKE_DISTANCE_PCT]",
 ]
+calls = ["[C_BID]", "[C_ASK]"]
+greeks = [
+    f"[{kind}_{greek}]"
+    for kind in ("P", "C")
+    for greek in ("DELTA", "GAMMA", "THETA", "VEGA", "IV")
+]
+
+df = pd.read_parquet("data/interim/spy_eod", columns=cols + calls + greeks)
+
+# Only the puts are required, same as before the calls were kept: the strikes
+# without a call quote are skipped when opening calls (see `open_order`).
+# The missing Greeks are computed when needed (see HistoricalMarket.chain_greeks)
+df = df.dropna(subset=cols)
+
+# Sorted by date, and in smaller row groups, so that loading
+# a range of dates (see src/loaders.py) can skip most of the file
+df = df.sort_values(["[QUOTE_DATE]", "[STRIKE]", "[EXPIRE_DATE]"], ignore_index=True)
+df.to_parquet("data/processed/spy_eod.parquet", row_group_size=100_000)
 
-df = df[cols].dropna()
-df.to_parquet("data/processed/spy_eod_put.parquet")
+# Also compiled into memory-mappable arrays, indexed by day, for an instant startup.
+# None of the strategies in 3_main.py ever holds anything longer than ~30 days,
+# so there's no need for the long-dated options there.
+compile_market(df[df["[DTE]"] <= 60], "data/processed/spy_eod_60d")
@@ -1,44 +1,68 @@
-import itertools
+import sys
 
-import pandas as pd
-from tqdm import tqdm
+import numpy as np
 
-from src.markets import HistoricalMarket
+from src.accounts import AccountTerms
+from src.loaders import open_market
+from src.metrics import summary
+from src.profiling import Profiler
+from src.store import ResultStore
 from src.strategies import SellMonthlyPuts, SellWeeklyPuts
+from src.sweep import run_sweep
 
-df = pd.read_parquet("data/processed/spy_eod_put.parquet")
 
+def main():
+    # The quotes up to 60 DTE, compiled by 2_select.py (memory-mapped, nothing to load).
+    # Held contracts missing from a day's quotes are priced from its volatility
+    # surface, rather than valued at their intrinsic value.
+    market = open_market("data/processed/spy_eod_60d", surface_fallback=True)
 
-market = HistoricalMarket(
-    quotes_df=df,
-)
+    # The prices are per share, so is the capital: 200 backs a single put,
+    # i.e. 20,000 USD per contract. Reg-T margin, 2% on the cash, and 0.65 USD
+    # per contract in commissions.
+    capital = 200
+    terms = AccountTerms(cash_rate=0.02, margin_rate=0.07, commission=0.0065)
 
-# In a loop, advance the market by one day and run the strategy
-# On each day/trade, calculate the P&L, and keep track of the capital.
-strategies = []
+    # With --profile, time the market and strategies (see src/profiling.py)
+    profiler = Profiler(trace=True) if "--profile" in sys.argv else None
 
-for StrategyClass, ideal_strike, hold_the_strike in itertools.product(
-    [SellWeeklyPuts, SellMonthlyPuts], [0.9, 1.0, 1.1], [False, True]
-):
-    strategies.append(
-        StrategyClass(
-            market,
-            capital=0,
-            ideal_strike=ideal_strike,
-            hold_the_strike=hold_the_strike,
+    # Run every strategy over all days, across all cores.
+    # The results are kept in the store, so next time only the strategies
+    # which are new (or whose code or data changed) are run again.
+    results = run_sweep(
+        market,
+        [SellWeeklyPuts, SellMonthlyPuts],
+        {
+            "ideal_strike": [0.9, 1.0, 1.1],
+            "hold_the_strike": [False, True],
+            "terms": [terms],
+        },
+        capital=capital,
+        store=ResultStore("data/results"),
+        profiler=profiler,
+    )
+
+    print(
+        summary(
+            np.stack(results["equity_curve"].to_list()),
+            dates=market.dates,
+            names=[
+                f"{row.strategy}({row.ideal_strike}{', hold' if row.hold_the_strike else ''})"
+                for row in results.itertuples()
+            ],
         )
     )
 
-for date, price, quotes in (pbar := tqdm(market)):
-    for strategy in strategies:
-        strategy.run()
+    if profiler is not None:
+        print(f"{profiler.days_per_second:,.0f} days/s")
+        print(profiler.summary())
+        print(profiler.strategy_summary())
+        profiler.save_json("data/results/profile.json")
+        # Open in chrome://tracing or https://ui.perfetto.dev
+        profiler.save_trace("data/results/trace.json")
 
-    pbar.set_description(market.current_date.strftime("%Y-%m-%d"))
 
-    pbar.set_postfix(
-        last=market.underlying_last,
-        **{
-            f"{strategy}": strategy.get_current_market_value()
-            for strategy in strategies
-        },
-    )
+# The worker processes import this module too (e.g. with the spawn start method),
+# so the sweep only starts when run as a script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare iterating over HistoricalMarket and ColumnarMarket.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_markets --years 5
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_quotes
+from src.markets import ColumnarMarket, HistoricalMarket
+
+
+def traced(function, *args):
+    """Run a function twice: timed, then again for its peak (traced) memory,
+    since tracing every allocation slows it down.
+
+    :returns: A tuple of (the result of the timed run, seconds, peak memory in MB)
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak / 1024**2
+
+
+def iterate(market):
+    """Iterate over all the days of a market, getting their quotes.
+
+    :returns: The number of days
+    """
+    days = 0
+    for date, price, quotes in market:
+        days += 1
+    return days
+
+
+def measure(MarketClass, quotes_df):
+    """Build the market and iterate over all of its days.
+
+    :returns: A tuple of (seconds, peak memory in MB)
+    """
+    _, elapsed, peak = traced(lambda: iterate(MarketClass(quotes_df)))
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--strikes", type=int, default=50)
+    parser.add_argument("--expiries", type=int, default=8)
+    args = parser.parse_args()
+
+    quotes_df = make_quotes(args.years, args.strikes, args.expiries)
+    print(f"{len(quotes_df):,} quotes, {quotes_df['[QUOTE_DATE]'].nunique():,} days")
+    for MarketClass in (HistoricalMarket, ColumnarMarket):
+        elapsed, peak = measure(MarketClass, quotes_df)
+        print(f"{MarketClass.__name__:>20}: {elapsed:8.3f} s, peak {peak:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
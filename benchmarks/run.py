@@ -0,0 +1,176 @@
+"""
+Benchmark the hot paths of a backtest on synthetic SPY-like quotes.
+
+Run from the root of the repository, e.g.:
+
+    python -m benchmarks.run --years 5 --output benchmarks.json
+
+Each benchmark reports its time, peak (traced) memory and throughput
+(the memory is measured in a second, separate run, see `traced`),
+and the results can be saved as JSON, to compare them between releases.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_markets import iterate, traced
+from benchmarks.synthetic import make_quotes
+from src.markets import ColumnarMarket, HistoricalMarket
+from src.options import Put
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts, get_market_values
+from src.wallet import Position, Wallet
+
+MARKETS = {
+    "historical": HistoricalMarket,
+    "columnar": ColumnarMarket,
+}
+
+# name -> function(quotes_df, MarketClass) -> dict of counts (days, trades, ops)
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+@benchmark
+def market_build(quotes_df, MarketClass):
+    market = MarketClass(quotes_df)
+    return {"days": len(market)}
+
+
+@benchmark
+def market_iteration(quotes_df, MarketClass):
+    return {"days": iterate(MarketClass(quotes_df))}
+
+
+@benchmark
+def sell_to_open(quotes_df, MarketClass):
+    market = MarketClass(quotes_df)
+    days = ops = 0
+    for date, price, quotes in market:
+        days += 1
+        for k in (0.9, 0.95, 1.0):
+            market.sell_to_open(price * k, 7)
+            ops += 1
+    return {"days": days, "trades": ops, "ops": ops}
+
+
+@benchmark
+def buy_sell_lookups(quotes_df, MarketClass):
+    market = MarketClass(quotes_df)
+    days = ops = 0
+    positions = []
+    for date, price, quotes in market:
+        days += 1
+        positions = [p for p in positions if not p.is_expired(date)]
+        positions.append(market.sell_to_open(price, 30))
+        for position in positions:
+            if position.is_expiring(date):
+                continue
+            market.buy(position.option)
+            market.sell(position.option)
+            ops += 2
+    return {"days": days, "ops": ops}
+
+
+@benchmark
+def wallet_queries(quotes_df, MarketClass):
+    # A ladder: a new position every day, each held for ~8 weeks
+    dates = pd.DatetimeIndex(np.unique(quotes_df["[QUOTE_DATE]"]))
+    wallet = Wallet(0)
+    ops = 0
+    for date in dates:
+        put = Put(100, date + pd.Timedelta(days=56))
+        wallet.add_position(Position(put, quantity=-1, cost=1.0))
+        wallet.get_expiring_positions(date)
+        wallet.get_open_positions(date)
+        wallet.get_open_positions(date)
+        ops += 3
+    return {"days": len(dates), "trades": len(wallet.positions), "ops": ops}
+
+
+@benchmark
+def full_run(quotes_df, MarketClass):
+    # The same strategies as in 3_main.py
+    market = MarketClass(quotes_df)
+    strategies = [
+        StrategyClass(
+            market, capital=0, ideal_strike=ideal_strike, hold_the_strike=hold
+        )
+        for StrategyClass, ideal_strike, hold in itertools.product(
+            [SellWeeklyPuts, SellMonthlyPuts], [0.9, 1.0, 1.1], [False, True]
+        )
+    ]
+    days = 0
+    for date, price, quotes in market:
+        days += 1
+        for strategy in strategies:
+            strategy.run()
+        get_market_values(strategies)
+    trades = sum(len(strategy.wallet.positions) for strategy in strategies)
+    return {"days": days, "trades": trades}
+
+
+def measure(function, *args):
+    """Run a benchmark, and measure its time and peak memory.
+
+    :returns: A dict of seconds, peak_mb, the counts and their rates per second
+    """
+    counts, seconds, peak_mb = traced(function, *args)
+    result = {"seconds": seconds, "peak_mb": peak_mb, **counts}
+    for name, count in counts.items():
+        result[f"{name}_per_sec"] = count / seconds if seconds else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=float, default=1)
+    parser.add_argument("--strikes", type=int, default=50, help="per expiry")
+    parser.add_argument("--expiries", type=int, default=8, help="per day")
+    parser.add_argument("--market", choices=MARKETS, default="historical")
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS, help="benchmarks")
+    parser.add_argument("--output", help="where to save the results, as JSON")
+    args = parser.parse_args()
+
+    quotes_df = make_quotes(args.years, args.strikes, args.expiries)
+    MarketClass = MARKETS[args.market]
+    print(f"{len(quotes_df):,} quotes, {MarketClass.__name__}")
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = result = measure(BENCHMARKS[name], quotes_df, MarketClass)
+        rates = ", ".join(
+            f"{result[key]:,.0f} {key.replace('_per_sec', '')}/s"
+            for key in ("days_per_sec", "trades_per_sec", "ops_per_sec")
+            if key in result
+        )
+        print(
+            f"{name:>18}: {result['seconds']:8.3f} s, "
+            f"peak {result['peak_mb']:8.1f} MB, {rates}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "config": {**vars(args), "quotes": len(quotes_df)},
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "pandas": pd.__version__,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
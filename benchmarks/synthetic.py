@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+
+def make_quotes(
+    years=1, strikes_per_expiry=50, expiries_per_day=8, strike_step=5.0, seed=0
+):
+    """Generate SPY-like put quotes, in the same format as `data/processed`.
+
+    Not meant to be realistic, only to have the right shape and size:
+    a random walk for the underlying, weekly expirations,
+    and a crude time value on top of the intrinsic value.
+
+    :param years: how many years of trading days (252 per year)
+    :param strikes_per_expiry: how many strikes per expiry
+    :param expiries_per_day: how many weekly expirations are quoted every day
+    :param strike_step: the distance between two adjacent strikes
+    :param seed: the seed of the random walk
+    :returns: A Pandas dataframe of quotes
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2000-01-03", periods=int(years * 252))
+    n_days = len(dates)
+    underlying = 300 * np.exp(np.cumsum(rng.normal(0, 0.01, n_days)))
+    underlying = np.round(underlying, 2)
+
+    # Expirations: the next few Fridays (including today, if it is a Friday)
+    days_to_friday = (4 - dates.weekday.to_numpy()) % 7
+    dte = days_to_friday[:, None] + 7 * np.arange(expiries_per_day)
+
+    # Strikes: a fixed grid per expiration, centered around the money
+    # when the expiration was first quoted (so that held contracts stay quoted)
+    listed = dates.to_numpy()[:, None] + (dte - 7 * expiries_per_day).astype(
+        "timedelta64[D]"
+    )
+    listed = np.clip(np.searchsorted(dates.to_numpy(), listed), 0, n_days - 1)
+    center = np.round(underlying[listed] / strike_step) * strike_step
+    offsets = (np.arange(strikes_per_expiry) - strikes_per_expiry // 2) * strike_step
+    strikes = center[:, :, None] + offsets
+
+    shape = (n_days, expiries_per_day, strikes_per_expiry)
+    dte = np.broadcast_to(dte[:, :, None], shape).ravel()
+    strikes = strikes.ravel()
+    price = np.repeat(underlying, expiries_per_day * strikes_per_expiry)
+
+    intrinsic = np.maximum(strikes - price, 0)
+    # Roughly the shape of an at-the-money put's time value, over moneyness
+    spread = 0.2 * price * np.sqrt(np.maximum(dte, 0.01) / 365)
+    time_value = spread * np.exp(-0.5 * ((strikes - price) / spread) ** 2)
+    bid = np.round(intrinsic + 0.4 * time_value, 2)
+    ask = np.round(bid + 0.01 + 0.01 * bid, 2)
+
+    quote_dates = np.repeat(dates.to_numpy(), expiries_per_day * strikes_per_expiry)
+    return pd.DataFrame(
+        {
+            "[QUOTE_DATE]": quote_dates,
+            "[UNDERLYING_LAST]": price,
+            "[EXPIRE_DATE]": quote_dates + dte.astype("timedelta64[D]"),
+            "[DTE]": dte.astype(float),
+            "[STRIKE]": strikes,
+            "[P_BID]": bid,
+            "[P_ASK]": ask,
+            "[STRIKE_DISTANCE]": np.abs(strikes - price),
+            "[STRIKE_DISTANCE_PCT]": np.abs(strikes - price) / price,
+        }
+    )
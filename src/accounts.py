@@ -0,0 +1,215 @@
+import numpy as np
+
+from src.wallet import Ledger
+
+
+class RegTMargin:
+    """
+    Reg-T style margin requirements of option positions.
+
+    A short option needs the option's price, plus `naked_pct` of the underlying
+    less the amount it's out of the money, but at least `min_pct` of the strike
+    (of the underlying, for calls). Long options are paid in full, no margin needed.
+
+    Positions with the same type and expiration are margined together:
+    when the longs cap the loss (a spread), the requirement is just
+    that maximum loss at expiration (defined risk). When both the puts and the calls
+    of an expiration have defined risk (an iron condor), only one side can lose
+    at expiration, so the larger of the two is enough, otherwise both are needed.
+    """
+
+    def __init__(self, naked_pct=0.2, min_pct=0.1):
+        assert 0 <= min_pct <= naked_pct
+        self.naked_pct = naked_pct
+        self.min_pct = min_pct
+
+    def __repr__(self):
+        return f"RegTMargin({self.naked_pct}, {self.min_pct})"
+
+    def naked(self, strikes, directions, prices, underlying):
+        """The requirement of a single short option of each strike (per unit).
+
+        :param prices: the price of each option (positive)
+        """
+        out_of_the_money = np.maximum(-directions * (underlying - strikes), 0)
+        minimum = self.min_pct * np.where(directions < 0, strikes, underlying)
+        return prices + np.maximum(
+            self.naked_pct * underlying - out_of_the_money, minimum
+        )
+
+    def requirements(self, ledger, prices, underlying):
+        """The requirement of each group of positions, by expiry.
+
+        :param ledger: the held positions
+        :param prices: the price of each position's option (positive)
+        :returns: A dict of expiry -> requirement
+        """
+        naked = np.where(
+            ledger.quantities < 0,
+            -ledger.quantities
+            * self.naked(ledger.strikes, ledger.directions, prices, underlying),
+            0,
+        )
+        groups = {}
+        for i, (expiry, direction) in enumerate(
+            zip(ledger.expiries, ledger.directions)
+        ):
+            groups.setdefault(int(expiry), {}).setdefault(float(direction), []).append(
+                i
+            )
+        requirements = {}
+        for expiry, sides in groups.items():
+            sides = [
+                self._side_requirement(
+                    ledger.strikes[rows],
+                    direction,
+                    ledger.quantities[rows],
+                    naked[rows].sum(),
+                )
+                for direction, rows in sides.items()
+            ]
+            amounts = [amount for amount, _ in sides]
+            defined = all(defined for _, defined in sides)
+            requirements[expiry] = max(amounts) if defined else sum(amounts)
+        return requirements
+
+    @staticmethod
+    def _side_requirement(strikes, direction, quantities, naked):
+        # The requirement of the puts (or calls) of an expiration,
+        # and whether it's their maximum loss (defined risk)
+        # Calls sold in excess of the ones bought have no maximum loss
+        if direction > 0 and quantities.sum() < 0:
+            return naked, False
+        # The payoff is piecewise linear, so the lowest one is at a strike
+        # (or where the underlying goes to zero, for puts)
+        underlying = np.append(strikes, 0)[:, None]
+        payoffs = (quantities * np.maximum(direction * (underlying - strikes), 0)).sum(
+            axis=1
+        )
+        max_loss = max(-payoffs.min(), 0)
+        return min(naked, max_loss), max_loss <= naked
+
+
+class AccountTerms:
+    """
+    The terms of a brokerage account: margin, interest, commissions and limits.
+
+    :param margin: how to compute the margin requirements (RegTMargin by default)
+    :param cash_rate: the annual interest earned on the cash (0.02 for 2%)
+    :param margin_rate: the annual interest paid when the cash is negative
+    :param commission: the fee per contract, when opening or closing a position
+        (nothing is paid when an option expires worthless)
+    :param max_contracts: the most contracts held at once (all the legs together)
+    :param max_margin_pct: the largest margin requirement allowed,
+        as a fraction of the account's value
+    """
+
+    def __init__(
+        self,
+        margin=None,
+        cash_rate=0.0,
+        margin_rate=0.0,
+        commission=0.0,
+        max_contracts=None,
+        max_margin_pct=1.0,
+    ):
+        assert commission >= 0
+        assert max_contracts is None or max_contracts > 0
+        assert max_margin_pct > 0
+        self.margin = RegTMargin() if margin is None else margin
+        self.cash_rate = cash_rate
+        self.margin_rate = margin_rate
+        self.commission = commission
+        self.max_contracts = max_contracts
+        self.max_margin_pct = max_margin_pct
+
+    def __repr__(self):
+        # Stable, so that it can be a part of a stored run's key (see ResultStore)
+        return (
+            f"AccountTerms({self.margin!r}, cash_rate={self.cash_rate}, "
+            f"margin_rate={self.margin_rate}, commission={self.commission}, "
+            f"max_contracts={self.max_contracts}, "
+            f"max_margin_pct={self.max_margin_pct})"
+        )
+
+
+class RiskCheck:
+    """
+    The margin requirement and buying power of a strategy, as of the current day.
+
+    The held positions are valued once a day, and then kept by group
+    (see `RegTMargin.requirements`), so that checking an order reprices
+    only the groups it adds to. The state is recomputed only when the day
+    or the wallet (its positions or cash) changes.
+    """
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self._key = None
+
+    def _refresh(self):
+        strategy = self.strategy
+        market, wallet = strategy.market, strategy.wallet
+        date = market.current_date
+        key = (date, len(wallet.positions), wallet.cash)
+        if key == self._key:
+            return
+        self._key = key
+
+        ledger = wallet.get_ledger(date)
+        self.contracts = np.abs(ledger.quantities).sum()
+        self.value = wallet.cash
+        self.requirements = {}
+        if len(ledger):
+            market_values, intrinsic_values = market.value_positions(ledger)
+            values = np.where(np.isnan(market_values), intrinsic_values, market_values)
+            self.value += values.sum()
+            self._ledger = ledger
+            self._prices = np.abs(values / ledger.quantities)
+            self.requirements = strategy.terms.margin.requirements(
+                ledger, self._prices, market.underlying_last
+            )
+
+    def margin_requirement(self):
+        self._refresh()
+        return sum(self.requirements.values())
+
+    def buying_power(self):
+        """How much more margin can be used, within the limit (see AccountTerms)."""
+        self._refresh()
+        return (
+            self.strategy.terms.max_margin_pct * self.value - self.margin_requirement()
+        )
+
+    def allows(self, positions):
+        """Whether opening the (new) positions stays within all the limits.
+
+        The new positions are priced at their cost.
+        """
+        terms = self.strategy.terms
+        self._refresh()
+        contracts = sum(abs(p.quantity) for p in positions)
+        if (
+            terms.max_contracts is not None
+            and self.contracts + contracts > terms.max_contracts
+        ):
+            return False
+
+        new = Ledger(positions)
+        groups = set(new.expiries.tolist())
+        prices = new.costs
+        if self.requirements:
+            # Only the groups being added to are recomputed (at today's prices)
+            held = self._ledger
+            rows = np.array([expiry in groups for expiry in held.expiries.tolist()])
+            new = Ledger(
+                [p for p, row in zip(held.positions, rows) if row] + list(positions)
+            )
+            prices = np.append(self._prices[rows], prices)
+        requirements = dict(self.requirements)
+        requirements.update(
+            terms.margin.requirements(new, prices, self.strategy.market.underlying_last)
+        )
+        # The commissions are paid from the account's value
+        value = self.value - terms.commission * contracts
+        return sum(requirements.values()) <= terms.max_margin_pct * value
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+
+
+class QuoteChain:
+    """
+    An indexed, read-only view of a single day's option chain.
+
+    The rows are sorted once by strike, then by expiration, and kept as NumPy arrays.
+    Finding the contract closest to an ideal strike/DTE is then a binary search,
+    and finding an exact (expiration, strike) contract is a dictionary lookup.
+
+    The original quotes are kept as well, see `quotes`.
+    """
+
+    def __init__(self, quotes, quote_date=None, presorted=False, positions=None):
+        """
+        :param quotes: the quotes of a single day, as in `HistoricalMarket.get_quotes()`,
+            or any other mapping of column names to arrays
+        :param quote_date: the date of the quotes, only needed if there's no [DTE] column
+        :param presorted: whether the quotes are already sorted by strike, then expiration
+            (the arrays are then used as they are, without any copying)
+        :param positions: if presorted, the original position of each row,
+            used to break ties same as if the quotes weren't sorted
+        """
+        self.quotes = quotes
+        self._columns = {}
+        self._index = None
+        self._keys = None
+        # The implied volatility surface, and the Greeks of the puts (-1)
+        # and calls (+1), computed by the market if ever needed
+        self.surface = None
+        self.greeks = {}
+
+        strikes = np.asarray(quotes["[STRIKE]"], dtype=float)
+        expirations = np.asarray(quotes["[EXPIRE_DATE]"], dtype="datetime64[ns]")
+
+        self._presorted = presorted
+        if presorted:
+            self._positions = positions
+            self.strikes = strikes
+            self.expirations = expirations
+        else:
+            # A stable sort, so that duplicates keep their original order
+            self._order = np.lexsort((expirations, strikes))
+            self._positions = self._order
+            self.strikes = strikes[self._order]
+            self.expirations = expirations[self._order]
+
+        if "[DTE]" in quotes:
+            self.dte = self.column("[DTE]").astype(float)
+        elif quote_date is not None:
+            self.dte = (
+                self.expirations - np.datetime64(quote_date, "ns")
+            ) / np.timedelta64(1, "D")
+        else:
+            self.dte = None
+
+        # Each unique strike owns a contiguous block of rows, sorted by expiration
+        self._block_starts = np.flatnonzero(np.diff(self.strikes)) + 1
+        if len(self.strikes):
+            self._block_starts = np.insert(self._block_starts, 0, 0)
+        self._block_ends = np.append(self._block_starts[1:], len(self.strikes))
+        self._unique_strikes = self.strikes[self._block_starts]
+
+    def __len__(self):
+        return len(self.strikes)
+
+    def column(self, name):
+        """Get a column of the quotes as a NumPy array, in the chain's (sorted) order."""
+        if name not in self._columns:
+            values = np.asarray(self.quotes[name])
+            if not self._presorted:
+                values = values[self._order]
+            self._columns[name] = values
+        return self._columns[name]
+
+    def _position(self, row):
+        # The position of the row in the original quotes, used to break ties
+        return row if self._positions is None else self._positions[row]
+
+    def locate(self, expiration, strike):
+        """Find the row of an exact contract.
+
+        :returns: The row number (in the chain's order)
+        :raises IndexError: If there's no such contract in the chain
+        """
+        if self._index is None:
+            keys = zip(self.expirations.view("int64").tolist(), self.strikes.tolist())
+            # Reversed, so that the first of any duplicates wins
+            self._index = dict(reversed(list(zip(keys, range(len(self.strikes))))))
+        try:
+            return self._index[(pd.Timestamp(expiration).value, float(strike))]
+        except KeyError:
+            raise IndexError(f"No quote for {strike} expiring on {expiration}")
+
+    def locate_many(self, expirations, strikes):
+        """Find the rows of many contracts at once, with a single binary search.
+
+        :returns: The row numbers (in the chain's order), -1 where there's no such contract
+        """
+        expirations = np.asarray(expirations, dtype="datetime64[ns]")
+        strikes = np.asarray(strikes, dtype=float)
+        if self._keys is None:
+            # A single sorted key per row: (the strike's block, the expiration's rank)
+            self._unique_expirations, ranks = np.unique(
+                self.expirations, return_inverse=True
+            )
+            blocks = np.repeat(
+                np.arange(len(self._block_starts)),
+                self._block_ends - self._block_starts,
+            )
+            self._keys = blocks * len(self._unique_expirations) + ranks
+        if len(self._keys) == 0:
+            return np.full(len(strikes), -1)
+
+        found = np.ones(len(strikes), dtype=bool)
+        ranks = []
+        for values, unique in (
+            (strikes, self._unique_strikes),
+            (expirations, self._unique_expirations),
+        ):
+            rank = np.searchsorted(unique, values)
+            clipped = np.minimum(rank, len(unique) - 1)
+            found &= (rank < len(unique)) & (unique[clipped] == values)
+            ranks.append(clipped)
+        keys = ranks[0] * len(self._unique_expirations) + ranks[1]
+        rows = np.searchsorted(self._keys, keys)
+        clipped = np.minimum(rows, len(self._keys) - 1)
+        found &= (rows < len(self._keys)) & (self._keys[clipped] == keys)
+        return np.where(found, rows, -1)
+
+    def nearest(self, ideal_strike, ideal_dte):
+        """Find the contract with the strike closest to the ideal one,
+        and then, among those, the one with the dte closest to the ideal one.
+
+        Ties are resolved in favour of the row which came first in the original quotes.
+
+        :returns: The row number (in the chain's order)
+        :raises IndexError: If the chain is empty
+        """
+        if len(self.strikes) == 0:
+            raise IndexError("Can't select a contract from an empty chain")
+        if self.dte is None:
+            raise ValueError("The chain needs either a [DTE] column or a quote date")
+
+        strikes = self._unique_strikes
+        i = np.searchsorted(strikes, ideal_strike)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(strikes)]
+        strike_distance = min(abs(strikes[j] - ideal_strike) for j in candidates)
+
+        best = None
+        for j in candidates:
+            if abs(strikes[j] - ideal_strike) != strike_distance:
+                continue
+            row = self._nearest_in_block(
+                self._block_starts[j], self._block_ends[j], ideal_dte
+            )
+            key = (abs(self.dte[row] - ideal_dte), self._position(row))
+            if best is None or key < best[0]:
+                best = (key, row)
+        return best[1]
+
+    def nearest_expiration(self, ideal_dte, min_dte=0):
+        """Find the expiration with the dte closest to the ideal one,
+        among those at least `min_dte` days away, ties going to the earlier one.
+
+        :returns: The expiration, as a np.datetime64
+        :raises IndexError: If there's no such expiration
+        """
+        if self.dte is None:
+            raise ValueError("The chain needs either a [DTE] column or a quote date")
+        rows = np.flatnonzero(self.dte >= min_dte)
+        if len(rows) == 0:
+            raise IndexError(f"No quotes expiring in {min_dte} days or more")
+        distances = np.abs(self.dte[rows] - ideal_dte)
+        return self.expirations[rows[distances == distances.min()]].min()
+
+    def nearest_strikes(self, expiration, ideal_strikes, valid=None):
+        """Find the contracts of an expiration with the strikes closest to the ideal ones,
+        all at once (e.g. the legs of a spread), ties going to the lower strike.
+
+        :param valid: optionally, a boolean array (in the chain's order)
+            of the rows which can be selected, e.g. those with a quote
+        :returns: The row numbers (in the chain's order)
+        :raises IndexError: If there are no contracts with that expiration
+        """
+        selectable = self.expirations == np.datetime64(expiration, "ns")
+        if valid is not None:
+            selectable &= valid
+        rows = np.flatnonzero(selectable)
+        if len(rows) == 0:
+            raise IndexError(f"No quotes expiring on {expiration}")
+        ideal_strikes = np.asarray(ideal_strikes, dtype=float)
+        if len(rows) == 1:
+            return np.full(len(ideal_strikes), rows[0])
+        # Sorted by strike, so the two candidates are around the insertion point
+        # (the first of any duplicates)
+        strikes = self.strikes[rows]
+        higher = np.clip(np.searchsorted(strikes, ideal_strikes), 1, len(rows) - 1)
+        lower = np.searchsorted(strikes, strikes[higher - 1])
+        closer_lower = ideal_strikes - strikes[lower] <= strikes[higher] - ideal_strikes
+        return rows[np.where(closer_lower, lower, higher)]
+
+    def nearest_deltas(self, expiration, deltas, ideal_deltas):
+        """Find the contracts of an expiration with the deltas closest to the ideal ones
+        (e.g. the 16-delta put, -0.16), ties going to the lower strike.
+
+        :param deltas: the delta of each row (in the chain's order), NaN if unknown
+        :returns: The row numbers (in the chain's order)
+        :raises IndexError: If there are no contracts with that expiration and a delta
+        """
+        rows = np.flatnonzero(
+            (self.expirations == np.datetime64(expiration, "ns")) & ~np.isnan(deltas)
+        )
+        if len(rows) == 0:
+            raise IndexError(f"No deltas expiring on {expiration}")
+        ideal_deltas = np.asarray(ideal_deltas, dtype=float)
+        # Sorted by strike, and argmin takes the first of any ties
+        distances = np.abs(deltas[rows][None, :] - ideal_deltas.reshape(-1, 1))
+        return rows[distances.argmin(axis=1)]
+
+    def _nearest_in_block(self, start, end, ideal_dte):
+        # The dte is sorted within the block of a single strike
+        dte = self.dte[start:end]
+        k = np.searchsorted(dte, ideal_dte)
+        best = None
+        for m in (k - 1, k):
+            if 0 <= m < len(dte):
+                # Move to the first of any equal dte values
+                m = np.searchsorted(dte, dte[m])
+                key = (abs(dte[m] - ideal_dte), self._position(start + m))
+                if best is None or key < best[0]:
+                    best = (key, start + m)
+        return best[1]
@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# The columns of the OptionsDX EOD files, and their types.
+# Prices (of the underlying, strikes, bids and asks) are kept as float64,
+# because they get compared and summed up, everything else fits in float32.
+DATE_COLUMNS = {
+    "[QUOTE_READTIME]": "%Y-%m-%d %H:%M",
+    "[QUOTE_DATE]": "%Y-%m-%d",
+    "[EXPIRE_DATE]": "%Y-%m-%d",
+}
+SCHEMA = {
+    "[QUOTE_UNIXTIME]": "int64",
+    "[QUOTE_TIME_HOURS]": "float32",
+    "[UNDERLYING_LAST]": "float64",
+    "[EXPIRE_UNIX]": "int64",
+    "[DTE]": "float32",
+    "[C_DELTA]": "float32",
+    "[C_GAMMA]": "float32",
+    "[C_VEGA]": "float32",
+    "[C_THETA]": "float32",
+    "[C_RHO]": "float32",
+    "[C_IV]": "float32",
+    "[C_VOLUME]": "float32",
+    "[C_LAST]": "float64",
+    "[C_BID]": "float64",
+    "[C_ASK]": "float64",
+    "[STRIKE]": "float64",
+    "[P_BID]": "float64",
+    "[P_ASK]": "float64",
+    "[P_LAST]": "float64",
+    "[P_DELTA]": "float32",
+    "[P_GAMMA]": "float32",
+    "[P_VEGA]": "float32",
+    "[P_THETA]": "float32",
+    "[P_RHO]": "float32",
+    "[P_IV]": "float32",
+    "[P_VOLUME]": "float32",
+    "[STRIKE_DISTANCE]": "float32",
+    "[STRIKE_DISTANCE_PCT]": "float32",
+}
+# Not needed, and not numbers anyway (e.g. "1 x 10")
+DROPPED_COLUMNS = ["[C_SIZE]", "[P_SIZE]"]
+
+
+def read_optionsdx(path):
+    """Read a single OptionsDX EOD file (csv, despite the .txt extension).
+
+    The columns are parsed straight into their types (see SCHEMA),
+    the dates are parsed once with a fixed format, and missing values become NaN.
+    Only if a file doesn't fit the schema, it's parsed the slow way,
+    coercing whatever can't be converted to NaN.
+
+    :returns: A Pandas dataframe
+    """
+    header = pd.read_csv(path, nrows=0, skipinitialspace=True).columns
+    names = {raw: raw.strip() for raw in header}
+    usecols = [raw for raw, name in names.items() if name not in DROPPED_COLUMNS]
+    dtype = {raw: SCHEMA.get(name, "float32") for raw, name in names.items()}
+    for raw, name in names.items():
+        if name in DATE_COLUMNS:
+            dtype[raw] = "str"
+
+    try:
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype, skipinitialspace=True)
+    except ValueError:
+        df = _read_coerced(path, usecols, dtype)
+    df.columns = df.columns.str.strip()
+
+    for name, date_format in DATE_COLUMNS.items():
+        if name in df.columns:
+            df[name] = pd.to_datetime(df[name], format=date_format)
+    return df
+
+
+def _read_coerced(path, usecols, dtype):
+    # The slow path, for files with values which aren't numbers
+    df = pd.read_csv(path, usecols=usecols, dtype=str, skipinitialspace=True)
+    for raw in df.columns:
+        if dtype[raw] != "str":
+            values = pd.to_numeric(df[raw], errors="coerce")
+            if np.issubdtype(np.dtype(dtype[raw]), np.integer) and values.isna().any():
+                # Can't have NaNs in an integer column
+                df[raw] = values.astype("float64")
+            else:
+                df[raw] = values.astype(dtype[raw])
+    return df
+
+
+def ingest_file(path, output):
+    """Read a single OptionsDX file, and write it to a Parquet dataset.
+
+    The dataset is partitioned by the year and the month of the quotes,
+    as in `output/year=2020/month=1/<file name>.parquet`.
+
+    :returns: How many rows were written
+    """
+    df = read_optionsdx(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    dates = df["[QUOTE_DATE]"]
+    for (year, month), part in df.groupby([dates.dt.year, dates.dt.month]):
+        directory = os.path.join(output, f"year={year}", f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        part.to_parquet(os.path.join(directory, f"{name}.parquet"), index=False)
+    return len(df)
+
+
+def find_files(directory):
+    """Find all the OptionsDX files (*.txt) in the directory and its subdirectories."""
+    return sorted(
+        os.path.join(root, file)
+        for root, dirs, files in os.walk(directory)
+        for file in files
+        if file.endswith(".txt")
+    )
+
+
+def ingest(directory, output, max_workers=None):
+    """Read all the OptionsDX files in a directory into a partitioned Parquet dataset.
+
+    The files are parsed concurrently, each by a separate process,
+    and each is written to the dataset as soon as it's parsed,
+    so there's never more than a few months of quotes in memory.
+
+    :param directory: where to look for the files (see `find_files`)
+    :param output: the directory of the Parquet dataset
+    :param max_workers: how many processes to use
+    :returns: How many rows were written in total
+    """
+    files = find_files(directory)
+    rows = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(ingest_file, path, output): path for path in files}
+        for future in (pbar := tqdm(as_completed(futures), total=len(futures))):
+            pbar.set_postfix_str(os.path.basename(futures[future]))
+            rows += future.result()
+    return rows
@@ -0,0 +1,150 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from src.markets import ColumnarMarket
+from src.store import fingerprint_arrays
+
+# The columns every market needs, whatever the options
+BASE_COLUMNS = [
+    "[QUOTE_DATE]",
+    "[UNDERLYING_LAST]",
+    "[EXPIRE_DATE]",
+    "[DTE]",
+    "[STRIKE]",
+]
+PUT_COLUMNS = ["[P_BID]", "[P_ASK]"]
+CALL_COLUMNS = ["[C_BID]", "[C_ASK]"]
+
+
+def load_quotes(
+    path,
+    start=None,
+    end=None,
+    min_dte=None,
+    max_dte=None,
+    max_strike_distance_pct=None,
+    puts=True,
+    calls=False,
+    columns=None,
+):
+    """Load the quotes from a Parquet file or dataset, reading only what's needed.
+
+    All the filters are pushed down to pyarrow, so that only the matching
+    row groups (and partitions, if any) are read, and only the needed columns.
+    Rows without a bid/ask of the requested options are dropped.
+
+    :param path: a Parquet file, or a directory (possibly partitioned by year/month)
+    :param start: the first quote date (inclusive)
+    :param end: the last quote date (inclusive)
+    :param min_dte: the minimum days to expiration (inclusive)
+    :param max_dte: the maximum days to expiration (inclusive)
+    :param max_strike_distance_pct: the maximum distance of the strike
+        from the underlying, as a fraction of it (e.g. 0.2 for +-20%)
+    :param puts: whether to load the put quotes
+    :param calls: whether to load the call quotes
+    :param columns: any additional columns to load
+    :returns: A Pandas dataframe of quotes, sorted by date
+    """
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    names = dataset.schema.names
+
+    prices = (PUT_COLUMNS if puts else []) + (CALL_COLUMNS if calls else [])
+    selected = [c for c in BASE_COLUMNS if c in names] + prices + list(columns or [])
+    selected = list(dict.fromkeys(selected))
+
+    conditions = [ds.field(c).is_valid() for c in prices]
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field("[QUOTE_DATE]") >= start.to_pydatetime())
+        if "year" in names:
+            # Prune whole partitions, not just row groups
+            conditions.append(ds.field("year") >= start.year)
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field("[QUOTE_DATE]") <= end.to_pydatetime())
+        if "year" in names:
+            conditions.append(ds.field("year") <= end.year)
+    if min_dte is not None:
+        conditions.append(ds.field("[DTE]") >= min_dte)
+    if max_dte is not None:
+        conditions.append(ds.field("[DTE]") <= max_dte)
+    if max_strike_distance_pct is not None:
+        distance = pc.abs(ds.field("[STRIKE_DISTANCE_PCT]"))
+        conditions.append(distance <= max_strike_distance_pct)
+
+    condition = None
+    for c in conditions:
+        condition = c if condition is None else condition & c
+
+    table = dataset.to_table(columns=selected, filter=condition)
+    df = table.to_pandas()
+    return df.sort_values("[QUOTE_DATE]", kind="stable", ignore_index=True)
+
+
+def load_market(path, MarketClass=ColumnarMarket, **filters):
+    """Load the quotes (see `load_quotes` for the filters) into a market."""
+    return MarketClass(quotes_df=load_quotes(path, **filters))
+
+
+def compile_market(quotes_df, path):
+    """Compile the quotes into a directory of memory-mappable arrays (see `open_market`).
+
+    The quotes are indexed into a ColumnarMarket once, and all its arrays,
+    including the offsets of each day and the underlying price of each day,
+    are saved as `.npy` files, plus a `columns.json` manifest of them
+    (with their fingerprint, so that it's never computed again, see `open_market`).
+    """
+    save_arrays(ColumnarMarket(quotes_df).to_arrays(), path)
+
+
+def save_arrays(arrays, path):
+    """Save some arrays (a dict of name -> np.ndarray) as `.npy` files in a directory."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for i, (name, values) in enumerate(arrays.items()):
+        if values.dtype.hasobject:
+            raise TypeError(f"Can't save the {name} column of Python objects")
+        files[name] = f"{i}.npy"
+        np.save(path / files[name], values, allow_pickle=False)
+    manifest = {"files": files, "fingerprint": fingerprint_arrays(arrays)}
+    # The manifest is written last, so a half-written directory can't be opened
+    (path / "columns.json").write_text(json.dumps(manifest, indent=2))
+
+
+def load_arrays(path):
+    """Memory-map the arrays saved by `save_arrays` (read-only, nothing is read yet)."""
+    path = Path(path)
+    return {
+        name: np.load(path / file, mmap_mode="r", allow_pickle=False)
+        for name, file in _manifest(path)["files"].items()
+    }
+
+
+def _manifest(path):
+    return json.loads((Path(path) / "columns.json").read_text())
+
+
+def open_market(path, MarketClass=ColumnarMarket, surface_fallback=False):
+    """Open a market compiled with `compile_market`.
+
+    The arrays are memory-mapped, so opening takes the same (short) time
+    whatever the size of the data, only the days actually used are read from disk,
+    and all the processes using the same files share them in the OS page cache.
+    The fingerprint of the data (see ResultStore) comes from the manifest,
+    as `market.fingerprint`.
+
+    :param surface_fallback: whether to price the contracts missing from a day's quotes
+        from its volatility surface (see HistoricalMarket)
+    """
+    return MarketClass.from_arrays(
+        load_arrays(path),
+        surface_fallback=surface_fallback,
+        compiled_path=Path(path),
+        fingerprint=_manifest(path)["fingerprint"],
+    )
@@ -1,9 +1,35 @@
 from abc import abstractmethod
+import heapq
+from collections import OrderedDict
 from collections.abc import Iterator
 from datetime import timedelta
 
-from src.options import Put
-from src.wallet import Position
+import numpy as np
+import pandas as pd
+
+from src.chains import QuoteChain
+from src.options import Put, to_day
+from src.synthetic import ChainModel, align
+from src.volatility import GREEKS, VolSurface, greeks, implied_vols
+from src.wallet import Ledger, Position
+
+
+def _price_column(direction, side):
+    """The column of the "BID" or "ASK" prices, of puts (direction -1) or calls (+1)."""
+    return f"[{'C' if direction > 0 else 'P'}_{side}]"
+
+
+def _check_widths(order, strikes):
+    """Make sure no bought leg got the same strike as a sold one of the same type,
+    e.g. an unquoted wing falling back onto its short leg (a spread hedging nothing).
+
+    :raises IndexError: If some did
+    """
+    sides = {}
+    for leg, strike in zip(order.legs, strikes):
+        side = sides.setdefault((leg.OptionClass, strike), leg.quantity > 0)
+        if side != (leg.quantity > 0):
+            raise IndexError(f"{leg} collapsed onto another leg's strike, {strike}")
 
 
 class HistoricalMarket(Iterator):
@@ -11,14 +37,29 @@ class HistoricalMarket(Iterator):
     Holds the current state of the market.
     Knows the current date and the current quotes.
     Responsible for executing trades.
+
+    With `surface_fallback`, the contracts missing from the day's quotes
+    are priced from the day's implied volatility surface (see `surface`),
+    instead of failing to be bought or sold (or valued as NaN).
     """
 
-    def __init__(self, quotes_df):
+    # Whether to price the contracts which aren't quoted, see `surface`
+    surface_fallback = False
+
+    def __init__(self, quotes_df, surface_fallback=False):
+        self.surface_fallback = surface_fallback
         self._quotes_by_date = quotes_df.groupby(["[QUOTE_DATE]", "[UNDERLYING_LAST]"])
         self._quotes_iterator = iter(self._quotes_by_date)
+        # The date of each day, in the order of the groups
+        self.dates = (
+            self._quotes_by_date.size()
+            .index.get_level_values(0)
+            .to_numpy(dtype="datetime64[ns]")
+        )
         self.current_date = None
         self.underlying_last = None
         self.current_quotes = None
+        self._chain = None
 
     def __len__(self):
         return self._quotes_by_date.ngroups
@@ -41,58 +82,203 @@ class HistoricalMarket(Iterator):
         self.current_date = key[0]
         self.underlying_last = key[1]
         self.current_quotes = quotes_df
+        self._chain = None
         return key[0], key[1], quotes_df
 
-    def sell_to_open(self, ideal_strike, ideal_dte):
+    def advance(self):
+        """Move to the next day, same as `next(market)`, but without returning the quotes.
+
+        The markets which can, don't even prepare the quotes until they're used
+        (see ColumnarMarket), e.g. on the days no strategy acts (see Scheduler).
+
+        :raises StopIteration: After the last day
+        """
+        next(self)
+
+    @property
+    def chain(self):
+        """The current quotes, indexed for fast lookups (built lazily, once per day)."""
+        if self._chain is None:
+            self._chain = QuoteChain(self.current_quotes, self.current_date)
+        return self._chain
+
+    @property
+    def surface(self):
+        """The implied volatility surface of the day (see VolSurface), or None
+        if nothing can be fitted. Fitted on first use, once per day (with the chain).
+        """
+        chain = self.chain
+        if chain.surface is None:
+            chain.surface = VolSurface.from_chain(chain, self.underlying_last) or False
+        return chain.surface or None
+
+    def _surface_prices(self, expiries, strikes, directions, side):
+        # The prices of some contracts, from the surface (NaN without one)
+        surface = self.surface
+        if surface is None:
+            return np.full(np.shape(strikes), np.nan)
+        years = (np.asarray(expiries) - to_day(self.current_date)) / 365
+        return surface.prices(strikes, years, directions, side)
+
+    def chain_greeks(self, direction):
+        """The Greeks of all the puts (direction -1) or calls (+1) in today's chain.
+
+        Taken from the quotes if they have them (e.g. [P_DELTA], see 2_select.py),
+        otherwise computed all at once, with the quoted volatilities ([P_IV])
+        or the implied volatilities of the mid prices (the surface's, where none).
+        Cached with the chain, once per day.
+
+        :returns: A dict of "DELTA", "GAMMA", "THETA", "VEGA" and "IV" -> array
+            (in the chain's order)
+        """
+        chain = self.chain
+        if direction not in chain.greeks:
+            kind = "C" if direction > 0 else "P"
+            columns = [f"[{kind}_{greek}]" for greek in GREEKS]
+            bid, ask = _price_column(direction, "BID"), _price_column(direction, "ASK")
+            years = chain.dte / 365
+
+            vols = np.full(len(chain), np.nan)
+            if columns[-1] in chain.quotes:
+                vols = chain.column(columns[-1]).astype(float)
+            missing = np.isnan(vols)
+            if missing.any() and bid in chain.quotes and ask in chain.quotes:
+                mids = (chain.column(bid)[missing] + chain.column(ask)[missing]) / 2
+                vols[missing] = implied_vols(
+                    mids,
+                    self.underlying_last,
+                    chain.strikes[missing],
+                    years[missing],
+                    direction,
+                )
+                missing = np.isnan(vols)
+            if missing.any() and self.surface is not None:
+                vols[missing] = self.surface.vols(
+                    chain.strikes[missing], years[missing]
+                )
+
+            result = greeks(self.underlying_last, chain.strikes, years, vols, direction)
+            # The quoted ones take precedence
+            for greek, column in zip(GREEKS, columns):
+                if column in chain.quotes:
+                    quoted = chain.column(column).astype(float)
+                    result[greek] = np.where(np.isnan(quoted), result[greek], quoted)
+            chain.greeks[direction] = result
+        return chain.greeks[direction]
+
+    def position_greeks(self, positions):
+        """The Greeks of many positions at once, per contract (not times the quantity).
+
+        The quoted contracts get those of the chain (see `chain_greeks`),
+        the others are computed from the surface (NaN without one).
+
+        :param positions: a list of Position objects, or a Ledger
+        :returns: A dict of "DELTA", "GAMMA", "THETA", "VEGA" and "IV" -> array
+        """
+        ledger = positions if isinstance(positions, Ledger) else Ledger(positions)
+        result = {greek: np.full(len(ledger), np.nan) for greek in GREEKS}
+        if len(ledger) == 0:
+            return result
+        rows = self.chain.locate_many(
+            ledger.expiries.astype("datetime64[D]"), ledger.strikes
+        )
+        for direction in np.unique(ledger.directions):
+            legs = (rows >= 0) & (ledger.directions == direction)
+            if legs.any():
+                chain_greeks = self.chain_greeks(direction)
+                for greek in GREEKS:
+                    result[greek][legs] = chain_greeks[greek][rows[legs]]
+
+        missing = np.isnan(result["DELTA"])
+        if missing.any():
+            years = (ledger.expiries[missing] - to_day(self.current_date)) / 365
+            strikes = ledger.strikes[missing]
+            surface = self.surface
+            vols = np.nan if surface is None else surface.vols(strikes, years)
+            computed = greeks(
+                self.underlying_last,
+                strikes,
+                years,
+                vols,
+                ledger.directions[missing],
+            )
+            for greek in GREEKS:
+                result[greek][missing] = computed[greek]
+        return result
+
+    def strike_for_delta(self, OptionClass, ideal_delta, ideal_dte):
+        """The strike of the contract with the delta closest to the ideal one,
+        in the expiration closest to the ideal dte (for the at-the-money strike).
+
+        :param ideal_delta: as quoted, e.g. -0.16 for the 16-delta put
+        :raises IndexError: If there are no deltas for that expiration
+        """
+        chain = self.chain
+        expiration = chain.expirations[chain.nearest(self.underlying_last, ideal_dte)]
+        deltas = self.chain_greeks(OptionClass.direction)["DELTA"]
+        return chain.strikes[chain.nearest_deltas(expiration, deltas, [ideal_delta])[0]]
+
+    def _price(self, option, side):
+        chain = self.chain
+        try:
+            row = chain.locate(option.expiration, option.strike)
+            price = chain.column(_price_column(option.direction, side))[row]
+            if np.isnan(price):
+                # The row is only quoted for the other type (e.g. a put, not a call)
+                raise IndexError(f"{option} isn't quoted")
+            return price
+        except IndexError:
+            if not self.surface_fallback:
+                raise
+            price = self._surface_prices(
+                option.expiry, option.strike, option.direction, side
+            )[()]
+            if np.isnan(price):
+                raise
+            return price
+
+    def sell_to_open(self, ideal_strike, ideal_dte, min_dte=None):
         """Write a put with the strike and dte closest to the ideal ones.
         Sell the put at the current bid price.
 
         Note that the caller is responsible for adding the position to the wallet,
         and for keeping track of available cash.
 
+        :param min_dte: optionally, write it at least this many days from expiration
+            (the expiration is then picked first, then the strike)
         :returns: A new Position object
+        :raises IndexError: If there's no expiration at least `min_dte` days away
         """
-        # Find the closest option in the quotes dataframe
-        quotes_df = self.current_quotes.copy()
-        quotes_df["_strike_distance"] = (quotes_df["[STRIKE]"] - ideal_strike).abs()
-        quotes_df["_dte_distance"] = (quotes_df["[DTE]"] - ideal_dte).abs()
-
-        # Order by strike distance, then by dte distance
-        quotes_df.sort_values(
-            by=["_strike_distance", "_dte_distance"],
-            inplace=True,
-        )
-
-        # Get the first row
-        row = quotes_df.iloc[0]
+        chain = self.chain
+        if min_dte is None:
+            row = chain.nearest(ideal_strike, ideal_dte)
+        else:
+            expiration = chain.nearest_expiration(ideal_dte, min_dte)
+            row = chain.nearest_strikes(expiration, [ideal_strike])[0]
 
         # Create a put object
         put = Put(
-            strike=row["[STRIKE]"],
-            expiration=row["[EXPIRE_DATE]"],
+            strike=chain.strikes[row],
+            expiration=pd.Timestamp(chain.expirations[row]),
         )
 
         # Create a position object
         position = Position(
             option=put,
             quantity=-1,
-            cost=row["[P_BID]"],
+            cost=chain.column("[P_BID]")[row],
         )
 
         # Return the position
         return position
 
     def sell(self, option):
-        """Sell an option at the current bid price."""
-        quotes = self.current_quotes
+        """Sell an option at the current bid price.
 
-        # Find the row with the matching option
-        # TODO: what if it's not found?
-        return quotes.loc[
-            (quotes["[EXPIRE_DATE]"] == option.expiration)
-            & (quotes["[STRIKE]"] == option.strike),
-            "[P_BID]",
-        ].values[0]
+        :raises IndexError: If the option is not quoted today
+            (and can't be priced from the surface, see `surface_fallback`)
+        """
+        return self._price(option, "BID")
 
     def buy(self, option):
         """Buy an option at the current ask price.
@@ -102,16 +288,10 @@ class HistoricalMarket(Iterator):
         and for keeping track of available cash.
 
         :returns: The cost of the option
+        :raises IndexError: If the option is not quoted today
+            (and can't be priced from the surface, see `surface_fallback`)
         """
-        quotes = self.get_quotes()
-
-        # Find the row with the matching option
-        # TODO: what if it's not found?
-        return quotes.loc[
-            (quotes["[EXPIRE_DATE]"] == option.expiration)
-            & (quotes["[STRIKE]"] == option.strike),
-            "[P_ASK]",
-        ].values[0]
+        return self._price(option, "ASK")
 
     def close(self, position: Position, dry_run=False):
         """Close a position.
@@ -139,6 +319,146 @@ class HistoricalMarket(Iterator):
             position.close(self.current_date, close_value)
         return close_value
 
+    def roll(self, position, ideal_strike, ideal_dte, min_dte=0):
+        """Close a short put, and write a new one with the strike and dte
+        closest to the ideal ones, both from the same (indexed) chain.
+        The new one always expires later (and at least `min_dte` days away).
+
+        Note that the caller is responsible for updating the wallet.
+
+        :returns: A tuple of (the credit/debit from closing it, the new Position)
+        :raises IndexError: If there's no later expiration (nothing is closed then)
+        """
+        days_left = to_day(position.option.expiration) - to_day(self.current_date)
+        new_position = self.sell_to_open(
+            ideal_strike, ideal_dte, min_dte=max(min_dte, days_left + 1)
+        )
+        return self.close(position), new_position
+
+    def open_order(self, order):
+        """Open all the legs of an order (see Order), resolved against the chain at once.
+
+        The expiration is the one closest to the ideal dte (for the first leg's strike),
+        and each leg gets the quoted strike closest to its ideal one.
+        The legs are bought at the ask, and sold at the bid.
+
+        Note that the caller is responsible for adding the positions to the wallet,
+        and for keeping track of available cash.
+
+        :returns: A list of new Position objects, one per leg
+        :raises IndexError: If there are no quotes for some of the legs, or if a bought
+            and a sold one of the same type end up with the same strike
+        """
+        chain = self.chain
+        first = order.legs[0]
+        expiration = chain.expirations[
+            chain.nearest(first.ideal_strike, order.ideal_dte)
+        ]
+
+        positions = [None] * len(order.legs)
+        for OptionClass in dict.fromkeys(leg.OptionClass for leg in order.legs):
+            legs = [
+                i for i, leg in enumerate(order.legs) if leg.OptionClass is OptionClass
+            ]
+            bids, asks = (
+                self._price_column_or_raise(chain, OptionClass.direction, side)
+                for side in ("BID", "ASK")
+            )
+            rows = chain.nearest_strikes(
+                expiration,
+                [order.legs[i].ideal_strike for i in legs],
+                valid=~(np.isnan(bids) | np.isnan(asks)),
+            )
+            for i, row in zip(legs, rows):
+                quantity = order.legs[i].quantity
+                positions[i] = Position(
+                    option=OptionClass(chain.strikes[row], pd.Timestamp(expiration)),
+                    quantity=quantity,
+                    cost=(asks if quantity > 0 else bids)[row],
+                )
+        _check_widths(order, [p.option.strike for p in positions])
+        return positions
+
+    def _price_column_or_raise(self, chain, direction, side):
+        name = _price_column(direction, side)
+        if name not in chain.quotes:
+            raise IndexError(f"No {name} quotes")
+        return chain.column(name).astype(float)
+
+    def close_positions(self, positions):
+        """Close many positions at once (e.g. all the legs of an order).
+
+        :returns: The total credit/debit from closing them, see `close`
+        :raises IndexError: If some of them aren't quoted today (none is closed then)
+        """
+        ledger = Ledger(positions)
+        market_values, _ = self.value_positions(ledger)
+        if np.isnan(market_values).any():
+            raise IndexError(
+                f"Not all of {positions} are quoted on {self.current_date}"
+            )
+        ledger.close(self.current_date, market_values)
+        return market_values.sum()
+
+    def value_positions(self, positions):
+        """Value many positions at once (e.g. all open positions of all strategies).
+
+        All the contracts are looked up in today's quotes in one go,
+        instead of one `close(position, dry_run=True)` at a time.
+
+        :param positions: a list of Position objects, or a Ledger
+        :returns: A tuple of two arrays, with a value for each position:
+            - the market values, same as `close(position, dry_run=True)`,
+              or NaN if the contract isn't quoted today
+              (unless priced from the surface, see `surface_fallback`)
+            - the intrinsic values, multiplied by the quantity
+        """
+        ledger = positions if isinstance(positions, Ledger) else Ledger(positions)
+        intrinsic_values = ledger.quantities * ledger.intrinsic_values(
+            self.underlying_last
+        )
+        if len(ledger) == 0:
+            return np.zeros(0), intrinsic_values
+        chain = self.chain
+        rows = chain.locate_many(
+            ledger.expiries.astype("datetime64[D]"), ledger.strikes
+        )
+        found = rows >= 0
+        # Long positions are sold at the bid, short ones are bought back at the ask
+        market_values = np.full(len(ledger), np.nan)
+        for direction in np.unique(ledger.directions):
+            for side, sides in (
+                ("BID", ledger.quantities > 0),
+                ("ASK", ledger.quantities < 0),
+            ):
+                legs = found & sides & (ledger.directions == direction)
+                if legs.any():
+                    prices = chain.column(_price_column(direction, side))[rows[legs]]
+                    market_values[legs] = prices * ledger.quantities[legs]
+
+        missing = np.isnan(market_values)
+        if self.surface_fallback and missing.any():
+            for side, sides in (
+                ("BID", ledger.quantities > 0),
+                ("ASK", ledger.quantities < 0),
+            ):
+                legs = missing & sides
+                if legs.any():
+                    prices = self._surface_prices(
+                        ledger.expiries[legs],
+                        ledger.strikes[legs],
+                        ledger.directions[legs],
+                        side,
+                    )
+                    market_values[legs] = prices * ledger.quantities[legs]
+
+        # Expires worthless, no need to buy/sell
+        worthless = ledger.is_expiring(self.current_date) & ~ledger.is_itm(
+            self.underlying_last
+        )
+        market_values[worthless] = 0
+        return market_values, intrinsic_values
+
     def get_quotes(self, date=None):
         """Get the quotes for a given date.
 
@@ -152,3 +472,543 @@ class HistoricalMarket(Iterator):
             - [STRIKE_DISTANCE_PCT] - The distance of the strike from the underlying, as a percentage
         """
         return self.current_quotes
+
+
+class ColumnarMarket(HistoricalMarket):
+    """
+    The same as HistoricalMarket, but backed by contiguous NumPy arrays.
+
+    The quotes are sorted once (by date, then strike, then expiration),
+    each column is stored as a single array, and each day is just a pair of offsets.
+    Iterating over the market yields zero-copy views of the arrays,
+    instead of building a new DataFrame every day.
+
+    The quotes yielded while iterating are a dict of column name -> array,
+    so `quotes["[P_BID]"]` works as with a DataFrame (but returns an array).
+    A proper DataFrame is still available through `get_quotes()`, built on demand.
+
+    A market opened from compiled arrays (see `loaders.open_market`) also knows
+    their directory, `compiled_path`, and their `fingerprint` (both None otherwise).
+    """
+
+    def __init__(self, quotes_df, surface_fallback=False):
+        self.surface_fallback = surface_fallback
+        self.compiled_path = None
+        self.fingerprint = None
+        dates = quotes_df["[QUOTE_DATE]"].to_numpy(dtype="datetime64[ns]")
+        underlying = quotes_df["[UNDERLYING_LAST]"].to_numpy()
+        order = np.lexsort(
+            (
+                quotes_df["[EXPIRE_DATE]"].to_numpy(dtype="datetime64[ns]"),
+                quotes_df["[STRIKE]"].to_numpy(dtype=float),
+                underlying,
+                dates,
+            )
+        )
+        dates = dates[order]
+        underlying = underlying[order]
+
+        # A new day starts wherever the date (or the underlying price) changes,
+        # same as the groups in HistoricalMarket
+        starts = np.flatnonzero(
+            (dates[1:] != dates[:-1]) | (underlying[1:] != underlying[:-1])
+        )
+        starts = np.insert(starts + 1, 0, 0) if len(dates) else starts
+        columns = {
+            name: quotes_df[name].to_numpy()[order]
+            for name in quotes_df.columns
+            if name not in ("[QUOTE_DATE]", "[UNDERLYING_LAST]")
+        }
+        self._set_arrays(
+            dates[starts],
+            underlying[starts],
+            np.append(starts, len(dates)),
+            order,
+            columns,
+        )
+
+    @classmethod
+    def from_arrays(
+        cls, arrays, surface_fallback=False, compiled_path=None, fingerprint=None
+    ):
+        """Create a market from the arrays of another one, see `to_arrays()`.
+
+        The arrays are used as they are, without copying,
+        so they might as well be backed by shared memory or memory-mapped files.
+
+        :param compiled_path: the directory of the arrays, if compiled (see `open_market`)
+        :param fingerprint: the fingerprint of the arrays, if known (see ResultStore)
+        """
+        market = cls.__new__(cls)
+        market.surface_fallback = surface_fallback
+        market.compiled_path = compiled_path
+        market.fingerprint = fingerprint
+        arrays = dict(arrays)
+        market._set_arrays(
+            arrays.pop("dates"),
+            arrays.pop("underlying"),
+            arrays.pop("offsets"),
+            arrays.pop("positions"),
+            arrays,
+        )
+        return market
+
+    def to_arrays(self):
+        """Get all the arrays backing the market, as a dict of name -> array.
+
+        Besides the quote columns, these are:
+            dates - the date of each day
+            underlying - the underlying price of each day
+            offsets - where each day starts in the quote columns (plus the end)
+            positions - the original position of each quote, used to break ties
+        """
+        return {
+            "dates": self.dates,
+            "underlying": self.underlying,
+            "offsets": self._offsets,
+            "positions": self._positions,
+            **self._columns,
+        }
+
+    def _set_arrays(self, dates, underlying, offsets, positions, columns):
+        self.dates = dates
+        self.underlying = underlying
+        self._offsets = offsets
+        self._positions = positions
+        self._columns = columns
+        self._day = -1
+        self.current_date = None
+        self.underlying_last = None
+        self._current_columns = None
+        self._current_quotes = None
+        self._chain = None
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __next__(self):
+        """
+        Returns a tuple of three elements:
+            current_date : pd.Timestamp,
+            underlying_last : float,
+            quotes : dict of column name -> np.ndarray (views, don't modify them)
+        """
+        self.advance()
+        return self.current_date, self.underlying_last, self._day_columns()
+
+    def advance(self):
+        """Move to the next day, the quotes are only sliced when used."""
+        if self._day + 1 >= len(self.dates):
+            raise StopIteration
+        self._day += 1
+        self.current_date = pd.Timestamp(self.dates[self._day])
+        self.underlying_last = self.underlying[self._day]
+        self._current_columns = None
+        self._current_quotes = None
+        self._chain = None
+
+    def seek(self, day):
+        """Move to just before a day (its index in `dates`), the next `advance` lands on it.
+
+        A checkpoint of the market is just its day, so nothing is replayed,
+        e.g. to start some strategies in the middle of the history.
+        """
+        assert 0 <= day <= len(self.dates)
+        self._set_arrays(
+            self.dates, self.underlying, self._offsets, self._positions, self._columns
+        )
+        self._day = day - 1
+
+    def _day_columns(self):
+        # The quotes of the current day, as views of the arrays
+        if self._current_columns is None and self._day >= 0:
+            start, end = self._offsets[self._day], self._offsets[self._day + 1]
+            self._current_columns = {
+                name: values[start:end] for name, values in self._columns.items()
+            }
+        return self._current_columns
+
+    @property
+    def current_quotes(self):
+        if self._current_quotes is None and self._day_columns() is not None:
+            self._current_quotes = pd.DataFrame(self._current_columns)
+        return self._current_quotes
+
+    @property
+    def chain(self):
+        if self._chain is None:
+            # Already sorted by strike and expiration, so no need to sort again
+            start, end = self._offsets[self._day], self._offsets[self._day + 1]
+            self._chain = QuoteChain(
+                self._day_columns(),
+                self.current_date,
+                presorted=True,
+                positions=self._positions[start:end],
+            )
+        return self._chain
+
+
+class LazyMarket(HistoricalMarket):
+    """
+    A semisynthetic market, which prices the options only when asked for them.
+
+    Instead of the quotes, it only holds the underlying and the volatility
+    of each day, and prices each contract on demand (see ChainModel),
+    from a virtual chain - the same one `generate_chains` would generate.
+    The priced contracts are kept in a small LRU cache, cleared every day,
+    so memory is proportional to the contracts actually traded.
+
+    Note that any contract with a listed expiration and a strike on the grid
+    can be bought or sold, even if it's outside the strike range of the day.
+    """
+
+    def __init__(self, underlying, vix, cache_size=1024, **model_params):
+        """
+        :param underlying: pd.Series of the underlying's closing prices, by date
+        :param vix: pd.Series of the VIX, by date (only the dates in both are used)
+        :param cache_size: how many priced contracts to keep (per day)
+        :param model_params: see ChainModel
+        """
+        self.dates, self.underlying, self.vols = align(underlying, vix)
+        self.model = ChainModel(**model_params)
+        self.cache_size = cache_size
+        self._day = -1
+        self._cache = OrderedDict()
+        self.current_date = None
+        self.underlying_last = None
+        self._current_quotes = None
+        self._chain = None
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __next__(self):
+        """
+        Returns a tuple of three elements:
+            current_date : pd.Timestamp,
+            underlying_last : float,
+            quotes : None (nothing is priced until needed, see `get_quotes()`)
+        """
+        if self._day + 1 >= len(self.dates):
+            raise StopIteration
+        self._day += 1
+        self.current_date = self.dates[self._day]
+        self.underlying_last = self.underlying[self._day]
+        self._cache.clear()
+        self._current_quotes = None
+        self._chain = None
+        return self.current_date, self.underlying_last, None
+
+    @property
+    def current_quotes(self):
+        """The whole chain of the day, priced on first use."""
+        if self._current_quotes is None and self._day >= 0:
+            day = slice(self._day, self._day + 1)
+            self._current_quotes = self.model.chains(
+                self.dates[day], self.underlying[day], self.vols[day]
+            ).drop(columns=["[QUOTE_DATE]", "[UNDERLYING_LAST]"])
+        return self._current_quotes
+
+    def sell_to_open(self, ideal_strike, ideal_dte, min_dte=None):
+        """Write a put with the strike and dte closest to the ideal ones,
+        same as HistoricalMarket.sell_to_open, but without pricing the whole chain.
+        """
+        put = Put(
+            strike=self._nearest_strike(ideal_strike),
+            expiration=self._nearest_expiration(ideal_dte, min_dte),
+        )
+        return Position(option=put, quantity=-1, cost=self.sell(put))
+
+    def open_order(self, order):
+        """Open all the legs of an order, same as HistoricalMarket.open_order,
+        but pricing only the legs.
+        """
+        expiration = self._nearest_expiration(order.ideal_dte)
+        strikes = [self._nearest_strike(leg.ideal_strike) for leg in order.legs]
+        _check_widths(order, strikes)
+        positions = []
+        for leg, strike in zip(order.legs, strikes):
+            option = leg.OptionClass(strike, expiration)
+            cost = self.buy(option) if leg.quantity > 0 else self.sell(option)
+            positions.append(Position(option, quantity=leg.quantity, cost=cost))
+        return positions
+
+    def _nearest_strike(self, ideal_strike):
+        # The closest strike of the day's range, ties going to the lower one
+        model = self.model
+        lowest, highest = model.strike_range(self.underlying_last)
+        steps = np.clip(
+            np.ceil(ideal_strike / model.strike_step - 0.5), lowest, highest
+        )
+        return steps * model.strike_step
+
+    def _nearest_expiration(self, ideal_dte, min_dte=None):
+        # The closest listed expiration, ties going to the earlier one
+        model = self.model
+        first_dte = model.days_to_friday([self.current_date])[0]
+        lowest = 0
+        if min_dte is not None:
+            lowest = max(np.ceil((min_dte - first_dte) / 7), 0)
+            if lowest > model.expiries_per_day - 1:
+                raise IndexError(f"No quotes expiring in {min_dte} days or more")
+        weeks = np.clip(
+            np.ceil((ideal_dte - first_dte) / 7 - 0.5),
+            lowest,
+            model.expiries_per_day - 1,
+        )
+        return self.current_date + pd.Timedelta(days=first_dte + 7 * weeks)
+
+    def sell(self, option):
+        """Sell an option at the current bid price.
+
+        :raises IndexError: If the option isn't listed today
+        """
+        return self._quote(option)[0]
+
+    def buy(self, option):
+        """Buy an option at the current ask price.
+
+        :raises IndexError: If the option isn't listed today
+        """
+        return self._quote(option)[1]
+
+    def _quote(self, option):
+        key = (type(option), option.strike, option.expiry)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        dte = self._listed_dte(np.array([option.expiry]), np.array([option.strike]))[0]
+        if np.isnan(dte):
+            raise IndexError(f"{option} isn't listed on {self.current_date}")
+        quotes = self.model.price(
+            self.underlying_last, self.vols[self._day], option.strike, dte
+        )
+        prefix = "[P_" if option.direction < 0 else "[C_"
+        quote = (float(quotes[prefix + "BID]"]), float(quotes[prefix + "ASK]"]))
+
+        self._cache[key] = quote
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return quote
+
+    def _listed_dte(self, expiries, strikes):
+        # The dte of the contracts, or NaN for those which aren't listed today
+        model = self.model
+        dte = (expiries - to_day(self.current_date)).astype(float)
+        first_dte = model.days_to_friday([self.current_date])[0]
+        weeks = (dte - first_dte) / 7
+        steps = strikes / model.strike_step
+        listed = (
+            (weeks >= 0)
+            & (weeks < model.expiries_per_day)
+            & (weeks == np.round(weeks))
+            & np.isclose(steps, np.round(steps))
+        )
+        return np.where(listed, dte, np.nan)
+
+    def value_positions(self, positions):
+        """Value many positions at once, see HistoricalMarket.value_positions.
+
+        The contracts are priced all together, without touching the cache.
+        """
+        ledger = positions if isinstance(positions, Ledger) else Ledger(positions)
+        intrinsic_values = ledger.quantities * ledger.intrinsic_values(
+            self.underlying_last
+        )
+        if len(ledger) == 0:
+            return np.zeros(0), intrinsic_values
+
+        dte = self._listed_dte(ledger.expiries, ledger.strikes)
+        quotes = self.model.price(
+            self.underlying_last, self.vols[self._day], ledger.strikes, dte
+        )
+        puts = ledger.directions < 0
+        longs = ledger.quantities > 0
+        prices = np.where(
+            puts,
+            np.where(longs, quotes["[P_BID]"], quotes["[P_ASK]"]),
+            np.where(longs, quotes["[C_BID]"], quotes["[C_ASK]"]),
+        )
+        market_values = np.where(np.isnan(dte), np.nan, prices * ledger.quantities)
+
+        # Expires worthless, no need to buy/sell
+        worthless = ledger.is_expiring(self.current_date) & ~ledger.is_itm(
+            self.underlying_last
+        )
+        market_values[worthless] = 0
+        return market_values, intrinsic_values
+
+
+class PortfolioMarket(Iterator):
+    """
+    Several markets, one per symbol (e.g. SPY, QQQ, or semisynthetic ones),
+    moved forward in lockstep, on the trading days of any of them.
+
+    Each day, only the markets of the symbols quoted that day (`active`) move forward,
+    the others keep their last day. The markets stay separate (any kind of market,
+    e.g. memory-mapped ColumnarMarkets or LazyMarkets), so nothing is concatenated.
+
+    A strategy trades a single symbol, e.g. `SellWeeklyPuts(portfolio, symbol="QQQ")`
+    trades on `portfolio["QQQ"]`, only on the days QQQ is quoted (see Scheduler).
+    Anything else can trade any of them through the portfolio, passing the symbol
+    to `sell_to_open`, `buy`, `sell` or `open_order`. The positions remember their
+    symbol, so they can be closed and valued all together.
+    """
+
+    def __init__(self, markets):
+        """
+        :param markets: a dict of symbol -> market (which must not have started yet)
+        """
+        self.markets = dict(markets)
+        assert self.markets, "Needs at least one market"
+        self._dates = {
+            symbol: np.asarray(market.dates, dtype="datetime64[ns]")
+            for symbol, market in self.markets.items()
+        }
+        self.dates = np.unique(np.concatenate(list(self._dates.values())))
+        # The next day of each symbol, as (date, symbol, index of that day)
+        self._queue = [
+            (dates[0], symbol, 0) for symbol, dates in self._dates.items() if len(dates)
+        ]
+        heapq.heapify(self._queue)
+        self._day = -1
+        self.current_date = None
+        self.active = []
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, symbol):
+        return self.markets[symbol]
+
+    @property
+    def symbols(self):
+        return list(self.markets)
+
+    @property
+    def underlying_last(self):
+        """The last price of each symbol (as of the last day it was quoted)."""
+        return {
+            symbol: market.underlying_last
+            for symbol, market in self.markets.items()
+            if market.underlying_last is not None
+        }
+
+    def __next__(self):
+        """
+        Returns a tuple of three elements:
+            current_date : pd.Timestamp,
+            underlying_last : dict of symbol -> float (the active symbols only),
+            active : the symbols quoted today (see `get_quotes(symbol)` for the quotes)
+        """
+        self.advance()
+        return (
+            self.current_date,
+            {symbol: self.markets[symbol].underlying_last for symbol in self.active},
+            self.active,
+        )
+
+    def advance(self):
+        """Move to the next day, moving only the markets of the symbols quoted that day."""
+        if self._day + 1 >= len(self.dates):
+            raise StopIteration
+        self._day += 1
+        today = self.dates[self._day]
+        self.current_date = pd.Timestamp(today)
+        active = []
+        while self._queue and self._queue[0][0] == today:
+            _, symbol, i = heapq.heappop(self._queue)
+            self.markets[symbol].advance()
+            active.append(symbol)
+            dates = self._dates[symbol]
+            if i + 1 < len(dates):
+                heapq.heappush(self._queue, (dates[i + 1], symbol, i + 1))
+        self.active = sorted(active)
+
+    def _symbol(self, symbol):
+        # The symbol can only be left out with a single market
+        if symbol is None:
+            assert len(self.markets) == 1, "Which symbol?"
+            return next(iter(self.markets))
+        assert symbol in self.markets, f"Unknown symbol {symbol}"
+        return symbol
+
+    def _market(self, symbol):
+        # The market of a symbol, which must be quoted today
+        symbol = self._symbol(symbol)
+        if symbol not in self.active:
+            raise IndexError(f"{symbol} isn't quoted on {self.current_date}")
+        return symbol, self.markets[symbol]
+
+    def get_quotes(self, symbol=None):
+        return self._market(symbol)[1].get_quotes()
+
+    def sell_to_open(self, ideal_strike, ideal_dte, symbol=None):
+        """Write a put, see `HistoricalMarket.sell_to_open`.
+
+        :raises IndexError: If the symbol isn't quoted today
+        """
+        symbol, market = self._market(symbol)
+        position = market.sell_to_open(ideal_strike, ideal_dte)
+        position.symbol = symbol
+        return position
+
+    def open_order(self, order, symbol=None):
+        """Open all the legs of an order, see `HistoricalMarket.open_order`."""
+        symbol, market = self._market(symbol)
+        positions = market.open_order(order)
+        for position in positions:
+            position.symbol = symbol
+        return positions
+
+    def buy(self, option, symbol=None):
+        return self._market(symbol)[1].buy(option)
+
+    def sell(self, option, symbol=None):
+        return self._market(symbol)[1].sell(option)
+
+    def close(self, position, dry_run=False):
+        """Close a position, on the market of its symbol (see `HistoricalMarket.close`)."""
+        return self._market(position.symbol)[1].close(position, dry_run=dry_run)
+
+    def close_positions(self, positions):
+        """Close many positions at once, see `HistoricalMarket.close_positions`."""
+        ledger = Ledger(positions)
+        market_values, _ = self.value_positions(ledger)
+        if np.isnan(market_values).any():
+            raise IndexError(
+                f"Not all of {positions} are quoted on {self.current_date}"
+            )
+        ledger.close(self.current_date, market_values)
+        return market_values.sum()
+
+    def value_positions(self, positions):
+        """Value many positions at once, each symbol's in one batch
+        (see `HistoricalMarket.value_positions`).
+
+        The positions of the symbols which aren't quoted today have no market value
+        (NaN), and their intrinsic value is as of their symbol's last price.
+        """
+        ledger = positions if isinstance(positions, Ledger) else Ledger(positions)
+        market_values = np.full(len(ledger), np.nan)
+        intrinsic_values = np.full(len(ledger), np.nan)
+        by_symbol = {}
+        for i, position in enumerate(ledger.positions):
+            by_symbol.setdefault(position.symbol, []).append(i)
+        for symbol, rows in by_symbol.items():
+            symbol = self._symbol(symbol)
+            market = self.markets[symbol]
+            if market.underlying_last is None:
+                continue
+            symbol_ledger = Ledger([ledger.positions[i] for i in rows])
+            if symbol in self.active:
+                market_values[rows], intrinsic_values[rows] = market.value_positions(
+                    symbol_ledger
+                )
+            else:
+                intrinsic_values[rows] = (
+                    symbol_ledger.quantities
+                    * symbol_ledger.intrinsic_values(market.underlying_last)
+                )
+        return market_values, intrinsic_values
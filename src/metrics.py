@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Trading days in a year, to annualize the daily statistics
+PERIODS_PER_YEAR = 252
+
+
+def returns(curves):
+    """The returns of each day (NaN whenever the previous value isn't positive).
+
+    All the metrics take the curves as an array of shape (strategies, days),
+    e.g. the market values recorded by an EquityRecorder, or a single curve (days,).
+
+    :returns: An array of shape (strategies, days - 1)
+    """
+    curves = np.asarray(curves, dtype=float)
+    previous = curves[..., :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(previous > 0, curves[..., 1:] / previous - 1, np.nan)
+
+
+def cagr(curves, dates):
+    """The compound annual growth rate, from the first to the last day.
+
+    :param dates: the dates of the days (pd.DatetimeIndex)
+    """
+    curves = np.asarray(curves, dtype=float)
+    dates = pd.DatetimeIndex(dates)
+    years = (dates[-1] - dates[0]).days / 365.25
+    first, last = curves[..., 0], curves[..., -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(
+            (first > 0) & (last >= 0) & (years > 0),
+            (last / first) ** (1 / years) - 1,
+            np.nan,
+        )
+
+
+def drawdowns(curves):
+    """The drop of each day from the running peak, relative to that peak (0.2 for -20%)."""
+    curves = np.asarray(curves, dtype=float)
+    peaks = np.maximum.accumulate(curves, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(peaks > 0, 1 - curves / peaks, 0)
+
+
+def max_drawdown(curves):
+    """The largest drawdown of each curve, see `drawdowns`."""
+    return drawdowns(curves).max(axis=-1)
+
+
+def max_drawdown_duration(curves):
+    """The longest time each curve stayed below its previous peak, in days."""
+    curves = np.asarray(curves, dtype=float)
+    underwater = curves < np.maximum.accumulate(curves, axis=-1)
+    days = np.broadcast_to(np.arange(curves.shape[-1]), curves.shape)
+    # The last day at a peak, as of each day
+    last_peak = np.maximum.accumulate(np.where(underwater, 0, days), axis=-1)
+    return (days - last_peak).max(axis=-1)
+
+
+def volatility(curves, periods_per_year=PERIODS_PER_YEAR):
+    """The annualized standard deviation of the returns."""
+    return np.nanstd(returns(curves), axis=-1, ddof=1) * np.sqrt(periods_per_year)
+
+
+def sharpe_ratio(curves, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """The annualized Sharpe ratio.
+
+    :param risk_free: the annual risk-free rate (0.02 for 2%)
+    """
+    excess = returns(curves) - risk_free / periods_per_year
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (
+            np.nanmean(excess, axis=-1)
+            / np.nanstd(excess, axis=-1, ddof=1)
+            * np.sqrt(periods_per_year)
+        )
+
+
+def sortino_ratio(curves, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR):
+    """The annualized Sortino ratio, like the Sharpe ratio, but only the losses count."""
+    excess = returns(curves) - risk_free / periods_per_year
+    downside = np.sqrt(np.nanmean(np.minimum(excess, 0) ** 2, axis=-1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nanmean(excess, axis=-1) / downside * np.sqrt(periods_per_year)
+
+
+def rolling_returns(curves, window):
+    """The return over the last `window` days, as of each day (NaN for the first ones)."""
+    curves = np.asarray(curves, dtype=float)
+    result = np.full(curves.shape, np.nan)
+    previous = curves[..., :-window]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result[..., window:] = np.where(
+            previous > 0, curves[..., window:] / previous - 1, np.nan
+        )
+    return result
+
+
+def rolling_volatility(curves, window, periods_per_year=PERIODS_PER_YEAR):
+    """The annualized volatility of the last `window` days' returns, as of each day."""
+    daily = returns(curves)
+    result = np.full(np.shape(curves), np.nan)
+    if daily.shape[-1] >= window:
+        windows = sliding_window_view(daily, window, axis=-1)
+        result[..., window:] = np.nanstd(windows, axis=-1, ddof=1) * np.sqrt(
+            periods_per_year
+        )
+    return result
+
+
+def summary(
+    curves, dates, names=None, risk_free=0.0, periods_per_year=PERIODS_PER_YEAR
+):
+    """All the metrics of many curves, side by side.
+
+    :param curves: an array of shape (strategies, days)
+    :param dates: the dates of the days
+    :param names: the name of each strategy (the index of the result)
+    :returns: A Pandas dataframe with one row per strategy
+    """
+    curves = np.atleast_2d(np.asarray(curves, dtype=float))
+    return pd.DataFrame(
+        {
+            "final_value": curves[:, -1],
+            "cagr": cagr(curves, dates),
+            "volatility": volatility(curves, periods_per_year),
+            "sharpe": sharpe_ratio(curves, risk_free, periods_per_year),
+            "sortino": sortino_ratio(curves, risk_free, periods_per_year),
+            "max_drawdown": max_drawdown(curves),
+            "max_drawdown_days": max_drawdown_duration(curves),
+        },
+        index=names,
+    )
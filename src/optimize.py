@@ -0,0 +1,234 @@
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src import sweep
+from src.markets import ColumnarMarket
+from src.scheduler import Scheduler
+from src.strategies import get_market_values
+from src.sweep import expand_grid
+
+
+def profit(curves):
+    """The default score: how much each strategy made over the window.
+
+    A score takes the curves of shape (strategies, days + 1), the first column
+    being the value at the start of the window, and returns one number each
+    (the higher the better, NaN for the worst), e.g. `metrics.sharpe_ratio`.
+    """
+    return curves[:, -1] - curves[:, 0]
+
+
+def successive_halving(
+    market, combinations, start, end, capital=0, min_days=20, eta=2, score=profit
+):
+    """Find the best combinations over a window of days, without running all of them to its end.
+
+    All the combinations run side by side on the first `min_days` of the window,
+    then only the best 1/eta of them go on, for eta times as many days, and so on,
+    until the end of the window. The survivors are never replayed: they just carry on
+    from where they were, and the market starts right at the window (see `seek`).
+
+    :param market: a ColumnarMarket (moved to the window, then through it)
+    :param combinations: a list of (StrategyClass, params), see `expand_grid`
+    :param start: the first day of the window (its index in `market.dates`)
+    :param end: the day after the window
+    :param score: how to rank the strategies, see `profit`
+    :returns: A Pandas dataframe with one row per combination:
+        - strategy - The name of the strategy class
+        - one column per parameter
+        - days - How many days of the window it was run for
+        - score - Its score over those days
+    """
+    race = _race(market, combinations, start, end, capital, min_days, eta, score)
+    return _frame(combinations, days=race.days, score=race.scores)
+
+
+def walk_forward(
+    quotes_df,
+    strategy_classes,
+    param_grid,
+    train_days,
+    test_days,
+    capital=0,
+    min_days=20,
+    eta=2,
+    score=profit,
+    max_workers=1,
+):
+    """Pick the parameters on a rolling window of days, and test them on the next one.
+
+    Each fold picks the best combination on its `train_days` (in-sample,
+    by successive halving, see `successive_halving`), which then just carries on
+    for the next `test_days` (out-of-sample), as it would if it were deployed then.
+    The next fold starts `test_days` later. Each fold starts its market right at
+    its first day, so nothing before it is replayed.
+
+    :param quotes_df: the quotes, or an already indexed ColumnarMarket (see `run_sweep`)
+    :param strategy_classes: a list of Strategy subclasses
+    :param param_grid: a dict of parameter name -> list of values
+    :param max_workers: how many processes run the folds (1 means running in this
+        process), the score must be picklable then (e.g. a module-level function)
+    :returns: A Pandas dataframe with one row per fold:
+        - train_start, test_start, test_end - The first dates (and the last one)
+        - strategy - The name of the chosen strategy class
+        - one column per parameter
+        - in_sample - The score of the chosen combination on the training days
+        - out_of_sample - Its score on the test days
+        - test_curve - Its market value on each test day (np.ndarray)
+        - days_run - How many days the strategies were run for, all together
+        - grid_days - How many a full grid would have needed in-sample
+    """
+    assert train_days > 0 and test_days > 0
+    combinations = expand_grid(strategy_classes, param_grid)
+    if isinstance(quotes_df, ColumnarMarket):
+        market = quotes_df
+    else:
+        market = ColumnarMarket(quotes_df)
+    starts = list(range(0, len(market) - train_days, test_days))
+    args = (combinations, train_days, test_days, capital, min_days, eta, score)
+
+    if max_workers == 1:
+        rows = [
+            _run_fold(
+                ColumnarMarket.from_arrays(market.to_arrays(), market.surface_fallback),
+                start,
+                *args,
+            )
+            for start in starts
+        ]
+    else:
+        rows = _run_folds_in_pool(market, starts, args, max_workers)
+
+    names = list(param_grid)
+    return pd.DataFrame(
+        [
+            {
+                "train_start": market.dates[start],
+                "test_start": market.dates[start + train_days],
+                "test_end": market.dates[
+                    min(start + train_days + test_days, len(market)) - 1
+                ],
+                "strategy": StrategyClass.__name__,
+                **{name: params[name] for name in names},
+                **row,
+            }
+            for start, ((StrategyClass, params), row) in zip(starts, rows)
+        ]
+    )
+
+
+class _Race:
+    # The state of a successive halving, see `_race`
+    def __init__(self, strategies, scheduler, days, scores, survivors):
+        self.strategies = strategies
+        self.scheduler = scheduler
+        self.days = days
+        self.scores = scores
+        self.survivors = survivors
+
+
+def _race(market, combinations, start, end, capital, min_days, eta, score):
+    assert min_days > 0 and eta > 1
+    end = min(end, len(market))
+    assert 0 <= start < end
+    market.seek(start)
+    strategies = [
+        StrategyClass(market, capital=capital, **params)
+        for StrategyClass, params in combinations
+    ]
+    scheduler = Scheduler(market, strategies)
+
+    length = end - start
+    curves = np.full((len(strategies), length + 1), np.nan)
+    curves[:, 0] = capital
+    days = np.zeros(len(strategies), dtype=int)
+    scores = np.full(len(strategies), np.nan)
+    survivors = np.arange(len(strategies))
+    day, budget = 0, min(min_days, length)
+    while True:
+        running = [strategies[i] for i in survivors]
+        for _ in itertools.islice(scheduler, budget - day):
+            day += 1
+            # Valued every day, as in run_sweep
+            curves[survivors, day] = get_market_values(running)
+        days[survivors] = day
+        scores[survivors] = score(curves[survivors, : day + 1])
+        if day >= length:
+            break
+        # The best first (NaN last), the earlier combination on a tie
+        ranked = survivors[np.argsort(-scores[survivors], kind="stable")]
+        keep = math.ceil(len(survivors) / eta)
+        scheduler.drop(ranked[keep:].tolist())
+        survivors = np.sort(ranked[:keep])
+        budget = min(budget * eta, length)
+    return _Race(strategies, scheduler, days, scores, survivors)
+
+
+def _run_fold(
+    market, start, combinations, train_days, test_days, capital, min_days, eta, score
+):
+    # The chosen combination and the row of the fold (see `walk_forward`)
+    race = _race(
+        market, combinations, start, start + train_days, capital, min_days, eta, score
+    )
+    best = race.survivors[np.argsort(-race.scores[race.survivors], kind="stable")[0]]
+    race.scheduler.drop([i for i in race.survivors if i != best])
+
+    # The chosen one carries on, from its value at the end of the training days
+    strategy = race.strategies[best]
+    curve = [get_market_values([strategy])[0]]
+    for _ in itertools.islice(race.scheduler, test_days):
+        curve.extend(get_market_values([strategy]))
+    curve = np.array(curve)
+    return combinations[best], {
+        "in_sample": race.scores[best],
+        "out_of_sample": score(curve[None])[0],
+        "test_curve": curve[1:],
+        "days_run": race.days.sum() + len(curve) - 1,
+        "grid_days": len(combinations) * train_days,
+    }
+
+
+def _run_folds_in_pool(market, starts, args, max_workers):
+    max_workers = max_workers or os.cpu_count() or 1
+    if market.compiled_path is not None:
+        blocks, initializer, initargs = [], sweep._open, (market.compiled_path,)
+    else:
+        blocks, specs = sweep._share(market.to_arrays())
+        initializer, initargs = sweep._attach, (specs,)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=initializer, initargs=initargs
+        ) as executor:
+            return list(
+                executor.map(
+                    _run_fold_in_worker,
+                    starts,
+                    itertools.repeat(args),
+                    itertools.repeat(market.surface_fallback),
+                )
+            )
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _run_fold_in_worker(start, args, surface_fallback):
+    market = ColumnarMarket.from_arrays(sweep._worker_arrays, surface_fallback)
+    return _run_fold(market, start, *args)
+
+
+def _frame(combinations, **columns):
+    # One row per combination, as in `run_sweep`
+    return pd.DataFrame(
+        [
+            {"strategy": StrategyClass.__name__, **params}
+            for StrategyClass, params in combinations
+        ]
+    ).assign(**columns)
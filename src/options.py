@@ -1,10 +1,54 @@
+import weakref
 from abc import abstractmethod
 
+import pandas as pd
+
+_NS_PER_DAY = 24 * 60 * 60 * 10**9
+
+
+def to_day(date):
+    """Convert a date to its day number (days since 1970-01-01), see `Option.expiry`."""
+    return pd.Timestamp(date).value // _NS_PER_DAY
+
 
 class Option:
-    def __init__(self, strike, expiration):
-        self.strike = strike
-        self.expiration = expiration
+    """
+    An option contract, immutable.
+
+    Contracts are interned: creating the same contract twice (same type,
+    strike and expiration day) returns the very same object,
+    so millions of positions on a few thousand contracts stay cheap.
+
+    Besides the `expiration` (pd.Timestamp), each contract has its `expiry`,
+    the day number of the expiration, handy for integer comparisons and arrays.
+    """
+
+    __slots__ = ("strike", "expiration", "expiry", "__weakref__")
+
+    # Whether the option pays when the underlying goes down (-1) or up (+1)
+    direction = None
+
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, strike, expiration):
+        strike = float(strike)
+        expiry = to_day(expiration)
+        key = (cls, strike, expiry)
+        option = Option._instances.get(key)
+        if option is None:
+            option = super().__new__(cls)
+            object.__setattr__(option, "strike", strike)
+            object.__setattr__(option, "expiration", pd.Timestamp(expiration))
+            object.__setattr__(option, "expiry", expiry)
+            Option._instances[key] = option
+        return option
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        # Unpickling goes through __new__, so it's interned again
+        return type(self), (self.strike, self.expiration)
 
     @abstractmethod
     def is_itm(self, underlying):
@@ -26,6 +70,9 @@ class Option:
 
 
 class Put(Option):
+    __slots__ = ()
+    direction = -1
+
     def is_itm(self, underlying):
         return underlying < self.strike
 
@@ -33,6 +80,12 @@ class Put(Option):
         return f"Put({self.strike}, {self.expiration})"
 
 
-# class Call(Option):
-#     def is_itm(self, underlying):
-#         return underlying > self.strike
+class Call(Option):
+    __slots__ = ()
+    direction = 1
+
+    def is_itm(self, underlying):
+        return underlying > self.strike
+
+    def __repr__(self):
+        return f"Call({self.strike}, {self.expiration})"
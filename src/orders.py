@@ -0,0 +1,83 @@
+from src.options import Call, Put
+
+
+class Leg:
+    """One leg of an order: which option, how close to which strike, how many."""
+
+    __slots__ = ("OptionClass", "ideal_strike", "quantity")
+
+    def __init__(self, OptionClass, ideal_strike, quantity):
+        """
+        :param OptionClass: Put or Call
+        :param ideal_strike: the ideal strike price (the closest one is used)
+        :param quantity: positive to buy, negative to sell
+        """
+        assert ideal_strike > 0
+        assert quantity != 0
+        self.OptionClass = OptionClass
+        self.ideal_strike = ideal_strike
+        self.quantity = quantity
+
+    def __repr__(self):
+        return f"Leg({self.OptionClass.__name__}, {self.ideal_strike}, {self.quantity})"
+
+
+class Order:
+    """
+    Some options, opened together as a single order (see `market.open_order`).
+
+    All the legs share the same expiration, the one with the dte closest to the ideal,
+    and each leg gets the strike closest to its ideal one.
+    """
+
+    def __init__(self, legs, ideal_dte):
+        assert legs, "An order needs at least one leg"
+        self.legs = list(legs)
+        self.ideal_dte = ideal_dte
+
+    def __repr__(self):
+        return f"Order({self.legs}, {self.ideal_dte})"
+
+    @classmethod
+    def put_spread(cls, short_strike, long_strike, ideal_dte, quantity=1):
+        """Sell a put, and buy another one (usually with a lower strike, as a hedge)."""
+        return cls(
+            [Leg(Put, short_strike, -quantity), Leg(Put, long_strike, quantity)],
+            ideal_dte,
+        )
+
+    @classmethod
+    def call_spread(cls, short_strike, long_strike, ideal_dte, quantity=1):
+        """Sell a call, and buy another one (usually with a higher strike, as a hedge)."""
+        return cls(
+            [Leg(Call, short_strike, -quantity), Leg(Call, long_strike, quantity)],
+            ideal_dte,
+        )
+
+    @classmethod
+    def strangle(cls, put_strike, call_strike, ideal_dte, quantity=-1):
+        """A put and a call with different strikes (sold, by default)."""
+        return cls(
+            [Leg(Put, put_strike, quantity), Leg(Call, call_strike, quantity)],
+            ideal_dte,
+        )
+
+    @classmethod
+    def iron_condor(
+        cls, long_put, short_put, short_call, long_call, ideal_dte, quantity=1
+    ):
+        """A put spread and a call spread, both sold (the strikes in ascending order)."""
+        return cls(
+            cls.put_spread(short_put, long_put, ideal_dte, quantity).legs
+            + cls.call_spread(short_call, long_call, ideal_dte, quantity).legs,
+            ideal_dte,
+        )
+
+    @classmethod
+    def synthetic_long(cls, strike, ideal_dte, quantity=1):
+        """Buy a call and sell a put with the same strike, the same as holding
+        the underlying (e.g. instead of being assigned, see the README)."""
+        return cls(
+            [Leg(Call, strike, quantity), Leg(Put, strike, -quantity)],
+            ideal_dte,
+        )
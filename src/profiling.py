@@ -0,0 +1,245 @@
+import functools
+import json
+import os
+import time
+
+import pandas as pd
+
+# What to time, by default: the name of each method, and its category
+MARKET_METHODS = (
+    "advance",
+    "sell_to_open",
+    "roll",
+    "open_order",
+    "close",
+    "close_positions",
+    "value_positions",
+)
+STRATEGY_METHODS = (
+    "handle_expiring_positions",
+    "handle_open_positions",
+    "handle_no_open_positions",
+    "next_wakeup",
+    "record",
+)
+WALLET_METHODS = (
+    "add_position",
+    "get_expiring_positions",
+    "get_open_positions",
+    "get_held_positions",
+    "get_ledger",
+)
+
+
+class Profiler:
+    """
+    Opt-in timings of a backtest: the calls of the market, strategy and wallet methods,
+    the time of each strategy, and the days per second.
+
+    Only the instrumented objects are timed: their methods are wrapped
+    on the instances themselves (see `instrument`), so without a profiler
+    nothing at all changes, and there's no overhead.
+
+        profiler = Profiler()
+        profiler.instrument_market(market)
+        profiler.instrument_strategy(strategy)
+        for _ in profiler.iterate(market):
+            strategy.run()
+        profiler.detach()
+        print(profiler.summary())
+    """
+
+    def __init__(self, trace=False):
+        """
+        :param trace: whether to keep every call as an event, for `save_trace`
+            (otherwise, just the totals)
+        """
+        self.trace = trace
+        # name -> [calls, nanoseconds]
+        self.stats = {}
+        # strategy label -> nanoseconds in its `run()`
+        self.strategies = {}
+        self.days = 0
+        self.ns = 0
+        # The Chrome trace events, see `save_trace`
+        self.events = []
+        # The (object, method name) pairs wrapped so far, see `detach`
+        self._wrapped = []
+
+    def _add(self, name, start, end, category, label=None):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = [0, 0]
+        stat[0] += 1
+        stat[1] += end - start
+        if self.trace:
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": (end - start) / 1000,
+                "pid": os.getpid(),
+                "tid": 0,
+            }
+            if label is not None:
+                event["args"] = {"strategy": label}
+            self.events.append(event)
+
+    def timed(self, name, function, category="", label=None):
+        """Wrap a function, so that its calls are timed under the name."""
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._add(name, start, clock(), category, label)
+
+        return wrapper
+
+    def instrument(self, obj, methods, category=""):
+        """Time some methods of an object (not of its class), as `Class.method`.
+
+        :returns: The object, for convenience
+        """
+        for method in methods:
+            if not hasattr(obj, method):
+                continue
+            name = f"{type(obj).__name__}.{method}"
+            setattr(obj, method, self.timed(name, getattr(obj, method), category))
+            self._wrapped.append((obj, method))
+        return obj
+
+    def instrument_market(self, market):
+        return self.instrument(market, MARKET_METHODS, "market")
+
+    def instrument_strategy(self, strategy, label=None):
+        """Time the phases of a strategy's `run()`, its wallet, and the run itself.
+
+        :param label: the strategy's name in `strategy_summary` (its repr by default)
+        """
+        label = repr(strategy) if label is None else label
+        self.instrument(strategy, STRATEGY_METHODS, "strategy")
+        self.instrument(strategy.wallet, WALLET_METHODS, "wallet")
+
+        run, clock = strategy.run, time.perf_counter_ns
+        self.strategies.setdefault(label, 0)
+
+        @functools.wraps(run)
+        def timed_run():
+            start = clock()
+            try:
+                return run()
+            finally:
+                end = clock()
+                self.strategies[label] += end - start
+                self._add("Strategy.run", start, end, "strategy", label)
+
+        strategy.run = timed_run
+        self._wrapped.append((strategy, "run"))
+        return strategy
+
+    def iterate(self, market):
+        """Iterate over the market's days, timing each step (and the whole loop).
+
+        :param market: a market, or anything else iterating over its days (a Scheduler)
+        """
+        clock = time.perf_counter_ns
+        name = f"{type(market).__name__}.__next__"
+        iterator = iter(market)
+        loop_start = clock()
+        try:
+            while True:
+                start = clock()
+                try:
+                    day = next(iterator)
+                except StopIteration:
+                    return
+                self._add(name, start, clock(), "market")
+                self.days += 1
+                yield day
+        finally:
+            self.ns += clock() - loop_start
+
+    def detach(self):
+        """Remove all the wrappers, the objects behave exactly as before."""
+        for obj, method in reversed(self._wrapped):
+            vars(obj).pop(method, None)
+        self._wrapped = []
+
+    def merge(self, other):
+        """Add the timings of another profiler, e.g. from another process."""
+        for name, (calls, ns) in other.stats.items():
+            stat = self.stats.setdefault(name, [0, 0])
+            stat[0] += calls
+            stat[1] += ns
+        for label, ns in other.strategies.items():
+            self.strategies[label] = self.strategies.get(label, 0) + ns
+        self.days += other.days
+        self.ns += other.ns
+        self.events.extend(other.events)
+
+    def __getstate__(self):
+        # The wrapped objects stay in their own process
+        return {**vars(self), "_wrapped": []}
+
+    @property
+    def seconds(self):
+        """The time spent in the loops over the days (see `iterate`)."""
+        return self.ns / 1e9
+
+    @property
+    def days_per_second(self):
+        return self.days / self.seconds if self.ns else float("nan")
+
+    def summary(self):
+        """The timings of each method, the slowest first.
+
+        :returns: A Pandas dataframe, one row per method: calls, seconds,
+            mean_us (per call), and share (of the time in the loops)
+        """
+        frame = pd.DataFrame.from_dict(
+            self.stats, orient="index", columns=["calls", "ns"]
+        )
+        frame["seconds"] = frame["ns"] / 1e9
+        frame["mean_us"] = frame["ns"] / frame["calls"] / 1000
+        frame["share"] = frame["ns"] / self.ns if self.ns else float("nan")
+        return frame.drop(columns="ns").sort_values("seconds", ascending=False)
+
+    def strategy_summary(self):
+        """The time of each strategy's runs, and its share of all of them."""
+        frame = pd.DataFrame.from_dict(
+            self.strategies, orient="index", columns=["ns"], dtype=float
+        )
+        frame["seconds"] = frame["ns"] / 1e9
+        total = frame["ns"].sum()
+        frame["share"] = frame["ns"] / total if total else float("nan")
+        return frame.drop(columns="ns")
+
+    def to_dict(self):
+        """All the totals, JSON serializable."""
+        return {
+            "days": self.days,
+            "seconds": self.seconds,
+            "days_per_second": self.days_per_second,
+            "methods": {
+                name: {"calls": calls, "seconds": ns / 1e9}
+                for name, (calls, ns) in self.stats.items()
+            },
+            "strategies": {label: ns / 1e9 for label, ns in self.strategies.items()},
+        }
+
+    def save_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def save_trace(self, path):
+        """Save the calls as a Chrome trace (see chrome://tracing or Perfetto).
+
+        Needs `trace=True`, otherwise only the totals are kept.
+        """
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,151 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from src.options import to_day
+
+
+class Wakeup:
+    """
+    When a strategy needs to run next (see `Strategy.next_wakeup`):
+    on a date, or as soon as the underlying closes at or beyond a price,
+    whichever comes first. Either way, not before the next trading day.
+    """
+
+    __slots__ = ("date", "below", "above")
+
+    def __init__(self, date=None, below=None, above=None):
+        """
+        :param date: the date to run on (or the first trading day after it)
+        :param below: run once the underlying is at or below this price
+        :param above: run once the underlying is at or above this price
+        """
+        self.date = date
+        self.below = below
+        self.above = above
+
+    def __repr__(self):
+        return f"Wakeup({self.date}, below={self.below}, above={self.above})"
+
+    @classmethod
+    def weekday(cls, date, weekday):
+        """The next given weekday after the date (0 for Mondays), e.g. every Monday."""
+        date = pd.Timestamp(date)
+        return cls(
+            date=date + pd.Timedelta(days=(weekday - date.weekday() - 1) % 7 + 1)
+        )
+
+    @classmethod
+    def before_expiration(cls, expiration, dte):
+        """When there are `dte` days left until the expiration."""
+        return cls(date=pd.Timestamp(expiration) - pd.Timedelta(days=dte))
+
+
+class Scheduler:
+    """
+    Runs many strategies over a market, each of them only on the days it's due.
+
+    After each run, a strategy tells when it needs to run next (see `Wakeup`),
+    and its wake-up goes into a priority queue, by day. Each day, only the strategies
+    due that day are run; the price triggers are checked against the underlying.
+    On the days none is due, the market just moves on (see `market.advance`),
+    without preparing the quotes at all.
+
+        scheduler = Scheduler(market, strategies)
+        for date, due in scheduler:
+            ...  # e.g. record(strategies)
+
+    Running every strategy on every day gives the same results,
+    as long as the strategies don't wake up too late (see `Strategy.next_wakeup`).
+    """
+
+    def __init__(self, market, strategies):
+        self.market = market
+        self.strategies = list(strategies)
+        # (day number, strategy index, version), the stale versions are skipped
+        self._queue = [(-1, i, 0) for i in range(len(self.strategies))]
+        self._versions = [0] * len(self.strategies)
+        # The price triggers, by strategy index (NaN if none)
+        self._below = np.full(len(self.strategies), np.nan)
+        self._above = np.full(len(self.strategies), np.nan)
+        # How many strategies have a price trigger
+        self._triggers = 0
+        # How many times the strategies were run, in total
+        self.runs = 0
+
+    def __iter__(self):
+        """Move through all the days of the market, running the due strategies.
+
+        :returns: A generator of (date, the indices of the strategies run that day)
+        """
+        while True:
+            try:
+                self.market.advance()
+            except StopIteration:
+                return
+            due = self._due()
+            for i in due:
+                self.strategies[i].run()
+                self._schedule(i)
+            self.runs += len(due)
+            yield self.market.current_date, due
+
+    def run(self):
+        """Run the strategies over all the days, without looking at each day."""
+        for _ in self:
+            pass
+
+    def drop(self, indices):
+        """Stop running some of the strategies, e.g. the ones pruned by an optimizer."""
+        for i in indices:
+            self._versions[i] += 1
+            self._clear_triggers(i)
+
+    def _clear_triggers(self, i):
+        if not (np.isnan(self._below[i]) and np.isnan(self._above[i])):
+            self._triggers -= 1
+        self._below[i] = self._above[i] = np.nan
+
+    def _due(self):
+        today = to_day(self.market.current_date)
+        due = set()
+        queue = self._queue
+        while queue and queue[0][0] <= today:
+            _, i, version = heapq.heappop(queue)
+            if version == self._versions[i]:
+                due.add(i)
+        if self._triggers:
+            prices = self.market.underlying_last
+            if isinstance(prices, dict):
+                # A PortfolioMarket, each strategy's own underlying
+                prices = np.array(
+                    [s.market.underlying_last for s in self.strategies], dtype=float
+                )
+            with np.errstate(invalid="ignore"):
+                triggered = (prices <= self._below) | (prices >= self._above)
+            due.update(np.flatnonzero(triggered).tolist())
+        # On a PortfolioMarket, the strategies whose symbol isn't quoted today wait
+        waiting = {i for i in due if not self.strategies[i].is_quoted()}
+        for i in waiting:
+            heapq.heappush(queue, (today + 1, i, self._versions[i]))
+        return sorted(due - waiting)
+
+    def _schedule(self, i):
+        # The day after today at the earliest, every day if the strategy doesn't say
+        tomorrow = to_day(self.market.current_date) + 1
+        wakeup = self.strategies[i].next_wakeup()
+        self._versions[i] += 1
+        self._clear_triggers(i)
+        if wakeup is None:
+            day = tomorrow
+        else:
+            day = None if wakeup.date is None else max(to_day(wakeup.date), tomorrow)
+            if wakeup.below is not None:
+                self._below[i] = wakeup.below
+            if wakeup.above is not None:
+                self._above[i] = wakeup.above
+            if wakeup.below is not None or wakeup.above is not None:
+                self._triggers += 1
+        if day is not None:
+            heapq.heappush(self._queue, (day, i, self._versions[i]))
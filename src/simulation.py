@@ -0,0 +1,383 @@
+import math
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.markets import LazyMarket
+from src.metrics import max_drawdown
+from src.synthetic import ChainModel
+from src.vectorized import IDEAL_DTE
+
+# The parameters of the put-writing strategies supported by `put_writing_curves`
+VECTORIZED_PARAMS = {"ideal_strike", "hold_the_strike"}
+
+
+class PathModel(ABC):
+    """
+    A model of the underlying, to simulate its price and volatility paths.
+
+    Each path gets its own random stream (see `path_rngs`), which draws
+    the random inputs of its steps (`draw`), and then all paths are evolved
+    together, with array operations (`evolve`).
+    """
+
+    @abstractmethod
+    def draw(self, rng, n_steps):
+        """The random inputs of one path, an array of shape (n_steps, k)."""
+        pass
+
+    @abstractmethod
+    def evolve(self, s0, draws, dt):
+        """Evolve the paths from their random inputs.
+
+        :param s0: the initial price of the underlying
+        :param draws: the random inputs, an array of shape (paths, steps, k)
+        :param dt: the length of each step, in years (steps,)
+        :returns: A tuple of (prices, vols), arrays of shape (paths, steps + 1),
+            the vols being the annualized volatility (e.g. 0.2, like the VIX / 100)
+        """
+        pass
+
+
+class GBM(PathModel):
+    """Geometric Brownian motion, with a constant volatility."""
+
+    def __init__(self, mu=0.07, sigma=0.18):
+        self.mu = mu
+        self.sigma = sigma
+
+    def draw(self, rng, n_steps):
+        return rng.standard_normal((n_steps, 1))
+
+    def _log_returns(self, draws, dt):
+        drift = (self.mu - 0.5 * self.sigma**2) * dt
+        return drift + self.sigma * np.sqrt(dt) * draws[:, :, 0]
+
+    def evolve(self, s0, draws, dt):
+        log_returns = self._log_returns(draws, dt)
+        log_prices = np.zeros((len(draws), draws.shape[1] + 1))
+        np.cumsum(log_returns, axis=1, out=log_prices[:, 1:])
+        prices = s0 * np.exp(log_prices)
+        return prices, np.full(prices.shape, self.sigma)
+
+
+class JumpDiffusion(GBM):
+    """
+    Merton's jump-diffusion: GBM, plus sudden (lognormal) jumps.
+
+    The jumps happen `jump_rate` times a year on average,
+    and the drift is compensated, so that the expected return is still `mu`.
+    """
+
+    def __init__(
+        self, mu=0.07, sigma=0.15, jump_rate=0.5, jump_mean=-0.1, jump_std=0.1
+    ):
+        super().__init__(mu, sigma)
+        self.jump_rate = jump_rate
+        self.jump_mean = jump_mean
+        self.jump_std = jump_std
+
+    def draw(self, rng, n_steps):
+        # The diffusion, the waiting time until a jump, and the size of the jump
+        draws = np.empty((n_steps, 3))
+        draws[:, 0] = rng.standard_normal(n_steps)
+        draws[:, 1] = rng.exponential(1, n_steps)
+        draws[:, 2] = rng.standard_normal(n_steps)
+        return draws
+
+    def evolve(self, s0, draws, dt):
+        # A jump whenever the waiting time falls within the step
+        # (at most one per step, plenty for daily steps and a few jumps a year)
+        jumped = draws[:, :, 1] < self.jump_rate * dt
+        jumps = np.where(jumped, self.jump_mean + self.jump_std * draws[:, :, 2], 0)
+        compensation = self.jump_rate * (
+            np.exp(self.jump_mean + 0.5 * self.jump_std**2) - 1
+        )
+        log_returns = self._log_returns(draws, dt) - compensation * dt + jumps
+        log_prices = np.zeros((len(draws), draws.shape[1] + 1))
+        np.cumsum(log_returns, axis=1, out=log_prices[:, 1:])
+        prices = s0 * np.exp(log_prices)
+        return prices, np.full(prices.shape, self.sigma)
+
+
+class Heston(PathModel):
+    """
+    Heston's stochastic volatility: the variance mean-reverts to `theta`
+    at the speed `kappa`, with its own volatility `xi`, and its shocks are
+    correlated (`rho`, usually negative) with the underlying's.
+
+    Simulated with the full truncation Euler scheme.
+    """
+
+    def __init__(self, mu=0.07, v0=0.04, kappa=3.0, theta=0.04, xi=0.5, rho=-0.7):
+        self.mu = mu
+        self.v0 = v0
+        self.kappa = kappa
+        self.theta = theta
+        self.xi = xi
+        self.rho = rho
+
+    def draw(self, rng, n_steps):
+        return rng.standard_normal((n_steps, 2))
+
+    def evolve(self, s0, draws, dt):
+        n_paths, n_steps, _ = draws.shape
+        z_price = draws[:, :, 0]
+        z_vol = self.rho * z_price + math.sqrt(1 - self.rho**2) * draws[:, :, 1]
+
+        log_prices = np.zeros((n_paths, n_steps + 1))
+        variances = np.empty((n_paths, n_steps + 1))
+        variances[:, 0] = self.v0
+        v = variances[:, 0].copy()
+        for step in range(n_steps):
+            v_plus = np.maximum(v, 0)
+            sqrt_dt = math.sqrt(dt[step])
+            log_prices[:, step + 1] = (
+                log_prices[:, step]
+                + (self.mu - 0.5 * v_plus) * dt[step]
+                + np.sqrt(v_plus) * sqrt_dt * z_price[:, step]
+            )
+            v += (
+                self.kappa * (self.theta - v_plus) * dt[step]
+                + self.xi * np.sqrt(v_plus) * sqrt_dt * z_vol[:, step]
+            )
+            variances[:, step + 1] = v
+        return s0 * np.exp(log_prices), np.sqrt(np.maximum(variances, 0))
+
+
+def path_rngs(seed, start, stop):
+    """The random generators of the paths start..stop-1 of a simulation.
+
+    Each path has its own independent stream, so a path is always the same
+    for the same seed, however the paths are split into chunks or processes.
+
+    :param seed: the seed of the whole simulation (an int, or a np.random.SeedSequence)
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [
+        np.random.default_rng(
+            np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (path,))
+        )
+        for path in range(start, stop)
+    ]
+
+
+def simulate_paths(model, dates, n_paths, s0=100.0, seed=None, start=0):
+    """Simulate paths of the underlying's price and volatility.
+
+    :param model: a PathModel
+    :param dates: the dates of the paths (pd.DatetimeIndex, the steps are their gaps)
+    :param n_paths: how many paths to simulate
+    :param s0: the price of the underlying on the first date
+    :param seed: the seed of the simulation, see `path_rngs`
+    :param start: the number of the first path (to simulate a chunk of a simulation)
+    :returns: A tuple of (prices, vols), arrays of shape (paths, days)
+    """
+    dates = pd.DatetimeIndex(dates)
+    dt = np.diff(dates.to_numpy()) / np.timedelta64(365, "D")
+    n_steps = len(dates) - 1
+    rngs = path_rngs(seed, start, start + n_paths)
+    draws = np.stack([model.draw(rng, n_steps) for rng in rngs])
+    return model.evolve(s0, draws, dt)
+
+
+def simulation_dates(years, start="2000-01-03"):
+    """The business days of a simulation of the given length."""
+    start = pd.Timestamp(start)
+    end = start + pd.DateOffset(days=round(years * 365)) - pd.Timedelta(days=1)
+    return pd.bdate_range(start, end)
+
+
+def run_monte_carlo(
+    StrategyClass,
+    model,
+    n_paths,
+    years=10,
+    s0=100.0,
+    seed=None,
+    capital=None,
+    chain_params=None,
+    max_workers=None,
+    chunk_paths=500,
+    **strategy_params,
+):
+    """Backtest a strategy on many simulated paths, on semisynthetic chains.
+
+    The options are priced with a ChainModel (the same as `LazyMarket` does),
+    from the simulated price and volatility of each day.
+
+    The rule-based strategies of IDEAL_DTE (without any exit rules) are run
+    on a whole chunk of paths at once, with array operations; any other
+    Strategy is run path by path, on a LazyMarket. Either way, the chunks are spread across a process pool.
+    The results don't depend on the number of workers nor on the chunk size.
+
+    :param StrategyClass: a Strategy subclass
+    :param model: a PathModel
+    :param n_paths: how many paths to simulate
+    :param years: how long each path is
+    :param s0: the initial price of the underlying
+    :param seed: the seed of the simulation (None for a random one)
+    :param capital: the initial capital (by default, `s0`, to secure one put)
+    :param chain_params: the parameters of the ChainModel
+    :param max_workers: how many processes to use (1 means running in this process)
+    :param chunk_paths: how many paths each task runs
+    :param strategy_params: the parameters of the strategy
+    :returns: A Pandas dataframe with one row per path:
+        - final_value - The final market value of the strategy
+        - total_return - The final value, relative to the capital (0.1 for +10%)
+        - max_drawdown - The largest drop of the market value from its peak,
+          relative to that peak (0.2 for -20%)
+    """
+    if capital is None:
+        capital = s0
+    # The same seed for all the chunks, even when it's random
+    seed = np.random.SeedSequence(seed)
+    dates = simulation_dates(years)
+    chunks = [
+        (start, min(start + chunk_paths, n_paths))
+        for start in range(0, n_paths, chunk_paths)
+    ]
+    args = (StrategyClass, model, dates, s0, seed, capital, chain_params or {})
+    tasks = [args + chunk + (strategy_params,) for chunk in chunks]
+
+    if max_workers == 1:
+        results = [_run_paths(*task) for task in tasks]
+    else:
+        max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_run_paths, *zip(*tasks)))
+
+    final_values, drawdowns = np.concatenate(results, axis=1)
+    return pd.DataFrame(
+        {
+            "final_value": final_values,
+            "total_return": final_values / capital - 1,
+            "max_drawdown": drawdowns,
+        }
+    )
+
+
+def _run_paths(
+    StrategyClass, model, dates, s0, seed, capital, chain_params, start, stop, params
+):
+    # Simulate a chunk of paths, and summarize each one's equity curve
+    prices, vols = simulate_paths(model, dates, stop - start, s0, seed, start)
+    chain_model = ChainModel(**chain_params)
+    if StrategyClass in IDEAL_DTE and set(params) <= VECTORIZED_PARAMS:
+        curves = put_writing_curves(
+            StrategyClass, chain_model, dates, prices, vols, capital, **params
+        )
+    else:
+        curves = np.empty(prices.shape)
+        for path, (path_prices, path_vols) in enumerate(zip(prices, vols)):
+            curves[path] = strategy_curve(
+                StrategyClass,
+                dates,
+                path_prices,
+                path_vols,
+                capital,
+                chain_params,
+                params,
+            )
+    return np.stack([curves[:, -1], max_drawdown(curves)])
+
+
+def strategy_curve(StrategyClass, dates, prices, vols, capital, chain_params, params):
+    """Run a strategy on a LazyMarket of one path.
+
+    :returns: The market value of the strategy on each day
+    """
+    market = LazyMarket(
+        pd.Series(prices, index=dates),
+        pd.Series(vols * 100, index=dates),
+        **chain_params,
+    )
+    strategy = StrategyClass(market, capital=capital, **params)
+    curve = np.empty(len(market))
+    for day, _ in enumerate(market):
+        strategy.run()
+        curve[day] = strategy.get_current_market_value()
+    return curve
+
+
+def put_writing_curves(
+    StrategyClass,
+    chain_model,
+    dates,
+    prices,
+    vols,
+    capital=0,
+    ideal_strike=1.0,
+    hold_the_strike=False,
+):
+    """Run one of the put-writing strategies (see IDEAL_DTE) on many paths at once.
+
+    Same as running the strategy on a LazyMarket of each path (see `strategy_curve`),
+    but with array operations across all paths and days.
+
+    The expirations don't depend on the path (only on the dates),
+    so all paths open and close their positions on the same days,
+    each with its own strike.
+
+    :param prices: the prices of the underlying, an array of shape (paths, days)
+    :param vols: the volatility of the underlying, same shape
+    :returns: The market value of the strategy on each path and day, same shape
+    """
+    if StrategyClass not in IDEAL_DTE:
+        raise TypeError(f"{StrategyClass.__name__} can't be backtested this way")
+    n_days = len(dates)
+    day_numbers = (
+        dates.to_numpy() - np.datetime64("1970-01-01", "D")
+    ) // np.timedelta64(1, "D")
+
+    # Open a new position whenever the previous one has expired
+    ideal_dtes = IDEAL_DTE[StrategyClass](dates)
+    first_dtes = chain_model.days_to_friday(dates)
+    weeks = np.clip(
+        np.ceil((ideal_dtes - first_dtes) / 7 - 0.5),
+        0,
+        chain_model.expiries_per_day - 1,
+    )
+    expiries = day_numbers + first_dtes + 7 * weeks.astype(int)
+    opened, day = [], 0
+    while day < n_days:
+        opened.append(day)
+        # The first day after the expiration
+        day = max(np.searchsorted(day_numbers, expiries[day], "right"), day + 1)
+    opened = np.array(opened, dtype=int)
+    expiries = expiries[opened]
+
+    # The strikes of each path, closest to the ideal ones on the grid
+    ideal_strikes = prices[:, opened] * ideal_strike
+    if hold_the_strike:
+        ideal_strikes = np.minimum.accumulate(ideal_strikes, axis=1)
+    lowest, highest = chain_model.strike_range(prices[:, opened])
+    step = chain_model.strike_step
+    strikes = np.clip(np.ceil(ideal_strikes / step - 0.5), lowest, highest) * step
+    costs = chain_model.price(
+        prices[:, opened], vols[:, opened], strikes, expiries - day_numbers[opened]
+    )["[P_BID]"]
+
+    # Each day has exactly one open position (it's open on its expiration day too)
+    trade = np.searchsorted(opened, np.arange(n_days), "right") - 1
+    dte = expiries[trade] - day_numbers
+    strikes = strikes[:, trade]
+    asks = chain_model.price(prices, vols, strikes, dte)["[P_ASK]"]
+    market_values = asks * -1
+    # Expires worthless, no need to buy back
+    market_values[(dte == 0) & ~(prices < strikes)] = 0
+
+    # The premiums are received on the day each position is opened,
+    # and the ITM ones are paid for when they're bought back
+    # (after which they're only in the cash, so it's the same value on that day)
+    flows = np.zeros(prices.shape)
+    flows[:, 0] = capital
+    flows[:, opened] += costs
+    closing = np.broadcast_to(dte == 0, prices.shape)
+    flows[closing] += market_values[closing]
+    market_values[closing] = 0
+    return np.cumsum(flows, axis=1) + market_values
@@ -0,0 +1,178 @@
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+def fingerprint_arrays(arrays):
+    """A fingerprint of some input data, e.g. a market's arrays (see `to_arrays`).
+
+    :param arrays: a dict of name -> np.ndarray
+    :returns: A hex digest, which changes whenever any of the data does
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(arrays):
+        values = np.ascontiguousarray(arrays[name])
+        digest.update(f"{name}:{values.dtype.str}:{values.shape}".encode())
+        digest.update(values.view(np.uint8).data)
+    return digest.hexdigest()
+
+
+# The modules of the backtesting engine, whose code changes the results of any strategy
+ENGINE_MODULES = (
+    "src.accounts",
+    "src.chains",
+    "src.markets",
+    "src.options",
+    "src.orders",
+    "src.scheduler",
+    "src.strategies",
+    "src.sweep",
+    "src.synthetic",
+    "src.volatility",
+    "src.wallet",
+)
+
+
+@functools.cache
+def fingerprint_engine():
+    """A fingerprint of the code of the engine (the source of the ENGINE_MODULES)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in ENGINE_MODULES:
+        digest.update(inspect.getsource(importlib.import_module(name)).encode())
+    return digest.hexdigest()
+
+
+def fingerprint_code(StrategyClass):
+    """A fingerprint of the code of a strategy (the source of all its classes),
+    and of the engine it runs on (see `fingerprint_engine`).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(fingerprint_engine().encode())
+    for cls in StrategyClass.__mro__:
+        if cls.__module__ == "builtins":
+            continue
+        try:
+            source = inspect.getsource(cls)
+        except (OSError, TypeError):
+            # E.g. defined interactively, only its name can be used
+            source = f"{cls.__module__}.{cls.__qualname__}"
+        digest.update(source.encode())
+    return digest.hexdigest()
+
+
+class ResultStore:
+    """
+    Persists the results of backtests, so that they are computed only once.
+
+    Each run is identified by a key, a hash of the strategy (its name and code,
+    along with the engine's),
+    its parameters, its capital and the input data (see `key`).
+    The results are kept in three Parquet datasets, partitioned by strategy:
+
+        runs/strategy=<name>/<key>.parquet - the parameters and final value
+        curves/strategy=<name>/<key>.parquet - the equity curve, by date
+        trades/strategy=<name>/<key>.parquet - the positions (see `Wallet.to_frame`)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def key(
+        self, StrategyClass, params, capital, data_fingerprint, surface_fallback=False
+    ):
+        """The key of a run.
+
+        :param params: the parameters of the strategy (JSON serializable,
+            any other values, e.g. AccountTerms, by their repr)
+        :param data_fingerprint: a fingerprint of the input data (see `fingerprint_arrays`)
+        :param surface_fallback: whether the market priced the missing contracts
+            from the volatility surface (see HistoricalMarket)
+        """
+        description = {
+            "strategy": f"{StrategyClass.__module__}.{StrategyClass.__qualname__}",
+            "code": fingerprint_code(StrategyClass),
+            "params": params,
+            "capital": capital,
+            "data": data_fingerprint,
+        }
+        if surface_fallback:
+            # Only then, so that the keys of the other runs stay the same
+            description["surface_fallback"] = True
+        description = json.dumps(description, sort_keys=True, default=repr)
+        return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+    def _file(self, kind, StrategyClass, key):
+        return (
+            self.path / kind / f"strategy={StrategyClass.__name__}" / f"{key}.parquet"
+        )
+
+    def has(self, StrategyClass, key):
+        return self._file("runs", StrategyClass, key).exists()
+
+    def save(self, StrategyClass, key, params, capital, curve, trades=None):
+        """Save the results of a run (overwriting any previous ones with the same key).
+
+        :param curve: pd.Series of the market value, by date (or a np.ndarray)
+        :param trades: pd.DataFrame of the positions, see `Wallet.to_frame`
+        """
+        curve = pd.Series(curve, dtype=float)
+        run = pd.DataFrame(
+            {
+                "key": [key],
+                "params": [json.dumps(params, sort_keys=True, default=repr)],
+                "capital": [float(capital)],
+                "final_value": [curve.iloc[-1] if len(curve) else float(capital)],
+                "saved_at": [datetime.now(timezone.utc)],
+            }
+        )
+        curve = curve.rename("market_value").rename_axis("date").reset_index()
+        # The run file is written last: it marks the results as complete
+        for kind, frame in (("curves", curve), ("trades", trades), ("runs", run)):
+            if frame is None:
+                continue
+            file = self._file(kind, StrategyClass, key)
+            file.parent.mkdir(parents=True, exist_ok=True)
+            # Hidden from the datasets until it's complete
+            temporary = file.parent / f".{file.name}.tmp"
+            pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), temporary)
+            temporary.replace(file)
+
+    def load_curve(self, StrategyClass, key):
+        """The equity curve of a run, as a pd.Series by date (or day number).
+
+        :raises KeyError: If the run isn't stored
+        """
+        if not self.has(StrategyClass, key):
+            raise KeyError(key)
+        curve = pd.read_parquet(self._file("curves", StrategyClass, key))
+        return curve.set_index("date")["market_value"]
+
+    def load_trades(self, StrategyClass, key):
+        """The positions of a run, or None if they weren't saved.
+
+        :raises KeyError: If the run isn't stored
+        """
+        if not self.has(StrategyClass, key):
+            raise KeyError(key)
+        file = self._file("trades", StrategyClass, key)
+        return pd.read_parquet(file) if file.exists() else None
+
+    def runs(self):
+        """All the stored runs, one row per run, with their strategy and parameters."""
+        path = self.path / "runs"
+        if not path.exists():
+            return pd.DataFrame(
+                columns=["key", "params", "capital", "final_value", "saved_at"]
+            )
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        return dataset.to_table().to_pandas()
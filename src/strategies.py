@@ -1,35 +1,292 @@
 from abc import abstractmethod
 
-from src.wallet import Wallet
+import numpy as np
+import pandas as pd
+
+from src.accounts import RiskCheck
+from src.markets import PortfolioMarket
+from src.options import Put, to_day
+from src.scheduler import Wakeup
+from src.wallet import Ledger, Wallet
+
+
+class EquityRecorder:
+    """
+    The cash, value and market value of a strategy, day by day.
+
+    The values are written into preallocated arrays (grown if ever needed),
+    so recording a day costs about as much as the valuation itself.
+    """
+
+    def __init__(self, n_days=0):
+        self.n_days = 0
+        self._dates = np.empty(n_days, dtype="datetime64[ns]")
+        self._values = np.empty((3, n_days))
+
+    def __len__(self):
+        return self.n_days
+
+    def append(self, date, cash, value, market_value):
+        if self.n_days == len(self._dates):
+            size = max(2 * self.n_days, 1)
+            dates, values = self._dates, self._values
+            self._dates = np.empty(size, dtype=dates.dtype)
+            self._dates[: self.n_days] = dates
+            self._values = np.empty((3, size))
+            self._values[:, : self.n_days] = values
+        self._dates[self.n_days] = np.datetime64(date, "ns")
+        self._values[:, self.n_days] = cash, value, market_value
+        self.n_days += 1
+
+    @property
+    def dates(self):
+        return self._dates[: self.n_days]
+
+    @property
+    def cash(self):
+        return self._values[0, : self.n_days]
+
+    @property
+    def value(self):
+        """As in `Strategy.get_current_value()`."""
+        return self._values[1, : self.n_days]
+
+    @property
+    def market_value(self):
+        """As in `Strategy.get_current_market_value()`."""
+        return self._values[2, : self.n_days]
+
+    def to_frame(self):
+        """The recorded days, as a dataframe of cash, value and market_value by date."""
+        return pd.DataFrame(
+            {"cash": self.cash, "value": self.value, "market_value": self.market_value},
+            index=pd.DatetimeIndex(self.dates, name="date"),
+        )
+
+
+class ExitRules:
+    """
+    When to close the positions early, before their expiration.
+
+    All the rules are checked for all the positions at once,
+    from a single valuation of them (see `market.value_positions`).
+    Positions without quotes are never closed early.
+    """
+
+    def __init__(self, profit_target=None, stop_loss=None, dte=None):
+        """
+        :param profit_target: close once the profit reaches this fraction of the premium,
+            e.g. 0.5 to close a short put once half of its premium is earned
+        :param stop_loss: close once the loss reaches this fraction of the premium,
+            e.g. 2.0 to close a short put once it costs 3x what it was sold for
+        :param dte: close once there are this many days to expiration (or less), e.g. 21
+        """
+        self.profit_target = profit_target
+        self.stop_loss = stop_loss
+        self.dte = dte
+
+    def __repr__(self):
+        return (
+            f"ExitRules(profit_target={self.profit_target}, "
+            f"stop_loss={self.stop_loss}, dte={self.dte})"
+        )
+
+    def check(self, ledger, market_values, date):
+        """Check the rules for many positions.
+
+        :param ledger: the positions, as a Ledger
+        :param market_values: their market values (see `market.value_positions`)
+        :param date: the current date
+        :returns: A boolean array, True for the positions to close
+        """
+        premiums = np.abs(ledger.quantities * ledger.costs)
+        profits = market_values - ledger.quantities * ledger.costs
+        exits = np.zeros(len(ledger), dtype=bool)
+        if self.profit_target is not None:
+            exits |= profits >= self.profit_target * premiums
+        if self.stop_loss is not None:
+            exits |= profits <= -self.stop_loss * premiums
+        if self.dte is not None:
+            exits |= ledger.expiries - to_day(date) <= self.dte
+        return exits & ~np.isnan(market_values)
 
 
 class Strategy:
-    def __init__(self, market, capital=0):
+    # When to close the positions early (see ExitRules), if ever
+    exit_rules = None
+    # The PortfolioMarket of the traded symbol, if any
+    portfolio = None
+
+    def __init__(self, market, capital=0, terms=None, symbol=None):
+        """
+        :param market: the market data
+        :param capital: the initial capital
+        :param terms: the AccountTerms (margin, interest, commissions and limits),
+            or None to trade without any
+        :param symbol: the symbol to trade, on a PortfolioMarket (the strategy
+            then trades on that symbol's own market, see `is_quoted`)
+        """
+        if isinstance(market, PortfolioMarket):
+            self.portfolio = market
+            if symbol is None:
+                assert len(market.symbols) == 1, "Which symbol?"
+                symbol = market.symbols[0]
+            market = market[symbol]
         self.market = market
+        self.symbol = symbol
         self.wallet = Wallet(capital)
+        self.terms = terms
+        self.risk = None if terms is None else RiskCheck(self)
+        self._recorder = None
+
+    @property
+    def recorder(self):
+        """The EquityRecorder of the days recorded so far (see `record()`)."""
+        if self._recorder is None:
+            self._recorder = EquityRecorder(len(self.market))
+        return self._recorder
 
     def write_put(self, ideal_strike, ideal_dte):
         assert ideal_strike is not None
         assert ideal_strike > 0
         position = self.market.sell_to_open(ideal_strike, ideal_dte)
-        self.wallet.add_position(position, update_cash=True)
+        if not self._add_positions([position]):
+            return None
 
         # Return the position for convenience
         return position
 
+    def open_order(self, order):
+        """Open all the legs of an order (see `market.open_order`).
+
+        :returns: The new positions, one per leg
+            (none, if the order would break the account's limits)
+        """
+        positions = self.market.open_order(order)
+        if not self._add_positions(positions):
+            return []
+        return positions
+
+    def _add_positions(self, positions):
+        # Add them to the wallet, if within the account's limits (see AccountTerms)
+        if self.risk is not None and not self.risk.allows(positions):
+            return False
+        for position in positions:
+            position.symbol = self.symbol
+            self.wallet.add_position(position, update_cash=True)
+        self._pay_commissions(positions)
+        return True
+
+    def _pay_commissions(self, positions):
+        # Nothing to pay for the options which expire worthless
+        if self.terms is None or not self.terms.commission:
+            return
+        date, underlying = self.market.current_date, self.market.underlying_last
+        contracts = sum(
+            abs(p.quantity)
+            for p in positions
+            if not (p.is_expiring(date) and not p.option.is_itm(underlying))
+        )
+        self.wallet.cash -= self.terms.commission * contracts
+
+    def close(self, position):
+        """Close a position, e.g. buy back a short put (see `market.close`).
+
+        :returns: The credit/debit from closing it
+        """
+        close_value = self.market.close(position)
+        self.wallet.cash += close_value
+        self._pay_commissions([position])
+        return close_value
+
+    def close_positions(self, positions):
+        """Close many positions at once, e.g. all the legs of an order."""
+        self.wallet.cash += self.market.close_positions(positions)
+        self._pay_commissions(positions)
+
+    def get_margin_requirement(self):
+        """The margin needed for the held positions (0 without AccountTerms)."""
+        return 0.0 if self.risk is None else self.risk.margin_requirement()
+
+    def get_buying_power(self):
+        """How much more margin the account allows (see AccountTerms.max_margin_pct)."""
+        if self.risk is None:
+            return self.get_current_market_value()
+        return self.risk.buying_power()
+
     def handle_expiring_positions(self, positions):
         # By default, buy them back and close the position
         for position in positions:
-            profit = self.market.close(position)
-            self.wallet.cash += profit
+            self.close(position)
 
     def handle_open_positions(self, positions):
-        pass
+        # By default, close the ones which hit the exit rules (if any)
+        if self.exit_rules is not None:
+            if exiting := self.get_exiting_positions(positions):
+                self.handle_exiting_positions(exiting)
+
+    def get_exiting_positions(self, positions):
+        """The positions to close early, according to the exit rules.
+
+        The expiring positions and the already closed ones are left out.
+        """
+        date = self.market.current_date
+        positions = [
+            p for p in positions if p.closed_at is None and not p.is_expiring(date)
+        ]
+        if not positions:
+            return []
+        ledger = Ledger(positions)
+        market_values, _ = self.market.value_positions(ledger)
+        exits = self.exit_rules.check(ledger, market_values, date)
+        return [p for p, exit in zip(positions, exits) if exit]
+
+    def handle_exiting_positions(self, positions):
+        # By default, close them (new ones might be opened the next day)
+        for position in positions:
+            self.close(position)
+
+    def roll(self, position, ideal_strike, ideal_dte, min_dte=0):
+        """Close a short put, and write a later one instead (see `market.roll`).
+
+        :returns: The new position (None, if it would break the account's limits)
+        :raises IndexError: If there's no later expiration (nothing is closed then)
+        """
+        close_value, new_position = self.market.roll(
+            position, ideal_strike, ideal_dte, min_dte
+        )
+        self.wallet.cash += close_value
+        self._pay_commissions([position])
+        if not self._add_positions([new_position]):
+            return None
+        return new_position
 
     @abstractmethod
     def handle_no_open_positions(self):
         pass
 
+    def is_quoted(self):
+        """Whether its symbol is quoted today (always, without a PortfolioMarket).
+
+        On the other days, its market is stale, so the strategy shouldn't run
+        (the Scheduler waits for the next day it's quoted).
+        """
+        return self.portfolio is None or self.symbol in self.portfolio.active
+
+    def next_wakeup(self):
+        """When the strategy needs to run next, see Scheduler.
+
+        Called right after `run()`. Waking up too early is harmless,
+        too late would skip something the strategy does when run every day.
+
+        :returns: A Wakeup, or None to run every day (the default)
+        """
+        return None
+
+    def get_greeks(self):
+        """The Greeks of the held positions, see `Wallet.get_greeks`."""
+        return self.wallet.get_greeks(self.market)
+
     def get_expiring_positions(self):
         return self.wallet.get_expiring_positions(self.market.current_date)
 
@@ -46,6 +303,8 @@ class Strategy:
         The default implementation for convenience
         runs separately each of the common situations which might occur.
         """
+        self.accrue_interest()
+
         # First, the expiring ones MUST be handled
         if positions := self.wallet.get_expiring_positions(self.market.current_date):
             self.handle_expiring_positions(positions)
@@ -61,26 +320,114 @@ class Strategy:
         if not self.wallet.get_open_positions(self.market.current_date):
             self.handle_no_open_positions()
 
+    def accrue_interest(self):
+        """Add the interest up to the current day, if any (see AccountTerms).
+
+        Done when run, and before being valued, so it's up to date either way.
+        """
+        if self.terms is not None:
+            self.wallet.accrue_interest(
+                self.market.current_date, self.terms.cash_rate, self.terms.margin_rate
+            )
+
     def get_current_value(self):
+        self.accrue_interest()
         value = self.wallet.cash  # get the cash
         assert value is not None
-        for position in self.wallet.get_open_positions(self.market.current_date):
-            value += position.quantity * position.option.intrinsic_value(
-                self.market.underlying_last
-            )
+        ledger = self.wallet.get_ledger(self.market.current_date)
+        if len(ledger):
+            intrinsic_values = ledger.intrinsic_values(self.market.underlying_last)
+            value += (ledger.quantities * intrinsic_values).sum()
         return value
 
     def get_current_market_value(self):
+        self.accrue_interest()
         value = self.wallet.cash
         assert value is not None
-        for position in self.wallet.get_open_positions(self.market.current_date):
-            try:
-                value += self.market.close(position, dry_run=True)
-            except IndexError:
-                # Can't find it, use intrinsic value instead
-                value += position.option.intrinsic_value(self.market.underlying_last)
+        ledger = self.wallet.get_ledger(self.market.current_date)
+        if len(ledger):
+            value += _market_value(*self.market.value_positions(ledger))
         return value
 
+    def record(self):
+        """Record the current cash, value and market value (see `recorder`).
+
+        Call it once a day, after `run()`. Both values come from a single valuation.
+        """
+        self.accrue_interest()
+        cash = self.wallet.cash
+        value = market_value = cash
+        ledger = self.wallet.get_ledger(self.market.current_date)
+        if len(ledger):
+            market_values, intrinsic_values = self.market.value_positions(ledger)
+            value += intrinsic_values.sum()
+            market_value += _market_value(market_values, intrinsic_values)
+        self.recorder.append(self.market.current_date, cash, value, market_value)
+
+
+def get_market_values(strategies):
+    """Get the current market value of many strategies, trading on the same market.
+
+    Same as calling `get_current_market_value()` on each of them,
+    but all the open positions are valued together, in one batch
+    (one per market, for the symbols of a PortfolioMarket).
+
+    :returns: A list of values, one per strategy
+    """
+    return [market_value for _, market_value in _get_values(strategies)]
+
+
+def record(strategies):
+    """Record the current values of many strategies, trading on the same market.
+
+    Same as calling `record()` on each of them, but valued in one batch
+    (see `get_market_values`).
+    """
+    for strategy, (value, market_value) in zip(strategies, _get_values(strategies)):
+        strategy.recorder.append(
+            strategy.market.current_date, strategy.wallet.cash, value, market_value
+        )
+
+
+def _get_values(strategies):
+    # The (value, market value) of each strategy, the positions of each market together
+    by_market = {}
+    for i, strategy in enumerate(strategies):
+        by_market.setdefault(id(strategy.market), []).append(i)
+    values = [None] * len(strategies)
+    for rows in by_market.values():
+        for i, value in zip(rows, _get_market_values([strategies[i] for i in rows])):
+            values[i] = value
+    return values
+
+
+def _get_market_values(strategies):
+    # The (value, market value) of each strategy, all on the same market
+    market = strategies[0].market
+    positions = [s.wallet.get_held_positions(market.current_date) for s in strategies]
+    market_values, intrinsic_values = market.value_positions(
+        [p for strategy_positions in positions for p in strategy_positions]
+    )
+
+    values, start = [], 0
+    for strategy, strategy_positions in zip(strategies, positions):
+        end = start + len(strategy_positions)
+        strategy.accrue_interest()
+        value = market_value = strategy.wallet.cash
+        if strategy_positions:
+            value += intrinsic_values[start:end].sum()
+            market_value += _market_value(
+                market_values[start:end], intrinsic_values[start:end]
+            )
+        values.append((value, market_value))
+        start = end
+    return values
+
+
+def _market_value(market_values, intrinsic_values):
+    # Can't find some of them, use their intrinsic value instead
+    return np.where(np.isnan(market_values), intrinsic_values, market_values).sum()
+
 
 class SellWeeklyPuts(Strategy):
     """
@@ -90,16 +437,47 @@ class SellWeeklyPuts(Strategy):
     and selling a new - now ATM - put.
     """
 
-    def __init__(self, market, capital=0, ideal_strike=1.0, hold_the_strike=False):
+    def __init__(
+        self,
+        market,
+        capital=0,
+        ideal_strike=1.0,
+        hold_the_strike=False,
+        profit_target=None,
+        stop_loss=None,
+        exit_dte=None,
+        roll_exits=False,
+        terms=None,
+        ideal_delta=None,
+        symbol=None,
+        ideal_dte=None,
+    ):
         """
         :param market: the market data
         :param capital: the initial capital
         :param ideal_strike: the ideal strike price, as a multiplier of the underlying price
+        :param profit_target: close the put early at this profit (see ExitRules)
+        :param stop_loss: close the put early at this loss (see ExitRules)
+        :param exit_dte: close the put early at this many days to expiration
+        :param roll_exits: whether to write a new put right away when closing early,
+            expiring later (and past exit_dte), otherwise the next day
+        :param terms: the AccountTerms, see Strategy
+        :param ideal_delta: pick the strike by the put's delta instead, e.g. 0.16
+            for the 16-delta put (the ideal_strike is ignored then)
+        :param symbol: the symbol to trade, on a PortfolioMarket
+        :param ideal_dte: the ideal days to expiration of the puts written
+            (by default, until the next Friday, or 30 for the monthly ones)
         """
-        super().__init__(market, capital)
+        super().__init__(market, capital, terms, symbol)
+        assert ideal_dte is None or ideal_dte > 0
+        self.ideal_dte = ideal_dte
         self.ideal_strike = ideal_strike
         self.hold_the_strike = hold_the_strike
         self.last_ideal_strike = None
+        if (profit_target, stop_loss, exit_dte) != (None, None, None):
+            self.exit_rules = ExitRules(profit_target, stop_loss, exit_dte)
+        self.roll_exits = roll_exits
+        self.ideal_delta = ideal_delta
 
     def __repr__(self):
         if self.hold_the_strike:
@@ -107,6 +485,9 @@ class SellWeeklyPuts(Strategy):
         return f"W({self.ideal_strike})"
 
     def _get_ideal_dte(self):
+        if self.ideal_dte is not None:
+            return self.ideal_dte
+
         # How many days until Friday?
         ideal_dte = 5 - self.market.current_date.weekday()
 
@@ -117,7 +498,12 @@ class SellWeeklyPuts(Strategy):
         return ideal_dte
 
     def _get_ideal_strike(self):
-        strike = self.market.underlying_last * self.ideal_strike
+        if self.ideal_delta is not None:
+            strike = self.market.strike_for_delta(
+                Put, -self.ideal_delta, self._get_ideal_dte()
+            )
+        else:
+            strike = self.market.underlying_last * self.ideal_strike
 
         if self.hold_the_strike:
             if self.last_ideal_strike is not None:
@@ -134,9 +520,33 @@ class SellWeeklyPuts(Strategy):
         for position in positions:
             # If it's ITM, close it (effectively, roll to the next expiration)
             if position.option.is_itm(self.market.underlying_last):
-                self.market.close(position)
+                self.close(position)
             # else, it's OTM and assume the expiration is handled automatically elsewhere
 
+    def handle_exiting_positions(self, positions):
+        if not self.roll_exits:
+            return super().handle_exiting_positions(positions)
+        # Out to a later expiration, past the exit dte (or it would exit again)
+        min_dte = 0 if self.exit_rules.dte is None else self.exit_rules.dte + 1
+        for position in positions:
+            try:
+                self.roll(
+                    position, self._get_ideal_strike(), self._get_ideal_dte(), min_dte
+                )
+            except IndexError:
+                # None quoted, so a new put is written the next day instead
+                self.close(position)
+
+    def next_wakeup(self):
+        # Nothing happens until the put expires (or once it did, a new one is written),
+        # unless it might be closed early. The interest is accrued when it runs next.
+        if self.exit_rules is not None:
+            return None
+        positions = self.wallet.get_held_positions(self.market.current_date)
+        if not positions:
+            return None
+        return Wakeup(date=min(p.option.expiration for p in positions))
+
     def handle_no_open_positions(self):
         assert (
             len(self.wallet.get_open_positions(self.market.current_date)) == 0
@@ -149,7 +559,7 @@ class SellWeeklyPuts(Strategy):
 
 class SellMonthlyPuts(SellWeeklyPuts):
     def _get_ideal_dte(self):
-        return 30
+        return 30 if self.ideal_dte is None else self.ideal_dte
 
     def __repr__(self):
         if self.hold_the_strike:
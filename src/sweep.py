@@ -0,0 +1,267 @@
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from src.loaders import load_arrays
+from src.markets import ColumnarMarket
+from src.profiling import Profiler
+from src.scheduler import Scheduler
+from src.store import fingerprint_arrays
+from src.strategies import get_market_values
+
+# The market arrays, as seen by a worker process (see `_attach` and `_open`)
+_worker_arrays = None
+_worker_blocks = None
+
+
+def expand_grid(strategy_classes, param_grid):
+    """List all combinations of strategy classes and parameters, in a stable order.
+
+    :param strategy_classes: a list of Strategy subclasses
+    :param param_grid: a dict of parameter name -> list of values
+    :returns: A list of (StrategyClass, params) tuples
+    """
+    names = list(param_grid)
+    return [
+        (StrategyClass, dict(zip(names, values)))
+        for StrategyClass in strategy_classes
+        for values in itertools.product(*(param_grid[name] for name in names))
+    ]
+
+
+def run_strategies(market, combinations, capital=0, profiler=None):
+    """Run some strategies side by side, over all days of the market.
+
+    The strategies don't interact with each other, so the results
+    don't depend on which other strategies are run together.
+
+    Each strategy is only run on the days it's due (see Scheduler),
+    but valued on every day, so the equity curves are the same as running
+    them every day. On the days none of them is due nor holds any position,
+    the quotes aren't even sliced.
+
+    :param profiler: a Profiler, to time the market, the strategies and their wallets
+    :returns: A list of (final value, equity curve, trades) tuples, one per
+        combination, the trades being the positions (see `Wallet.to_frame`)
+    """
+    strategies = [
+        StrategyClass(market, capital=capital, **params)
+        for StrategyClass, params in combinations
+    ]
+    if profiler is not None:
+        profiler.instrument_market(market)
+        for strategy, combination in zip(strategies, combinations):
+            profiler.instrument_strategy(strategy, _label(*combination))
+    # Each strategy is run only on the days it acts
+    days = Scheduler(market, strategies)
+    if profiler is not None:
+        days = profiler.iterate(days)
+
+    curves = np.empty((len(strategies), len(market)))
+    try:
+        for day, _ in enumerate(days):
+            # All the strategies valued together, in one batch, every day.
+            # The quotes are only needed when some of them hold positions.
+            curves[:, day] = get_market_values(strategies)
+    finally:
+        if profiler is not None:
+            profiler.detach()
+    return [
+        (curve[-1] if len(curve) else capital, curve, strategy.wallet.to_frame())
+        for strategy, curve in zip(strategies, curves)
+    ]
+
+
+def run_sweep(
+    quotes_df,
+    strategy_classes,
+    param_grid,
+    capital=0,
+    max_workers=None,
+    chunksize=None,
+    store=None,
+    profiler=None,
+):
+    """Run every combination of strategies and parameters, across a process pool.
+
+    The quotes are loaded into a ColumnarMarket once, and its arrays are put into
+    shared memory, so that the workers can use them without any copying or pickling.
+    Each worker runs a chunk of combinations side by side on its own market instance.
+
+    The results don't depend on the number of workers nor on the chunk size.
+
+    With a ResultStore, only the combinations which aren't stored yet are run
+    (i.e. new ones, or those whose strategy code or quotes have changed),
+    and their results are stored for the next time.
+
+    :param quotes_df: the quotes, as in `HistoricalMarket`,
+        or an already indexed ColumnarMarket (e.g. see `open_market`)
+    :param strategy_classes: a list of Strategy subclasses
+    :param param_grid: a dict of parameter name -> list of values
+    :param capital: the initial capital of each strategy
+    :param max_workers: how many processes to use (1 means running in this process)
+    :param chunksize: how many combinations each task runs (by default, spread evenly)
+    :param store: a ResultStore, to reuse and keep the results (optional)
+    :param profiler: a Profiler, to time the runs (those of all the workers, merged)
+    :returns: A Pandas dataframe with one row per combination:
+        - strategy - The name of the strategy class
+        - one column per parameter
+        - final_value - The final market value of the strategy
+        - equity_curve - The market value of the strategy on each day (np.ndarray)
+    """
+    combinations = expand_grid(strategy_classes, param_grid)
+    if isinstance(quotes_df, ColumnarMarket):
+        # A market of its own, so that the given one isn't moved forward
+        market = ColumnarMarket.from_arrays(
+            quotes_df.to_arrays(),
+            quotes_df.surface_fallback,
+            quotes_df.compiled_path,
+            quotes_df.fingerprint,
+        )
+    else:
+        market = ColumnarMarket(quotes_df)
+
+    results = [None] * len(combinations)
+    if store is not None:
+        arrays = market.to_arrays()
+        # A compiled market comes with it, no need to read all of its data
+        data_fingerprint = market.fingerprint
+        if data_fingerprint is None:
+            data_fingerprint = fingerprint_arrays(arrays)
+        keys = [
+            store.key(
+                StrategyClass,
+                params,
+                capital,
+                data_fingerprint,
+                surface_fallback=market.surface_fallback,
+            )
+            for StrategyClass, params in combinations
+        ]
+        for i, ((StrategyClass, _), key) in enumerate(zip(combinations, keys)):
+            if store.has(StrategyClass, key):
+                curve = store.load_curve(StrategyClass, key).to_numpy()
+                results[i] = (curve[-1] if len(curve) else capital, curve, None)
+    missing = [i for i, result in enumerate(results) if result is None]
+
+    if missing:
+        to_run = [combinations[i] for i in missing]
+        if max_workers == 1:
+            ran = run_strategies(market, to_run, capital, profiler)
+        else:
+            ran = _run_in_pool(
+                market, to_run, capital, max_workers, chunksize, profiler
+            )
+        for i, result in zip(missing, ran):
+            results[i] = result
+            if store is not None:
+                StrategyClass, params = combinations[i]
+                _, curve, trades = result
+                store.save(
+                    StrategyClass,
+                    keys[i],
+                    params,
+                    capital,
+                    pd.Series(curve, index=pd.DatetimeIndex(arrays["dates"])),
+                    trades,
+                )
+
+    return pd.DataFrame(
+        [
+            {
+                "strategy": StrategyClass.__name__,
+                **params,
+                "final_value": final_value,
+                "equity_curve": curve,
+            }
+            for (StrategyClass, params), (final_value, curve, _) in zip(
+                combinations, results
+            )
+        ]
+    )
+
+
+def _label(StrategyClass, params):
+    # The name of a combination, e.g. in the profiler's summary
+    args = ", ".join(f"{name}={value!r}" for name, value in params.items())
+    return f"{StrategyClass.__name__}({args})"
+
+
+def _run_in_pool(market, combinations, capital, max_workers, chunksize, profiler):
+    max_workers = max_workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = math.ceil(len(combinations) / max_workers)
+    chunksize = max(chunksize, 1)
+    chunks = [
+        combinations[i : i + chunksize] for i in range(0, len(combinations), chunksize)
+    ]
+
+    if market.compiled_path is not None:
+        # The workers can map the very same files, no need to copy anything
+        blocks, initializer, initargs = [], _open, (market.compiled_path,)
+    else:
+        blocks, specs = _share(market.to_arrays())
+        initializer, initargs = _attach, (specs,)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=initializer, initargs=initargs
+        ) as executor:
+            # map() keeps the order of the chunks, whichever finishes first
+            results = executor.map(
+                _run_chunk,
+                chunks,
+                itertools.repeat(capital),
+                itertools.repeat(profiler is not None),
+                itertools.repeat(market.surface_fallback),
+            )
+            ran = []
+            for chunk, chunk_profiler in results:
+                ran.extend(chunk)
+                if profiler is not None:
+                    profiler.merge(chunk_profiler)
+            return ran
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _share(arrays):
+    # Copy the arrays into shared memory blocks, and describe them for the workers
+    blocks, specs = [], {}
+    for name, values in arrays.items():
+        if values.dtype.hasobject:
+            raise TypeError(f"Can't share the {name} column of Python objects")
+        block = SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, values.dtype, buffer=block.buf)[:] = values
+        blocks.append(block)
+        specs[name] = (block.name, values.shape, values.dtype.str)
+    return blocks, specs
+
+
+def _attach(specs):
+    # Worker initializer: map the shared memory blocks into NumPy arrays
+    global _worker_arrays, _worker_blocks
+    _worker_blocks = [SharedMemory(name=name) for name, _, _ in specs.values()]
+    _worker_arrays = {
+        name: np.ndarray(shape, dtype, buffer=block.buf)
+        for (name, (_, shape, dtype)), block in zip(specs.items(), _worker_blocks)
+    }
+
+
+def _open(path):
+    # Worker initializer: map the files of a compiled market
+    global _worker_arrays
+    _worker_arrays = load_arrays(path)
+
+
+def _run_chunk(combinations, capital, profile=False, surface_fallback=False):
+    market = ColumnarMarket.from_arrays(_worker_arrays, surface_fallback)
+    # Timed in the worker, merged into the caller's profiler
+    profiler = Profiler() if profile else None
+    return run_strategies(market, combinations, capital, profiler), profiler
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+
+def black_scholes(underlying, strikes, years, vols, rate=0.0):
+    """Price European puts and calls, for arrays of any (broadcastable) shape.
+
+    Expired options (years <= 0) are worth their intrinsic value.
+
+    :returns: A tuple of (put prices, call prices)
+    """
+    underlying, strikes, years, vols = np.broadcast_arrays(
+        underlying, strikes, years, vols
+    )
+    live = (years > 0) & (vols > 0)
+    t = np.where(live, years, 1.0)
+    v = np.where(live, vols, 1.0)
+    sqrt_t = np.sqrt(t)
+    d1 = (np.log(underlying / strikes) + (rate + 0.5 * v**2) * t) / (v * sqrt_t)
+    d2 = d1 - v * sqrt_t
+    discounted = strikes * np.exp(-rate * t)
+    calls = underlying * ndtr(d1) - discounted * ndtr(d2)
+    puts = discounted * ndtr(-d2) - underlying * ndtr(-d1)
+    calls = np.where(live, calls, np.maximum(underlying - strikes, 0))
+    puts = np.where(live, puts, np.maximum(strikes - underlying, 0))
+    return puts, calls
+
+
+class ChainModel:
+    """
+    How the semisynthetic chains look like, and how their options are priced.
+
+    Every day has weekly expirations (the next Fridays, including today
+    if it's a Friday), and strikes every `strike_step` within the given distance
+    from the underlying. The options are priced with Black-Scholes, with the VIX
+    as the at-the-money volatility, skewed linearly in log-moneyness:
+
+        vol = vix / 100 * (1 - skew * ln(strike / underlying))
+
+    The bid/ask is spread around that price by `spread_pct` of it
+    (but at least `min_spread`), and rounded to cents.
+    """
+
+    def __init__(
+        self,
+        expiries_per_day=8,
+        strike_step=1.0,
+        max_strike_distance_pct=0.3,
+        skew=3.0,
+        rate=0.0,
+        min_spread=0.01,
+        spread_pct=0.05,
+    ):
+        self.expiries_per_day = expiries_per_day
+        self.strike_step = strike_step
+        self.max_strike_distance_pct = max_strike_distance_pct
+        self.skew = skew
+        self.rate = rate
+        self.min_spread = min_spread
+        self.spread_pct = spread_pct
+
+    def strike_range(self, underlying):
+        """The lowest and highest strikes listed, as multiples of the strike step."""
+        lowest = np.ceil(
+            underlying * (1 - self.max_strike_distance_pct) / self.strike_step
+        )
+        highest = np.floor(
+            underlying * (1 + self.max_strike_distance_pct) / self.strike_step
+        )
+        return lowest, highest
+
+    def days_to_friday(self, dates):
+        return (4 - pd.DatetimeIndex(dates).weekday.to_numpy()) % 7
+
+    def implied_vols(self, underlying, vols, strikes):
+        log_moneyness = np.log(strikes / underlying)
+        return vols * np.maximum(1 - self.skew * log_moneyness, 0.1)
+
+    def price(self, underlying, vols, strikes, dte):
+        """Price the puts and calls (arrays of any broadcastable shape).
+
+        :param vols: the at-the-money volatility (the VIX / 100)
+        :returns: A dict of [P_BID], [P_ASK], [C_BID], [C_ASK] and [P_IV]/[C_IV]
+        """
+        iv = self.implied_vols(underlying, vols, strikes)
+        puts, calls = black_scholes(underlying, strikes, dte / 365, iv, self.rate)
+        quotes = {}
+        quotes["[P_BID]"], quotes["[P_ASK]"] = self._spread(puts)
+        quotes["[P_IV]"] = iv
+        quotes["[C_BID]"], quotes["[C_ASK]"] = self._spread(calls)
+        quotes["[C_IV]"] = iv
+        return quotes
+
+    def _spread(self, prices):
+        half = np.maximum(prices * self.spread_pct, self.min_spread) / 2
+        bids = np.maximum(np.floor((prices - half) * 100) / 100, 0)
+        asks = np.maximum(np.ceil((prices + half) * 100) / 100, bids + 0.01)
+        return bids, asks
+
+    def chains(self, dates, underlying, vols, calls=True):
+        """Generate the chains of some days, all at once.
+
+        :param dates: pd.DatetimeIndex of the days
+        :param underlying: the underlying price of each day
+        :param vols: the at-the-money volatility (the VIX / 100) of each day
+        :returns: A Pandas dataframe of quotes, see `generate_chains`
+        """
+        lowest, highest = self.strike_range(underlying)
+        n_strikes = (highest - lowest + 1).astype(int)
+
+        # One row per (day, expiration, strike), days and expirations in order
+        rows_per_day = n_strikes * self.expiries_per_day
+        day = np.repeat(np.arange(len(dates)), rows_per_day)
+        within_day = np.arange(len(day)) - np.repeat(
+            np.cumsum(rows_per_day) - rows_per_day, rows_per_day
+        )
+        expiry = within_day // n_strikes[day]
+        strikes = (lowest[day] + within_day % n_strikes[day]) * self.strike_step
+
+        dte = self.days_to_friday(dates)[day] + 7 * expiry
+        quote_dates = pd.DatetimeIndex(dates).to_numpy()[day]
+        price = underlying[day]
+        prices = self.price(price, vols[day], strikes, dte)
+
+        quotes = {
+            "[QUOTE_DATE]": quote_dates,
+            "[UNDERLYING_LAST]": price,
+            "[EXPIRE_DATE]": quote_dates + dte.astype("timedelta64[D]"),
+            "[DTE]": dte.astype(float),
+            "[STRIKE]": strikes,
+            "[P_BID]": prices["[P_BID]"],
+            "[P_ASK]": prices["[P_ASK]"],
+            "[P_IV]": prices["[P_IV]"],
+        }
+        if calls:
+            quotes["[C_BID]"] = prices["[C_BID]"]
+            quotes["[C_ASK]"] = prices["[C_ASK]"]
+            quotes["[C_IV]"] = prices["[C_IV]"]
+        quotes["[STRIKE_DISTANCE]"] = np.abs(strikes - price)
+        quotes["[STRIKE_DISTANCE_PCT]"] = np.abs(strikes - price) / price
+        return pd.DataFrame(quotes)
+
+
+def align(underlying, vix):
+    """Align the underlying and VIX series on their common dates.
+
+    :returns: A tuple of (dates, underlying array, volatility array = VIX / 100)
+    """
+    both = pd.concat([underlying, vix], axis=1, join="inner").dropna()
+    return (
+        pd.DatetimeIndex(both.index),
+        both.iloc[:, 0].to_numpy(dtype=float),
+        both.iloc[:, 1].to_numpy(dtype=float) / 100,
+    )
+
+
+def generate_chains(underlying, vix, chunk_days=250, calls=True, **model_params):
+    """Generate semisynthetic option chains from the underlying and VIX series.
+
+    See ChainModel for how they look like, and for the `model_params`.
+
+    Everything is computed with array operations, a chunk of days at a time,
+    and the chunks are yielded one by one, so that decades of chains
+    never need to be in memory at once.
+
+    :param underlying: pd.Series of the underlying's closing prices, by date
+    :param vix: pd.Series of the VIX, by date (only the dates in both are used)
+    :param chunk_days: how many days of quotes to yield at a time
+    :param calls: whether to generate the call quotes too
+    :returns: An iterator of Pandas dataframes, in the same format as
+        the processed OptionsDX data (see `HistoricalMarket.get_quotes`)
+    """
+    model = ChainModel(**model_params)
+    dates, prices, vols = align(underlying, vix)
+    for start in range(0, len(dates), chunk_days):
+        end = start + chunk_days
+        yield model.chains(dates[start:end], prices[start:end], vols[start:end], calls)
+
+
+def generate_quotes(underlying, vix, **kwargs):
+    """Same as `generate_chains`, but all the chains in a single dataframe."""
+    return pd.concat(
+        list(generate_chains(underlying, vix, **kwargs)), ignore_index=True
+    )
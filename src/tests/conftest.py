@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from pytest import fixture
+
+
+@fixture
+def quotes_df():
+    # 6 weeks of daily quotes, with weekly and monthly expirations (puts only)
+    rows = []
+    for i, date in enumerate(pd.bdate_range("2020-01-06", periods=30)):
+        underlying = 100 + 5 * np.sin(i / 3)
+        for expiration in pd.date_range("2020-01-10", periods=10, freq="7D"):
+            if expiration < date:
+                continue
+            for strike in range(85, 116, 5):
+                bid = max(strike - underlying, 0) + (expiration - date).days / 10
+                rows.append(
+                    {
+                        "[QUOTE_DATE]": date,
+                        "[UNDERLYING_LAST]": underlying,
+                        "[EXPIRE_DATE]": expiration,
+                        "[DTE]": (expiration - date).days,
+                        "[STRIKE]": strike,
+                        "[P_BID]": round(bid, 2),
+                        "[P_ASK]": round(bid + 0.1, 2),
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+@fixture
+def quotes_1d_df():
+    # A single day, a single expiration, three puts
+    return pd.DataFrame(
+        {
+            "[STRIKE]": [90, 100, 110],
+            "[UNDERLYING_LAST]": [99.5, 99.5, 99.5],
+            "[P_BID]": [0.1, 1.0, 10.0],
+            "[P_ASK]": [0.2, 1.1, 10.1],
+            "[QUOTE_DATE]": pd.to_datetime("2020-01-01"),
+            "[EXPIRE_DATE]": pd.to_datetime("2020-01-08"),
+            "[DTE]": 7,
+        }
+    )
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.accounts import AccountTerms, RegTMargin
+from src.markets import HistoricalMarket
+from src.options import Call, Put
+from src.orders import Order
+from src.strategies import SellWeeklyPuts
+from src.wallet import Ledger, Position
+
+EXPIRATION = pd.Timestamp("2020-01-17")
+
+
+def _ledger(*legs):
+    return Ledger(
+        [
+            Position(OptionClass(strike, EXPIRATION), q, 1.0)
+            for OptionClass, strike, q in legs
+        ]
+    )
+
+
+class TestRegTMargin:
+    def test_naked(self):
+        margin = RegTMargin()
+        strikes = np.array([100.0, 80.0, 120.0])
+        requirements = margin.naked(strikes, np.array([-1, -1, 1]), 1.0, 100.0)
+        # 20% of the underlying, less the OTM amount, but at least 10% of the strike
+        # (of the underlying, for calls)
+        assert requirements.tolist() == [21.0, 9.0, 11.0]
+
+    def test_spreads(self):
+        margin = RegTMargin()
+        prices = np.ones(4)
+        # A put spread 10 wide needs just that
+        ledger = _ledger((Put, 100, -1), (Put, 90, 1))
+        assert margin.requirements(ledger, prices[:2], 100.0) == {
+            ledger.expiries[0]: 10.0
+        }
+        # An iron condor, only one side can lose at expiration
+        ledger = _ledger((Put, 95, 1), (Put, 100, -1), (Call, 105, -1), (Call, 107, 1))
+        assert margin.requirements(ledger, prices, 100.0) == {ledger.expiries[0]: 5.0}
+        # A put spread and a naked call, both sides
+        ledger = _ledger((Put, 95, 1), (Put, 100, -1), (Call, 105, -1))
+        assert margin.requirements(ledger, prices[:3], 100.0) == {
+            ledger.expiries[0]: 5.0 + 16.0
+        }
+        # Not capped, so naked
+        ledger = _ledger((Call, 105, -2), (Call, 107, 1))
+        assert list(margin.requirements(ledger, prices[:2], 100.0).values()) == [32.0]
+
+
+class TestLimits:
+    def _strategy(self, quotes_df, capital, **terms):
+        market = HistoricalMarket(quotes_df=quotes_df)
+        strategy = SellWeeklyPuts(market, capital, terms=AccountTerms(**terms))
+        next(market)
+        return strategy
+
+    def test_margin(self, quotes_1d_df):
+        # Sold for 1.0, plus 19.9 (20% of 99.5) needed
+        strategy = self._strategy(quotes_1d_df, capital=20)
+        strategy.run()
+        assert strategy.wallet.positions == []
+        assert strategy.get_margin_requirement() == 0
+        assert strategy.get_buying_power() == 20
+
+        strategy = self._strategy(quotes_1d_df, capital=21)
+        strategy.run()
+        assert len(strategy.wallet.positions) == 1
+        # Bought back at 1.1
+        assert strategy.get_margin_requirement() == pytest.approx(21.0)
+        assert strategy.get_buying_power() == pytest.approx(21 - 0.1 - 21.0)
+
+    def test_max_margin_pct(self, quotes_1d_df):
+        strategy = self._strategy(quotes_1d_df, capital=50, max_margin_pct=0.3)
+        strategy.run()
+        assert strategy.wallet.positions == []
+        # The spread needs much less
+        assert len(strategy.open_order(Order.put_spread(100, 90, 7))) == 2
+
+    def test_max_contracts(self, quotes_1d_df):
+        strategy = self._strategy(quotes_1d_df, capital=100, max_contracts=1)
+        assert strategy.open_order(Order.put_spread(100, 90, 7)) == []
+        strategy.run()
+        assert len(strategy.wallet.positions) == 1
+
+    def test_commissions(self, quotes_1d_df):
+        strategy = self._strategy(quotes_1d_df, capital=100, commission=0.01)
+        positions = strategy.open_order(Order.put_spread(100, 90, 7))
+        assert strategy.wallet.cash == pytest.approx(100 + 0.8 - 0.02)
+        strategy.close_positions(positions)
+        assert strategy.wallet.cash == pytest.approx(100 - 0.2 - 0.04)
+
+    def test_store_key(self):
+        terms = repr(AccountTerms(commission=0.01))
+        assert terms == repr(AccountTerms(commission=0.01))
+        assert terms != repr(AccountTerms())
@@ -0,0 +1,26 @@
+import tracemalloc
+
+import pytest
+
+from benchmarks.bench_markets import traced
+from benchmarks.run import BENCHMARKS, MARKETS, measure
+from benchmarks.synthetic import make_quotes
+
+
+@pytest.mark.parametrize("name", BENCHMARKS)
+@pytest.mark.parametrize("market", MARKETS)
+def test_benchmark(name, market):
+    # Just make sure they all still run
+    quotes_df = make_quotes(years=0.1, strikes_per_expiry=10, expiries_per_day=5)
+    result = measure(BENCHMARKS[name], quotes_df, MARKETS[market])
+    assert result["seconds"] > 0
+    assert result["days"] == 25
+    assert result["days_per_sec"] > 0
+
+
+def test_traced():
+    # Timed without tracing the memory, which is measured in a separate run
+    calls = []
+    result, seconds, peak_mb = traced(lambda: calls.append(tracemalloc.is_tracing()))
+    assert calls == [False, True]
+    assert seconds > 0 and peak_mb >= 0
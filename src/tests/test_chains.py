@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pytest import fixture
+
+from src.chains import QuoteChain
+
+
+@fixture
+def quotes_df():
+    return pd.DataFrame(
+        {
+            "[EXPIRE_DATE]": pd.to_datetime(
+                ["2020-01-08", "2020-01-03", "2020-01-08", "2020-01-03", "2020-01-31"]
+            ),
+            "[STRIKE]": [100, 100, 90, 110, 100],
+            "[DTE]": [7, 2, 7, 2, 30],
+            "[P_BID]": [1.0, 0.5, 0.1, 10.0, 3.0],
+            "[P_ASK]": [1.1, 0.6, 0.2, 10.1, 3.2],
+        }
+    )
+
+
+def _nearest_by_sorting(quotes_df, ideal_strike, ideal_dte):
+    # The straightforward (and slow) reference implementation
+    quotes_df = quotes_df.copy()
+    quotes_df["_strike_distance"] = (quotes_df["[STRIKE]"] - ideal_strike).abs()
+    quotes_df["_dte_distance"] = (quotes_df["[DTE]"] - ideal_dte).abs()
+    quotes_df.sort_values(
+        by=["_strike_distance", "_dte_distance"], inplace=True, kind="stable"
+    )
+    return quotes_df.iloc[0]
+
+
+class TestQuoteChain:
+    def test_sorted(self, quotes_df):
+        chain = QuoteChain(quotes_df)
+        assert len(chain) == 5
+        assert list(chain.strikes) == [90, 100, 100, 100, 110]
+        assert list(chain.dte) == [7, 2, 7, 30, 2]
+        assert list(chain.column("[P_BID]")) == [0.1, 0.5, 1.0, 3.0, 10.0]
+
+    def test_locate(self, quotes_df):
+        chain = QuoteChain(quotes_df)
+        row = chain.locate(pd.to_datetime("2020-01-08"), 100)
+        assert chain.column("[P_ASK]")[row] == 1.1
+
+    def test_locate_missing(self, quotes_df):
+        chain = QuoteChain(quotes_df)
+        with pytest.raises(IndexError):
+            chain.locate(pd.to_datetime("2020-01-08"), 110)
+
+    @pytest.mark.parametrize(
+        "ideal_strike, ideal_dte, expected_bid",
+        [
+            (99.5, 6, 1.0),
+            (99.5, 1, 0.5),
+            (80, 100, 0.1),
+            (200, 0, 10.0),
+            (95, 2, 0.5),  # equally distant strikes, the closer dte wins
+            (105, 7, 1.0),
+        ],
+    )
+    def test_nearest(self, quotes_df, ideal_strike, ideal_dte, expected_bid):
+        chain = QuoteChain(quotes_df)
+        row = chain.nearest(ideal_strike, ideal_dte)
+        assert chain.column("[P_BID]")[row] == expected_bid
+
+    def test_nearest_matches_sorting(self):
+        rng = np.random.default_rng(0)
+        expirations = pd.to_datetime("2020-01-01") + pd.to_timedelta(
+            rng.integers(1, 60, size=500), unit="D"
+        )
+        quotes_df = pd.DataFrame(
+            {
+                "[EXPIRE_DATE]": expirations,
+                "[STRIKE]": rng.integers(50, 150, size=500).astype(float),
+                "[P_BID]": np.arange(500, dtype=float),
+            }
+        )
+        quotes_df["[DTE]"] = (
+            quotes_df["[EXPIRE_DATE]"] - pd.to_datetime("2020-01-01")
+        ).dt.days
+        chain = QuoteChain(quotes_df)
+        for ideal_strike, ideal_dte in zip(
+            rng.uniform(40, 160, 200), rng.integers(0, 70, 200)
+        ):
+            expected = _nearest_by_sorting(quotes_df, ideal_strike, ideal_dte)
+            row = chain.nearest(ideal_strike, ideal_dte)
+            assert chain.column("[P_BID]")[row] == expected["[P_BID]"]
+
+    def test_dte_from_quote_date(self, quotes_df):
+        chain = QuoteChain(
+            quotes_df.drop(columns=["[DTE]"]), pd.to_datetime("2020-01-01")
+        )
+        assert list(chain.dte) == [7, 2, 7, 30, 2]
+
+    def test_nearest_empty(self, quotes_df):
+        chain = QuoteChain(quotes_df.iloc[:0])
+        with pytest.raises(IndexError):
+            chain.nearest(100, 7)
+
+    def test_nearest_strikes(self, quotes_df):
+        chain = QuoteChain(quotes_df)
+        rows = chain.nearest_strikes("2020-01-08", [80, 94, 95, 96, 120])
+        assert chain.strikes[rows].tolist() == [90, 90, 90, 100, 100]
+        assert (chain.expirations[rows] == np.datetime64("2020-01-08")).all()
+        # Only among the valid ones
+        valid = chain.strikes != 90
+        rows = chain.nearest_strikes("2020-01-08", [80], valid=valid)
+        assert chain.strikes[rows].tolist() == [100]
+        rows = chain.nearest_strikes("2020-01-31", [80, 120])
+        assert chain.strikes[rows].tolist() == [100, 100]
+        with pytest.raises(IndexError):
+            chain.nearest_strikes("2020-01-09", [100])
+
+    def test_nearest_expiration(self, quotes_df):
+        chain = QuoteChain(quotes_df)
+        assert chain.nearest_expiration(6) == np.datetime64("2020-01-08")
+        # Equally distant, the earlier one wins
+        assert chain.nearest_expiration(4.5) == np.datetime64("2020-01-03")
+        # Only among those far enough
+        assert chain.nearest_expiration(2, min_dte=8) == np.datetime64("2020-01-31")
+        with pytest.raises(IndexError):
+            chain.nearest_expiration(7, min_dte=31)
+
+    def test_nearest_deltas(self, quotes_df):
+        chain = QuoteChain(quotes_df)
+        # In the chain's order: (90, 01-08), (100, 01-03), (100, 01-08), (100, 01-31), (110, 01-03)
+        deltas = np.array([-0.25, -0.5, -0.75, np.nan, -0.9])
+        rows = chain.nearest_deltas("2020-01-08", deltas, [-0.1, -0.5, -0.7])
+        # Ties go to the lower strike
+        assert chain.strikes[rows].tolist() == [90, 90, 100]
+        with pytest.raises(IndexError):
+            chain.nearest_deltas("2020-01-31", deltas, [-0.5])
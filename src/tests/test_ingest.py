@@ -0,0 +1,73 @@
+import pandas as pd
+from pytest import fixture
+
+from src.ingest import find_files, ingest, ingest_file, read_optionsdx
+
+HEADER = (
+    "[QUOTE_UNIXTIME], [QUOTE_READTIME], [QUOTE_DATE], [QUOTE_TIME_HOURS],"
+    " [UNDERLYING_LAST], [EXPIRE_DATE], [EXPIRE_UNIX], [DTE], [C_IV], [C_SIZE],"
+    " [C_BID], [C_ASK], [STRIKE], [P_BID], [P_ASK], [P_SIZE], [P_IV],"
+    " [STRIKE_DISTANCE], [STRIKE_DISTANCE_PCT]"
+)
+ROWS = [
+    "1577998800, 2020-01-02 16:00, 2020-01-02, 16.000000, 324.87, 2020-01-03,"
+    " 1578085200, 1.000000, 0.213, 5 x 5, 24.5, 25.1, 300.0, 0.01, 0.02, 1 x 1,"
+    " , 24.9, 0.077",
+    "1577998800, 2020-01-02 16:00, 2020-01-02, 16.000000, 324.87, 2020-01-03,"
+    " 1578085200, 1.000000, , 5 x 5, 0.0, 0.01, 350.0, 25.0, 25.3, 1 x 1,"
+    " 0.5, 25.1, 0.077",
+]
+
+
+@fixture
+def raw_directory(tmp_path):
+    directory = tmp_path / "raw"
+    (directory / "spy_eod_2020").mkdir(parents=True)
+    (directory / "spy_eod_2020" / "spy_eod_202001.txt").write_text(
+        "\n".join([HEADER] + ROWS) + "\n"
+    )
+    (directory / "spy_eod_2020" / "spy_eod_202002.txt").write_text(
+        "\n".join([HEADER] + [row.replace("2020-01-0", "2020-02-0") for row in ROWS])
+        + "\n"
+    )
+    (directory / "readme.md").write_text("Not quotes")
+    return directory
+
+
+class TestIngest:
+    def test_read_optionsdx(self, raw_directory):
+        df = read_optionsdx(raw_directory / "spy_eod_2020" / "spy_eod_202001.txt")
+        assert len(df) == 2
+        assert "[C_SIZE]" not in df.columns
+        assert df["[QUOTE_DATE]"].iloc[0] == pd.Timestamp("2020-01-02")
+        assert df["[QUOTE_READTIME]"].iloc[0] == pd.Timestamp("2020-01-02 16:00")
+        assert df["[EXPIRE_DATE]"].iloc[0] == pd.Timestamp("2020-01-03")
+        assert df["[STRIKE]"].dtype == "float64"
+        assert df["[P_IV]"].dtype == "float32"
+        assert df["[QUOTE_UNIXTIME]"].dtype == "int64"
+        assert df["[P_IV]"].isna().tolist() == [True, False]
+        assert df["[P_BID]"].tolist() == [0.01, 25.0]
+
+    def test_read_optionsdx_coerced(self, raw_directory):
+        path = raw_directory / "broken.txt"
+        path.write_text("\n".join([HEADER, ROWS[0].replace("0.213", "n/a")]) + "\n")
+        df = read_optionsdx(path)
+        assert df["[C_IV]"].isna().all()
+        assert df["[C_IV]"].dtype == "float32"
+        assert df["[P_BID]"].tolist() == [0.01]
+
+    def test_find_files(self, raw_directory):
+        assert [path.rsplit("/", 1)[-1] for path in find_files(raw_directory)] == [
+            "spy_eod_202001.txt",
+            "spy_eod_202002.txt",
+        ]
+
+    def test_ingest_file(self, raw_directory, tmp_path):
+        path = raw_directory / "spy_eod_2020" / "spy_eod_202001.txt"
+        assert ingest_file(str(path), str(tmp_path / "out")) == 2
+        assert (tmp_path / "out/year=2020/month=1/spy_eod_202001.parquet").exists()
+
+    def test_ingest(self, raw_directory, tmp_path):
+        assert ingest(str(raw_directory), str(tmp_path / "out"), max_workers=2) == 4
+        df = pd.read_parquet(tmp_path / "out", columns=["[QUOTE_DATE]", "[P_BID]"])
+        assert sorted(df["[QUOTE_DATE]"].dt.month.tolist()) == [1, 1, 2, 2]
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pytest import fixture
+
+from benchmarks.synthetic import make_quotes
+from src.loaders import (
+    compile_market,
+    load_market,
+    load_quotes,
+    open_market,
+    save_arrays,
+)
+from src.markets import ColumnarMarket
+from src import sweep
+from src.store import ResultStore, fingerprint_arrays
+from src.strategies import SellWeeklyPuts
+from src.sweep import run_sweep
+
+
+@fixture
+def quotes_path(tmp_path):
+    dates = pd.to_datetime(["2020-01-02", "2020-01-02", "2020-01-03", "2020-02-03"])
+    df = pd.DataFrame(
+        {
+            "[QUOTE_DATE]": dates,
+            "[UNDERLYING_LAST]": [100.0, 100.0, 101.0, 102.0],
+            "[EXPIRE_DATE]": pd.to_datetime(
+                ["2020-01-10", "2020-03-20", "2020-01-10", "2020-02-07"]
+            ),
+            "[DTE]": [8.0, 78.0, 7.0, 4.0],
+            "[STRIKE]": [90.0, 100.0, 130.0, 100.0],
+            "[P_BID]": [0.5, 5.0, 29.0, None],
+            "[P_ASK]": [0.6, 5.2, 29.5, 1.1],
+            "[C_BID]": [10.0, 7.0, 0.01, 2.0],
+            "[C_ASK]": [10.2, 7.2, 0.02, 2.1],
+            "[STRIKE_DISTANCE_PCT]": [0.1, 0.0, 0.287, 0.02],
+        }
+    )
+    path = tmp_path / "quotes.parquet"
+    df.to_parquet(path, row_group_size=2)
+    return path
+
+
+class TestLoadQuotes:
+    def test_puts(self, quotes_path):
+        df = load_quotes(quotes_path)
+        assert list(df.columns) == [
+            "[QUOTE_DATE]",
+            "[UNDERLYING_LAST]",
+            "[EXPIRE_DATE]",
+            "[DTE]",
+            "[STRIKE]",
+            "[P_BID]",
+            "[P_ASK]",
+        ]
+        # The one without a bid is dropped
+        assert df["[STRIKE]"].tolist() == [90, 100, 130]
+
+    def test_calls(self, quotes_path):
+        df = load_quotes(quotes_path, puts=False, calls=True)
+        assert "[P_BID]" not in df.columns
+        assert df["[C_BID]"].tolist() == [10.0, 7.0, 0.01, 2.0]
+
+    def test_filters(self, quotes_path):
+        df = load_quotes(quotes_path, start="2020-01-02", end="2020-01-31", max_dte=60)
+        assert df["[STRIKE]"].tolist() == [90, 130]
+        df = load_quotes(quotes_path, min_dte=8, max_strike_distance_pct=0.2)
+        assert df["[STRIKE]"].tolist() == [90, 100]
+
+    def test_extra_columns(self, quotes_path):
+        df = load_quotes(quotes_path, columns=["[STRIKE_DISTANCE_PCT]"])
+        assert "[STRIKE_DISTANCE_PCT]" in df.columns
+
+    def test_partitioned(self, quotes_path, tmp_path):
+        df = pd.read_parquet(quotes_path)
+        df["year"] = df["[QUOTE_DATE]"].dt.year
+        df["month"] = df["[QUOTE_DATE]"].dt.month
+        df.to_parquet(tmp_path / "dataset", partition_cols=["year", "month"])
+        quotes = load_quotes(tmp_path / "dataset", start="2020-01-03", calls=True)
+        assert quotes["[STRIKE]"].tolist() == [130]
+
+
+def test_load_market(quotes_path):
+    market = load_market(quotes_path, max_dte=60)
+    assert len(market) == 2
+    date, price, quotes = next(market)
+    assert date == pd.Timestamp("2020-01-02")
+    assert list(quotes["[STRIKE]"]) == [90]
+
+
+@fixture
+def quotes_df():
+    return make_quotes(years=0.25, strikes_per_expiry=10, expiries_per_day=4)
+
+
+class TestCompiledMarket:
+    def test_compile_and_open(self, quotes_df, tmp_path):
+        compile_market(quotes_df, tmp_path / "compiled")
+        market = open_market(tmp_path / "compiled")
+        assert market.compiled_path == tmp_path / "compiled"
+        assert not market.surface_fallback
+        assert open_market(
+            tmp_path / "compiled", surface_fallback=True
+        ).surface_fallback
+        assert all(
+            isinstance(values, np.memmap) for values in market.to_arrays().values()
+        )
+
+        expected = ColumnarMarket(quotes_df)
+        assert len(market) == len(expected)
+        for (date, price, quotes), (date2, price2, quotes2) in zip(market, expected):
+            assert date == date2 and price == price2
+            assert quotes.keys() == quotes2.keys()
+            for name in quotes:
+                np.testing.assert_array_equal(quotes[name], quotes2[name])
+
+    def test_sweep(self, quotes_df, tmp_path):
+        compile_market(quotes_df, tmp_path)
+        market = open_market(tmp_path)
+        args = ([SellWeeklyPuts], {"ideal_strike": [0.9, 1.0]})
+        expected = run_sweep(quotes_df, *args, max_workers=1)
+        for max_workers in (1, 2):
+            results = run_sweep(market, *args, max_workers=max_workers)
+            assert results["final_value"].tolist() == expected["final_value"].tolist()
+        # The market itself isn't moved forward
+        assert market.current_date is None
+
+    def test_fingerprint(self, quotes_df, tmp_path, monkeypatch):
+        compile_market(quotes_df, tmp_path)
+        market = open_market(tmp_path)
+        assert market.fingerprint == fingerprint_arrays(market.to_arrays())
+
+        # Not computed again, e.g. when keying the stored results
+        def fail(arrays):
+            raise AssertionError("Hashed the compiled data")
+
+        monkeypatch.setattr(sweep, "fingerprint_arrays", fail)
+        store = ResultStore(tmp_path / "results")
+        args = ([SellWeeklyPuts], {"ideal_strike": [0.9, 1.0]})
+        run_sweep(market, *args, max_workers=1, store=store)
+        assert len(store.runs()) == 2
+
+        # Only the compiled markets know theirs
+        assert ColumnarMarket(quotes_df).fingerprint is None
+        assert ColumnarMarket(quotes_df).compiled_path is None
+
+    def test_objects(self, tmp_path):
+        with pytest.raises(TypeError):
+            save_arrays({"a": np.array(["x", None], dtype=object)}, tmp_path)
+        assert not (tmp_path / "columns.json").exists()
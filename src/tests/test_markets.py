@@ -1,8 +1,17 @@
+import numpy as np
 import pandas as pd
+import pytest
 from pandas.testing import assert_frame_equal
 from pytest import fixture
 
-from src.markets import HistoricalMarket
+from src.accounts import AccountTerms
+from src.markets import ColumnarMarket, HistoricalMarket, LazyMarket, PortfolioMarket
+from src.options import Call, Put
+from src.orders import Order
+from src.scheduler import Scheduler
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts, get_market_values
+from src.synthetic import generate_quotes
+from src.wallet import Position
 
 
 @fixture
@@ -72,3 +81,401 @@ class TestHistoricalMarket:
             i += 1
 
         assert i == 8
+
+    def test_sell_to_open(self, quotes_1d_df):
+        quotes_1d_df["[DTE]"] = 7
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        next(market)
+        position = market.sell_to_open(ideal_strike=104, ideal_dte=5)
+        assert position.option.strike == 100
+        assert position.option.expiration == pd.to_datetime("2020-01-08")
+        assert position.quantity == -1
+        assert position.cost == 2
+
+    def test_roll(self, quotes_1d_df):
+        later = quotes_1d_df.assign(
+            **{"[EXPIRE_DATE]": pd.to_datetime("2020-01-15"), "[P_BID]": [4, 5, 6]}
+        )
+        market = HistoricalMarket(quotes_df=pd.concat([quotes_1d_df, later]))
+        next(market)
+        position = Position(Put(110, pd.to_datetime("2020-01-08")), quantity=-1, cost=4)
+        close_value, new_position = market.roll(position, ideal_strike=100, ideal_dte=7)
+        assert close_value == -3.1
+        assert position.closed_at == market.current_date
+        # Never the same expiration, even if it's the closest to the ideal dte
+        assert new_position.option.strike == 100
+        assert new_position.option.expiration == pd.to_datetime("2020-01-15")
+        assert new_position.cost == 5
+
+    def test_roll_no_later_expiration(self, quotes_1d_df):
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        next(market)
+        position = Position(Put(110, pd.to_datetime("2020-01-08")), quantity=-1, cost=4)
+        with pytest.raises(IndexError):
+            market.roll(position, ideal_strike=100, ideal_dte=7)
+        assert position.closed_at is None
+
+    def test_buy_and_sell(self, quotes_1d_df):
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        next(market)
+        put = Put(strike=110, expiration=pd.to_datetime("2020-01-08"))
+        assert market.sell(put) == 3
+        assert market.buy(put) == 3.1
+
+    def test_buy_missing(self, quotes_1d_df):
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        next(market)
+        with pytest.raises(IndexError):
+            market.buy(Put(strike=120, expiration=pd.to_datetime("2020-01-08")))
+
+
+class TestColumnarMarket:
+    def test_instance(self, quotes_1d_df):
+        market = ColumnarMarket(quotes_df=quotes_1d_df)
+        assert len(market) == 1
+        assert market.current_date is None
+        assert market.current_quotes is None
+        assert market.underlying_last is None
+
+    def test_same_as_historical(self, quotes_8w_df):
+        # Shuffle, to make sure the order doesn't matter
+        quotes_8w_df = quotes_8w_df.sample(frac=1, random_state=0)
+        columnar = ColumnarMarket(quotes_df=quotes_8w_df)
+        historical = HistoricalMarket(quotes_df=quotes_8w_df)
+        assert len(columnar) == len(historical) == 8
+
+        for (date, price, quotes), (h_date, h_price, h_quotes) in zip(
+            columnar, historical
+        ):
+            assert date == h_date
+            assert price == h_price
+            assert list(quotes["[STRIKE]"]) == [90, 100, 110]
+            assert_frame_equal(
+                columnar.get_quotes(),
+                h_quotes.sort_values("[STRIKE]").reset_index(drop=True),
+                check_dtype=False,
+            )
+
+    def test_zero_copy(self, quotes_8w_df):
+        market = ColumnarMarket(quotes_df=quotes_8w_df)
+        date, price, quotes = next(market)
+        assert np.shares_memory(quotes["[P_BID]"], market._columns["[P_BID]"])
+
+    def test_trading(self, quotes_1d_df):
+        quotes_1d_df["[DTE]"] = 7
+        market = ColumnarMarket(quotes_df=quotes_1d_df)
+        next(market)
+        position = market.sell_to_open(ideal_strike=104, ideal_dte=5)
+        assert position.option.strike == 100
+        assert position.cost == 2
+        assert market.buy(position.option) == 2.1
+        assert market.sell(position.option) == 2
+
+
+class TestValuePositions:
+    def test_value_positions(self, quotes_1d_df):
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        next(market)
+        expiration = pd.to_datetime("2020-01-08")
+        positions = [
+            Position(Put(100, expiration), quantity=-1, cost=2),
+            Position(Put(110, expiration), quantity=2, cost=3),
+            Position(Put(120, expiration), quantity=-1, cost=20),  # not quoted
+        ]
+        market_values, intrinsic_values = market.value_positions(positions)
+        assert market_values[:2].tolist() == [
+            market.close(p, dry_run=True) for p in positions[:2]
+        ]
+        assert np.isnan(market_values[2])
+        assert intrinsic_values.tolist() == [-1, 22, -21]
+
+    def test_value_expiring_positions(self, quotes_1d_df):
+        quotes_1d_df["[EXPIRE_DATE]"] = quotes_1d_df["[QUOTE_DATE]"]
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        next(market)
+        positions = [
+            Position(Put(strike, market.current_date), quantity=-1, cost=1)
+            for strike in [90, 100]
+        ]
+        market_values, _ = market.value_positions(positions)
+        # The OTM one expires worthless, the ITM one must be bought back
+        assert market_values.tolist() == [0, -2.1]
+
+    def test_value_no_positions(self, quotes_1d_df):
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        next(market)
+        market_values, intrinsic_values = market.value_positions([])
+        assert len(market_values) == len(intrinsic_values) == 0
+
+
+@fixture
+def series():
+    dates = pd.bdate_range("2020-01-06", periods=60)
+    rng = np.random.default_rng(0)
+    spy = pd.Series(300 * np.exp(np.cumsum(rng.normal(0, 0.01, 60))), index=dates)
+    vix = pd.Series(np.linspace(15, 30, 60), index=dates)
+    return spy, vix
+
+
+class TestLazyMarket:
+    @pytest.mark.parametrize("StrategyClass", [SellWeeklyPuts, SellMonthlyPuts])
+    @pytest.mark.parametrize("ideal_strike", [0.9, 1.0])
+    def test_same_as_generated(self, series, StrategyClass, ideal_strike):
+        # The same trades as on the fully generated chains
+        runs = []
+        for market in (
+            LazyMarket(*series),
+            HistoricalMarket(quotes_df=generate_quotes(*series)),
+        ):
+            strategy = StrategyClass(market, ideal_strike=ideal_strike)
+            values = []
+            for date, price, quotes in market:
+                strategy.run()
+                values.append(strategy.get_current_market_value())
+            runs.append((strategy.wallet.positions, values))
+
+        (lazy, lazy_values), (generated, generated_values) = runs
+        assert [p.option for p in lazy] == [p.option for p in generated]
+        assert [p.cost for p in lazy] == [p.cost for p in generated]
+        assert lazy_values == generated_values
+
+    def test_current_quotes(self, series):
+        market = LazyMarket(*series, max_strike_distance_pct=0.1)
+        assert len(market) == 60
+        date, price, quotes = next(market)
+        assert quotes is None
+        expected = generate_quotes(
+            series[0].iloc[:1], series[1].iloc[:1], max_strike_distance_pct=0.1
+        )
+        assert len(market.current_quotes) == len(expected)
+        assert (market.current_quotes["[STRIKE]"] == expected["[STRIKE]"]).all()
+
+    def test_cache(self, series):
+        market = LazyMarket(*series, cache_size=2)
+        next(market)
+        options = [Put(strike, "2020-01-10") for strike in (290, 295, 300)]
+        for option in options:
+            market.sell(option)
+        assert list(market._cache) == [
+            (Put, option.strike, option.expiry) for option in options[1:]
+        ]
+        assert market.buy(options[2]) > market.sell(options[2])
+        next(market)
+        assert len(market._cache) == 0
+
+    def test_unlisted(self, series):
+        market = LazyMarket(*series)
+        next(market)
+        with pytest.raises(IndexError):
+            market.sell(Put(300, "2020-01-09"))  # Not a Friday
+        with pytest.raises(IndexError):
+            market.sell(Put(300.5, "2020-01-10"))  # Not on the grid
+        with pytest.raises(IndexError):
+            market.sell(Put(300, "2020-04-10"))  # Too far
+        market_values, _ = market.value_positions(
+            [Position(Put(300.5, "2020-01-10"), quantity=-1, cost=1)]
+        )
+        assert np.isnan(market_values[0])
+
+
+@fixture
+def quotes_both_df():
+    # Puts and calls, two expirations
+    return pd.DataFrame(
+        {
+            "[QUOTE_DATE]": pd.to_datetime("2020-01-01"),
+            "[UNDERLYING_LAST]": 100.0,
+            "[EXPIRE_DATE]": pd.to_datetime(["2020-01-08"] * 5 + ["2020-01-31"] * 5),
+            "[DTE]": [7.0] * 5 + [30.0] * 5,
+            "[STRIKE]": [90.0, 95.0, 100.0, 105.0, 110.0] * 2,
+            "[P_BID]": [0.1, 0.5, 2.0, 5.0, 10.0, 0.5, 1.5, 3.0, 6.0, 10.5],
+            "[P_ASK]": [0.2, 0.6, 2.1, 5.1, 10.1, 0.6, 1.6, 3.1, 6.1, 10.6],
+            "[C_BID]": [10.0, 5.0, 2.0, 0.5, np.nan, 10.5, 6.0, 3.0, 1.5, 0.5],
+            "[C_ASK]": [10.1, 5.1, 2.1, 0.6, np.nan, 10.6, 6.1, 3.1, 1.6, 0.6],
+        }
+    )
+
+
+@pytest.mark.parametrize("MarketClass", [HistoricalMarket, ColumnarMarket])
+class TestOrders:
+    def test_calls(self, quotes_both_df, MarketClass):
+        market = MarketClass(quotes_both_df)
+        next(market)
+        call = Call(105, pd.to_datetime("2020-01-08"))
+        assert market.sell(call) == 0.5
+        assert market.buy(call) == 0.6
+        assert market.sell(Put(105, pd.to_datetime("2020-01-08"))) == 5.0
+        # Only the put is quoted at 110
+        with pytest.raises(IndexError):
+            market.buy(Call(110, pd.to_datetime("2020-01-08")))
+        assert market.buy(Put(110, pd.to_datetime("2020-01-08"))) == 10.1
+
+    def test_iron_condor(self, quotes_both_df, MarketClass):
+        market = MarketClass(quotes_both_df)
+        next(market)
+        positions = market.open_order(Order.iron_condor(89, 96, 99, 104, 10))
+        assert [
+            (type(p.option), p.option.strike, p.quantity, p.cost) for p in positions
+        ] == [
+            (Put, 95, -1, 0.5),
+            (Put, 90, 1, 0.2),
+            (Call, 100, -1, 2.0),
+            (Call, 105, 1, 0.6),
+        ]
+        assert all(
+            p.option.expiration == pd.to_datetime("2020-01-08") for p in positions
+        )
+
+        close_value = market.close_positions(positions)
+        assert close_value == pytest.approx(-0.6 + 0.1 - 2.1 + 0.5)
+        assert all(p.closed_at == market.current_date for p in positions)
+        market_values, _ = market.value_positions(positions)
+        assert market_values.tolist() == [p.close_value for p in positions]
+
+    def test_collapsed_wing(self, quotes_both_df, MarketClass):
+        market = MarketClass(quotes_both_df)
+        next(market)
+        # The 110 call isn't quoted, and the 105 one is the short leg
+        with pytest.raises(IndexError):
+            market.open_order(Order.iron_condor(89, 96, 104, 111, 10))
+        # Not a spread, so the same strike is fine
+        assert len(market.open_order(Order.synthetic_long(100, 7))) == 2
+
+    def test_expiration(self, quotes_both_df, MarketClass):
+        market = MarketClass(quotes_both_df)
+        next(market)
+        positions = market.open_order(Order.synthetic_long(100, 25))
+        assert [(p.option.strike, p.cost) for p in positions] == [
+            (100, 3.1),
+            (100, 3.0),
+        ]
+        assert positions[0].option.expiration == pd.to_datetime("2020-01-31")
+
+    def test_unquoted(self, quotes_both_df, MarketClass):
+        market = MarketClass(quotes_both_df)
+        next(market)
+        positions = [
+            Position(Put(100, pd.to_datetime("2020-01-08")), -1, 2.0),
+            Position(Put(101, pd.to_datetime("2020-01-08")), -1, 2.0),
+        ]
+        with pytest.raises(IndexError):
+            market.close_positions(positions)
+        assert positions[0].closed_at is None
+
+    def test_no_calls(self, quotes_both_df, MarketClass):
+        market = MarketClass(quotes_both_df.drop(columns=["[C_BID]", "[C_ASK]"]))
+        next(market)
+        assert len(market.open_order(Order.put_spread(100, 95, 7))) == 2
+        with pytest.raises(IndexError):
+            market.open_order(Order.strangle(95, 105, 7))
+
+
+def test_lazy_orders(series):
+    # The same legs and prices as on the fully generated chains
+    lazy = LazyMarket(*series)
+    generated = HistoricalMarket(quotes_df=generate_quotes(*series))
+    for market in (lazy, generated):
+        next(market)
+    price = lazy.underlying_last
+    order = Order.iron_condor(price * 0.9, price * 0.95, price * 1.05, price * 1.1, 20)
+    for a, b in zip(lazy.open_order(order), generated.open_order(order)):
+        assert a.option is b.option
+        assert a.quantity == b.quantity
+        assert a.cost == b.cost
+
+
+@fixture
+def two_symbols_df(quotes_df):
+    dates = quotes_df["[QUOTE_DATE]"].unique()
+    # A misses a day, B is twice the price, and only quoted every other day
+    a = quotes_df[quotes_df["[QUOTE_DATE]"] != dates[4]]
+    b = quotes_df[quotes_df["[QUOTE_DATE]"].isin(dates[::2])].assign(
+        **{
+            "[UNDERLYING_LAST]": lambda df: df["[UNDERLYING_LAST]"] * 2,
+            "[STRIKE]": lambda df: df["[STRIKE]"] * 2,
+        }
+    )
+    return a, b
+
+
+class TestPortfolioMarket:
+    def test_calendar(self, two_symbols_df):
+        a, b = two_symbols_df
+        portfolio = PortfolioMarket({"A": ColumnarMarket(a), "B": HistoricalMarket(b)})
+        assert len(portfolio) == 30
+        days = list(portfolio)
+        assert [active for _, _, active in days[:5]] == [
+            ["A", "B"],
+            ["A"],
+            ["A", "B"],
+            ["A"],
+            ["B"],
+        ]
+        date, prices, _ = days[4]
+        assert prices == {
+            "B": b.loc[b["[QUOTE_DATE]"] == date, "[UNDERLYING_LAST]"].iloc[0]
+        }
+        # Each market moved only on its own days
+        assert portfolio["A"].current_date == days[-1][0]
+        assert portfolio["B"]._quotes_by_date.ngroups == 15
+
+    def test_trading(self, two_symbols_df):
+        a, b = two_symbols_df
+        portfolio = PortfolioMarket({"A": ColumnarMarket(a), "B": ColumnarMarket(b)})
+        next(portfolio)
+        put_a = portfolio.sell_to_open(100, 7, symbol="A")
+        put_b = portfolio.sell_to_open(200, 7, symbol="B")
+        assert (put_a.symbol, put_b.symbol) == ("A", "B")
+        assert put_b.option.strike == 2 * put_a.option.strike
+
+        market_values, _ = portfolio.value_positions([put_a, put_b])
+        assert market_values.tolist() == [
+            portfolio["A"].value_positions([put_a])[0][0],
+            portfolio["B"].value_positions([put_b])[0][0],
+        ]
+        next(portfolio)
+        # B isn't quoted today
+        with pytest.raises(IndexError):
+            portfolio.sell_to_open(200, 7, symbol="B")
+        market_values, intrinsic_values = portfolio.value_positions([put_a, put_b])
+        assert np.isnan(market_values[1]) and not np.isnan(market_values[0])
+        assert not np.isnan(intrinsic_values).any()
+        with pytest.raises(IndexError):
+            portfolio.close_positions([put_a, put_b])
+        assert portfolio.close(put_a) < 0
+
+    def test_strategies(self, two_symbols_df):
+        a, b = two_symbols_df
+        terms = AccountTerms(cash_rate=0.02, commission=0.01)
+        portfolio = PortfolioMarket({"A": ColumnarMarket(a), "B": ColumnarMarket(b)})
+        strategies = [
+            SellWeeklyPuts(portfolio, capital=100, terms=terms, symbol=symbol)
+            for symbol in ("A", "B")
+        ]
+        # Valued every day, as in run_sweep
+        curves = np.array(
+            [get_market_values(strategies) for _ in Scheduler(portfolio, strategies)]
+        )
+
+        # Same as on their own, run only on the days their symbol is quoted
+        for quotes_df, strategy, curve in zip((a, b), strategies, curves.T):
+            market = ColumnarMarket(quotes_df)
+            alone = SellWeeklyPuts(market, capital=100, terms=terms)
+            Scheduler(market, [alone]).run()
+            pd.testing.assert_frame_equal(
+                strategy.wallet.to_frame(), alone.wallet.to_frame()
+            )
+            assert curve[-1] == pytest.approx(alone.get_current_market_value())
+            assert {p.symbol for p in strategy.wallet.positions} == {strategy.symbol}
+        assert strategies[1].get_current_value() > 0
+
+    def test_symbol_required(self, two_symbols_df):
+        a, b = two_symbols_df
+        portfolio = PortfolioMarket({"A": ColumnarMarket(a), "B": ColumnarMarket(b)})
+        with pytest.raises(AssertionError):
+            SellWeeklyPuts(portfolio)
+        next(portfolio)
+        position = portfolio.sell_to_open(100, 7, symbol="A")
+        position.symbol = None
+        with pytest.raises(AssertionError):
+            portfolio.value_positions([position])
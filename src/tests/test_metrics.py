@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.metrics import (
+    cagr,
+    drawdowns,
+    max_drawdown,
+    max_drawdown_duration,
+    returns,
+    rolling_returns,
+    rolling_volatility,
+    sharpe_ratio,
+    sortino_ratio,
+    summary,
+    volatility,
+)
+
+
+@pytest.fixture
+def curves():
+    return np.array(
+        [
+            [100.0, 110.0, 99.0, 105.0, 120.0, 108.0],
+            [100.0, 100.0, 100.0, 100.0, 100.0, 100.0],
+        ]
+    )
+
+
+def test_returns(curves):
+    np.testing.assert_allclose(returns(curves)[0, :2], [0.1, -0.1])
+    assert (returns(curves)[1] == 0).all()
+    # No returns from nothing
+    assert np.isnan(returns([0.0, 1.0, 2.0])[0])
+
+
+def test_cagr():
+    dates = pd.to_datetime(["2020-01-01", "2022-01-01"])
+    assert cagr([100.0, 121.0], dates) == pytest.approx(1.21 ** (365.25 / 731) - 1)
+    assert np.isnan(cagr([0.0, 121.0], dates))
+
+
+def test_drawdowns(curves):
+    np.testing.assert_allclose(drawdowns(curves)[0], [0, 0, 0.1, 1 - 105 / 110, 0, 0.1])
+    np.testing.assert_allclose(max_drawdown(curves), [0.1, 0])
+    assert max_drawdown_duration(curves).tolist() == [2, 0]
+    assert max_drawdown_duration([3.0, 2.0, 1.0, 2.0]) == 3
+
+
+def test_volatility_and_ratios(curves):
+    daily = returns(curves[0])
+    expected = daily.std(ddof=1) * np.sqrt(252)
+    assert volatility(curves)[0] == pytest.approx(expected)
+    assert sharpe_ratio(curves)[0] == pytest.approx(daily.mean() * 252 / expected)
+    downside = np.sqrt((np.minimum(daily, 0) ** 2).mean())
+    assert sortino_ratio(curves)[0] == pytest.approx(
+        daily.mean() / downside * np.sqrt(252)
+    )
+    # Flat curves
+    assert volatility(curves)[1] == 0
+    assert np.isnan(sharpe_ratio(curves)[1])
+
+
+def test_rolling(curves):
+    rolled = rolling_returns(curves, 2)
+    assert np.isnan(rolled[:, :2]).all()
+    np.testing.assert_allclose(
+        rolled[0, 2:], [-0.01, 105 / 110 - 1, 120 / 99 - 1, 108 / 105 - 1]
+    )
+
+    rolled = rolling_volatility(curves, 3)
+    assert np.isnan(rolled[:, :3]).all()
+    assert rolled[0, 3] == pytest.approx(
+        returns(curves[0])[:3].std(ddof=1) * np.sqrt(252)
+    )
+    assert (rolled[1, 3:] == 0).all()
+
+
+def test_summary(curves):
+    dates = pd.bdate_range("2020-01-01", periods=6)
+    result = summary(curves, dates, names=["a", "b"])
+    assert list(result.index) == ["a", "b"]
+    assert result.loc["a", "final_value"] == 108
+    assert result.loc["a", "max_drawdown"] == pytest.approx(0.1)
+    assert result.loc["b", "cagr"] == 0
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from src.markets import ColumnarMarket
+from src.metrics import max_drawdown
+from src.optimize import successive_halving, walk_forward
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts
+from src.sweep import expand_grid, run_strategies
+
+GRID = {"ideal_strike": [0.9, 1.0, 1.1], "hold_the_strike": [False, True]}
+# The DTE too, e.g. weekly puts written a few weeks out
+DTE_GRID = {**GRID, "ideal_dte": [None, 14]}
+
+
+def test_seek(quotes_df):
+    market = ColumnarMarket(quotes_df)
+    market.advance()
+    market.seek(10)
+    date, price, quotes = next(market)
+    assert date == market.dates[10]
+    assert price == market.underlying[10]
+    assert len(quotes["[STRIKE]"]) > 0
+
+
+def test_successive_halving(quotes_df):
+    combinations = expand_grid([SellWeeklyPuts], DTE_GRID)
+    market = ColumnarMarket(quotes_df)
+    results = successive_halving(
+        market, combinations, 5, 25, capital=100, min_days=5, eta=2
+    )
+    assert list(results.columns) == [
+        "strategy",
+        "ideal_strike",
+        "hold_the_strike",
+        "ideal_dte",
+        "days",
+        "score",
+    ]
+    # 12 candidates for 5 days, the best 6 for 10, the best 3 for 20
+    assert sorted(results["days"]) == [5] * 6 + [10] * 3 + [20] * 3
+
+    # The finalists did just as if they were run alone over the window
+    window = quotes_df[quotes_df["[QUOTE_DATE]"].isin(market.dates[5:25])]
+    for i in np.flatnonzero(results["days"] == 20):
+        ((final_value, _, _),) = run_strategies(
+            ColumnarMarket(window), [combinations[i]], capital=100
+        )
+        assert results["score"][i] == approx(final_value - 100)
+
+
+def test_successive_halving_daily_curves(quotes_df):
+    # Scored on the curves of every day, not just the final values
+    def score(curves):
+        return -max_drawdown(curves)
+
+    combinations = expand_grid([SellWeeklyPuts], GRID)
+    market = ColumnarMarket(quotes_df)
+    results = successive_halving(
+        market, combinations, 5, 25, capital=100, min_days=5, score=score
+    )
+    window = quotes_df[quotes_df["[QUOTE_DATE]"].isin(market.dates[5:25])]
+    for i in np.flatnonzero(results["days"] == 20):
+        ((_, curve, _),) = run_strategies(
+            ColumnarMarket(window), [combinations[i]], capital=100
+        )
+        assert results["score"][i] == approx(score(np.append(100, curve)))
+
+
+def test_walk_forward(quotes_df):
+    results = walk_forward(
+        quotes_df,
+        [SellWeeklyPuts, SellMonthlyPuts],
+        DTE_GRID,
+        train_days=10,
+        test_days=5,
+        capital=100,
+        min_days=2,
+    )
+    assert len(results) == 4
+    dates = pd.DatetimeIndex(sorted(quotes_df["[QUOTE_DATE]"].unique()))
+    assert list(results["test_start"]) == list(dates[[10, 15, 20, 25]])
+    assert all(len(curve) == 5 for curve in results["test_curve"])
+    assert (results["days_run"] < results["grid_days"]).all()
+
+    parallel = walk_forward(
+        quotes_df,
+        [SellWeeklyPuts, SellMonthlyPuts],
+        DTE_GRID,
+        train_days=10,
+        test_days=5,
+        capital=100,
+        min_days=2,
+        max_workers=2,
+    )
+    pd.testing.assert_frame_equal(
+        results.drop(columns="test_curve"), parallel.drop(columns="test_curve")
+    )
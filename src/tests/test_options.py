@@ -0,0 +1,52 @@
+import pickle
+
+import pandas as pd
+import pytest
+
+from src.options import Call, Put, to_day
+
+
+class TestPut:
+    def test_interned(self):
+        put = Put(100, pd.to_datetime("2020-01-10"))
+        assert Put(100.0, pd.to_datetime("2020-01-10")) is put
+        assert Put(101, pd.to_datetime("2020-01-10")) is not put
+        assert pickle.loads(pickle.dumps(put)) is put
+
+    def test_immutable(self):
+        put = Put(100, pd.to_datetime("2020-01-10"))
+        with pytest.raises(AttributeError):
+            put.strike = 90
+        with pytest.raises(AttributeError):
+            put.anything = 1
+
+    def test_expiry(self):
+        put = Put(100, pd.to_datetime("2020-01-10"))
+        assert put.expiry == to_day("2020-01-10") == 18271
+        assert put.expiration == pd.to_datetime("2020-01-10")
+
+    def test_semantics(self):
+        put = Put(100, pd.to_datetime("2020-01-10"))
+        assert put.is_itm(99)
+        assert not put.is_itm(100)
+        assert put.intrinsic_value(97.5) == 2.5
+        assert put.intrinsic_value(101) == 0
+        assert put.is_expiring(pd.to_datetime("2020-01-10"))
+        assert not put.is_expired(pd.to_datetime("2020-01-10"))
+        assert put.is_expired(pd.to_datetime("2020-01-11"))
+
+
+class TestCall:
+    def test_semantics(self):
+        call = Call(100, pd.to_datetime("2020-01-10"))
+        assert call.direction == 1
+        assert call.is_itm(101)
+        assert not call.is_itm(100)
+        assert call.intrinsic_value(102.5) == 2.5
+        assert call.intrinsic_value(99) == 0
+
+    def test_interned_apart_from_puts(self):
+        call = Call(100, pd.to_datetime("2020-01-10"))
+        assert Call(100, pd.to_datetime("2020-01-10")) is call
+        assert Put(100, pd.to_datetime("2020-01-10")) is not call
+        assert pickle.loads(pickle.dumps(call)) is call
@@ -0,0 +1,35 @@
+from src.options import Call, Put
+from src.orders import Leg, Order
+
+
+def _legs(order):
+    return [(leg.OptionClass, leg.ideal_strike, leg.quantity) for leg in order.legs]
+
+
+def test_put_spread():
+    order = Order.put_spread(100, 95, ideal_dte=7)
+    assert order.ideal_dte == 7
+    assert _legs(order) == [(Put, 100, -1), (Put, 95, 1)]
+
+
+def test_strangle():
+    assert _legs(Order.strangle(90, 110, 30)) == [(Put, 90, -1), (Call, 110, -1)]
+
+
+def test_iron_condor():
+    order = Order.iron_condor(85, 90, 110, 115, 30, quantity=2)
+    assert _legs(order) == [
+        (Put, 90, -2),
+        (Put, 85, 2),
+        (Call, 110, -2),
+        (Call, 115, 2),
+    ]
+
+
+def test_synthetic_long():
+    assert _legs(Order.synthetic_long(100, 30)) == [(Call, 100, 1), (Put, 100, -1)]
+
+
+def test_custom():
+    order = Order([Leg(Call, 105, 1)], ideal_dte=14)
+    assert repr(order) == "Order([Leg(Call, 105, 1)], 14)"
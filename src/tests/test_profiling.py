@@ -0,0 +1,67 @@
+import json
+
+import numpy as np
+
+from src.markets import HistoricalMarket
+from src.profiling import Profiler
+from src.strategies import SellWeeklyPuts
+from src.sweep import run_sweep
+
+
+def test_profiler(quotes_df, tmp_path):
+    market = HistoricalMarket(quotes_df=quotes_df)
+    strategies = [SellWeeklyPuts(market, ideal_strike=k) for k in [0.9, 1.0]]
+    profiler = Profiler(trace=True)
+    profiler.instrument_market(market)
+    for strategy in strategies:
+        profiler.instrument_strategy(strategy)
+
+    for _ in profiler.iterate(market):
+        for strategy in strategies:
+            strategy.run()
+    profiler.detach()
+
+    summary = profiler.summary()
+    assert profiler.days == len(market) == 30
+    assert summary.loc["Strategy.run", "calls"] == 60
+    assert summary.loc["HistoricalMarket.__next__", "calls"] == 30
+    assert summary.loc["HistoricalMarket.sell_to_open", "calls"] > 0
+    assert summary.loc["Wallet.get_open_positions", "calls"] > 0
+    assert (summary["share"] <= 1).all()
+    assert profiler.strategy_summary()["share"].sum() == 1
+    assert profiler.days_per_second > 0
+
+    # Nothing is left behind
+    assert "run" not in vars(strategies[0])
+    assert "sell_to_open" not in vars(market)
+
+    profiler.save_json(tmp_path / "profile.json")
+    assert json.loads((tmp_path / "profile.json").read_text())["days"] == 30
+    profiler.save_trace(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert len(events) == summary["calls"].sum()
+
+
+def test_run_sweep(quotes_df):
+    grid = {"ideal_strike": [0.9, 1.0, 1.1]}
+    expected = run_sweep(quotes_df, [SellWeeklyPuts], grid, max_workers=1)
+    runs = set()
+    for max_workers in [1, 2]:
+        profiler = Profiler()
+        results = run_sweep(
+            quotes_df,
+            [SellWeeklyPuts],
+            grid,
+            max_workers=max_workers,
+            chunksize=1,
+            profiler=profiler,
+        )
+        # The same results
+        np.testing.assert_array_equal(
+            np.stack(results["equity_curve"]), np.stack(expected["equity_curve"])
+        )
+        assert len(profiler.strategies) == 3
+        runs.add(profiler.summary().loc["Strategy.run", "calls"])
+    # Only on the days the strategies act (see Scheduler), however they're run
+    assert len(runs) == 1
+    assert runs.pop() < 3 * 30
@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+
+from src.accounts import AccountTerms
+from src.markets import ColumnarMarket, HistoricalMarket
+from src.scheduler import Scheduler, Wakeup
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts, Strategy
+
+
+class Watcher(Strategy):
+    """Does nothing, just wakes up as told."""
+
+    def __init__(self, market, wakeup):
+        super().__init__(market)
+        self.wakeup = wakeup
+        self.dates = []
+
+    def run(self):
+        self.dates.append(self.market.current_date)
+
+    def handle_no_open_positions(self):
+        pass
+
+    def next_wakeup(self):
+        return self.wakeup(self.market.current_date)
+
+
+def test_wakeup():
+    assert Wakeup.weekday("2020-01-06", 0).date == pd.Timestamp("2020-01-13")
+    assert Wakeup.weekday("2020-01-08", 0).date == pd.Timestamp("2020-01-13")
+    assert Wakeup.before_expiration("2020-01-31", 7).date == pd.Timestamp("2020-01-24")
+
+
+@pytest.mark.parametrize("MarketClass", [HistoricalMarket, ColumnarMarket])
+def test_same_as_every_day(quotes_df, MarketClass):
+    def strategies(market):
+        return [
+            StrategyClass(market, ideal_strike=k, hold_the_strike=h)
+            for StrategyClass in (SellWeeklyPuts, SellMonthlyPuts)
+            for k in (0.9, 1.0, 1.1)
+            for h in (False, True)
+        ]
+
+    market = MarketClass(quotes_df)
+    every_day = strategies(market)
+    for _ in market:
+        for strategy in every_day:
+            strategy.run()
+
+    market = MarketClass(quotes_df)
+    scheduled = strategies(market)
+    scheduler = Scheduler(market, scheduled)
+    scheduler.run()
+
+    for expected, strategy in zip(every_day, scheduled):
+        assert strategy.wallet.cash == expected.wallet.cash
+        pd.testing.assert_frame_equal(
+            strategy.wallet.to_frame(), expected.wallet.to_frame()
+        )
+    assert scheduler.runs < len(scheduled) * len(market) / 2
+
+
+def test_calendar_and_price(quotes_df):
+    market = ColumnarMarket(quotes_df)
+    mondays = Watcher(market, lambda date: Wakeup.weekday(date, 0))
+    lows = Watcher(market, lambda date: Wakeup(below=96))
+    every_day = Watcher(market, lambda date: None)
+    days = list(Scheduler(market, [mondays, lows, every_day]))
+
+    assert len(days) == len(market)
+    assert len(every_day.dates) == len(market)
+    # The first day, then every Monday
+    assert mondays.dates[0] == market.dates[0]
+    assert all(date.weekday() == 0 for date in mondays.dates[1:])
+    assert len(mondays.dates) == 6
+    # The first day, then whenever the underlying is at or below 96
+    assert lows.dates[1:] == [
+        pd.Timestamp(date)
+        for date, price in zip(market.dates, market.underlying)
+        if price <= 96
+    ]
+
+
+def test_no_quotes_on_idle_days(quotes_df):
+    market = ColumnarMarket(quotes_df)
+    watcher = Watcher(market, lambda date: Wakeup(date=date + pd.Timedelta(days=30)))
+    for _, due in Scheduler(market, [watcher]):
+        # Not even sliced, unless used
+        assert market._current_columns is None
+    assert len(watcher.dates) == 2
+
+
+def test_interest_accrued_lazily(quotes_df):
+    terms = AccountTerms(cash_rate=0.05, margin_rate=0.1, commission=0.01)
+    market = ColumnarMarket(quotes_df)
+    every_day = SellWeeklyPuts(market, capital=100, terms=terms)
+    for _ in market:
+        every_day.run()
+
+    market = ColumnarMarket(quotes_df)
+    scheduled = SellWeeklyPuts(market, capital=100, terms=terms)
+    scheduler = Scheduler(market, [scheduled])
+    scheduler.run()
+
+    # The interest of the idle days is added when it runs next, or when it's valued
+    assert scheduler.runs < len(market) / 2
+    assert scheduled.get_current_market_value() == pytest.approx(
+        every_day.get_current_market_value()
+    )
+    pd.testing.assert_frame_equal(
+        scheduled.wallet.to_frame(), every_day.wallet.to_frame()
+    )
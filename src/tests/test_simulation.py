@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from src.simulation import (
+    GBM,
+    Heston,
+    JumpDiffusion,
+    put_writing_curves,
+    run_monte_carlo,
+    simulate_paths,
+    simulation_dates,
+    strategy_curve,
+)
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts
+from src.synthetic import ChainModel
+
+
+class SlowWeeklyPuts(SellWeeklyPuts):
+    # Not in IDEAL_DTE, so it's run path by path
+    pass
+
+
+@pytest.mark.parametrize("model", [GBM(), JumpDiffusion(), Heston()])
+def test_simulate_paths(model):
+    dates = simulation_dates(1)
+    assert len(dates) == 261
+    prices, vols = simulate_paths(model, dates, 4, s0=50, seed=1)
+    assert prices.shape == vols.shape == (4, 261)
+    assert (prices[:, 0] == 50).all()
+    assert (prices > 0).all() and (vols >= 0).all()
+    # Each path has its own stream, whatever the chunks
+    chunk, _ = simulate_paths(model, dates, 2, s0=50, seed=1, start=2)
+    np.testing.assert_array_equal(chunk, prices[2:])
+    other, _ = simulate_paths(model, dates, 4, s0=50, seed=2)
+    assert not np.array_equal(other, prices)
+
+
+def test_heston_correlation():
+    prices, vols = simulate_paths(Heston(rho=-0.9), simulation_dates(2), 200, seed=0)
+    returns = np.diff(np.log(prices), axis=1).ravel()
+    assert np.corrcoef(returns, np.diff(vols, axis=1).ravel())[0, 1] < -0.5
+
+
+def test_jumps():
+    model = JumpDiffusion(sigma=0.01, jump_rate=5, jump_mean=-0.2, jump_std=0.01)
+    prices, _ = simulate_paths(model, simulation_dates(1), 100, seed=0)
+    returns = np.diff(np.log(prices), axis=1)
+    # About 5 jumps a year
+    assert 3 < (returns < -0.1).sum(axis=1).mean() < 7
+
+
+@pytest.mark.parametrize("StrategyClass", [SellWeeklyPuts, SellMonthlyPuts])
+@pytest.mark.parametrize("hold_the_strike", [False, True])
+def test_put_writing_curves(StrategyClass, hold_the_strike):
+    # The same as running the strategy on a LazyMarket of each path
+    dates = simulation_dates(0.5)
+    prices, vols = simulate_paths(Heston(), dates, 3, seed=0)
+    params = dict(ideal_strike=0.95, hold_the_strike=hold_the_strike)
+    curves = put_writing_curves(
+        StrategyClass, ChainModel(), dates, prices, vols, 100, **params
+    )
+    for path in range(3):
+        curve = strategy_curve(
+            StrategyClass, dates, prices[path], vols[path], 100, {}, params
+        )
+        np.testing.assert_array_equal(curves[path], curve)
+
+
+def test_put_writing_curves_unsupported():
+    dates = simulation_dates(0.1)
+    prices, vols = simulate_paths(GBM(), dates, 1, seed=0)
+    with pytest.raises(TypeError):
+        put_writing_curves(SlowWeeklyPuts, ChainModel(), dates, prices, vols)
+
+
+def test_run_monte_carlo():
+    kwargs = dict(model=GBM(), n_paths=6, years=0.5, seed=3, ideal_strike=0.9)
+    results = run_monte_carlo(SellWeeklyPuts, max_workers=1, **kwargs)
+    assert list(results.columns) == ["final_value", "total_return", "max_drawdown"]
+    assert len(results) == 6
+    assert (results["max_drawdown"] >= 0).all()
+    np.testing.assert_allclose(
+        results["total_return"], results["final_value"] / 100 - 1
+    )
+
+    # Whatever the chunks and processes, or the way the strategy is run
+    pooled = run_monte_carlo(SellWeeklyPuts, max_workers=2, chunk_paths=4, **kwargs)
+    np.testing.assert_array_equal(pooled.to_numpy(), results.to_numpy())
+    slow = run_monte_carlo(SlowWeeklyPuts, max_workers=1, chunk_paths=4, **kwargs)
+    np.testing.assert_array_equal(slow.to_numpy(), results.to_numpy())
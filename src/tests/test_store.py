@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import store
+from src.store import ResultStore, fingerprint_arrays, fingerprint_code
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts
+
+
+class OtherWeeklyPuts(SellWeeklyPuts):
+    def _get_ideal_dte(self):
+        return 14
+
+
+def test_fingerprint_arrays():
+    arrays = {"a": np.arange(3), "b": np.array([1.0, 2.0])}
+    fingerprint = fingerprint_arrays(arrays)
+    assert fingerprint == fingerprint_arrays(dict(reversed(arrays.items())))
+    assert fingerprint != fingerprint_arrays({**arrays, "b": np.array([1.0, 2.5])})
+    assert fingerprint != fingerprint_arrays({**arrays, "a": np.arange(3.0)})
+
+
+def test_fingerprint_code():
+    assert fingerprint_code(SellWeeklyPuts) == fingerprint_code(SellWeeklyPuts)
+    assert fingerprint_code(SellWeeklyPuts) != fingerprint_code(SellMonthlyPuts)
+    assert fingerprint_code(SellWeeklyPuts) != fingerprint_code(OtherWeeklyPuts)
+
+
+def test_fingerprint_engine(monkeypatch):
+    fingerprint = fingerprint_code(SellWeeklyPuts)
+    # Any change to the engine, e.g. the markets, changes it too
+    monkeypatch.setattr(store, "ENGINE_MODULES", ("src.markets",))
+    store.fingerprint_engine.cache_clear()
+    try:
+        assert fingerprint_code(SellWeeklyPuts) != fingerprint
+    finally:
+        store.fingerprint_engine.cache_clear()
+
+
+def test_key(tmp_path):
+    store = ResultStore(tmp_path)
+    key = store.key(SellWeeklyPuts, {"ideal_strike": 0.9}, 0, "data")
+    assert key == store.key(SellWeeklyPuts, {"ideal_strike": 0.9}, 0, "data")
+    assert key != store.key(SellWeeklyPuts, {"ideal_strike": 1.0}, 0, "data")
+    assert key != store.key(SellWeeklyPuts, {"ideal_strike": 0.9}, 100, "data")
+    assert key != store.key(SellWeeklyPuts, {"ideal_strike": 0.9}, 0, "other")
+    assert key != store.key(SellMonthlyPuts, {"ideal_strike": 0.9}, 0, "data")
+    assert key != store.key(
+        SellWeeklyPuts, {"ideal_strike": 0.9}, 0, "data", surface_fallback=True
+    )
+
+
+def test_save_and_load(tmp_path):
+    store = ResultStore(tmp_path)
+    assert store.runs().empty
+    curve = pd.Series([1.0, 2.0, 3.0], index=pd.bdate_range("2020-01-01", periods=3))
+    trades = pd.DataFrame({"strike": [100.0], "cost": [1.5]})
+    assert not store.has(SellWeeklyPuts, "abc")
+    with pytest.raises(KeyError):
+        store.load_curve(SellWeeklyPuts, "abc")
+
+    store.save(SellWeeklyPuts, "abc", {"ideal_strike": 0.9}, 0, curve, trades)
+    store.save(SellMonthlyPuts, "def", {"ideal_strike": 1.0}, 10, curve * 2)
+    assert store.has(SellWeeklyPuts, "abc")
+    assert not store.has(SellMonthlyPuts, "abc")
+    pd.testing.assert_series_equal(
+        store.load_curve(SellWeeklyPuts, "abc"),
+        curve.rename("market_value").rename_axis("date"),
+        check_index_type=False,
+        check_freq=False,
+    )
+    pd.testing.assert_frame_equal(store.load_trades(SellWeeklyPuts, "abc"), trades)
+    assert store.load_trades(SellMonthlyPuts, "def") is None
+
+    runs = store.runs().sort_values("key")
+    assert list(runs["key"]) == ["abc", "def"]
+    assert list(runs["strategy"]) == ["SellWeeklyPuts", "SellMonthlyPuts"]
+    assert list(runs["final_value"]) == [3.0, 6.0]
+    assert list(runs["params"]) == ['{"ideal_strike": 0.9}', '{"ideal_strike": 1.0}']
@@ -1,24 +1,20 @@
+import numpy as np
 import pandas as pd
 import pytest
 from pytest import fixture
 
 from src.markets import HistoricalMarket
-from src.strategies import SellWeeklyPuts
-
-
-@fixture
-def quotes_1d_df():
-    return pd.DataFrame(
-        {
-            "[STRIKE]": [90, 100, 110],
-            "[UNDERLYING_LAST]": [99.5, 99.5, 99.5],
-            "[P_BID]": [0.1, 1.0, 10.0],
-            "[P_ASK]": [0.2, 1.1, 10.1],
-            "[QUOTE_DATE]": pd.to_datetime("2020-01-01"),
-            "[EXPIRE_DATE]": pd.to_datetime("2020-01-08"),
-            "[DTE]": 7,
-        }
-    )
+from src.options import Put
+from src.orders import Order
+from src.strategies import (
+    EquityRecorder,
+    ExitRules,
+    SellMonthlyPuts,
+    SellWeeklyPuts,
+    get_market_values,
+    record,
+)
+from src.wallet import Ledger, Position
 
 
 class TestSellWeeklyPuts:
@@ -46,3 +42,220 @@ class TestSellWeeklyPuts:
             market_value=-0.1,  # 1.0 (cash) -1.1 (market ask value of the short OOM put)
             open_positions=1,
         )
+
+    def test_market_value_of_missing_quotes(self, quotes_1d_df):
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        self.strategy = SellWeeklyPuts(market)
+        market.__next__()
+        self.strategy.wallet.add_position(
+            Position(Put(120, pd.to_datetime("2020-01-08")), quantity=-1, cost=20.0)
+        )
+        # Not quoted, so it's valued at its (negative, since it's short) intrinsic value
+        self._check_strategy(cash=20.0, value=-0.5, market_value=-0.5, open_positions=1)
+
+    def test_get_market_values(self, quotes_1d_df):
+        market = HistoricalMarket(quotes_df=quotes_1d_df)
+        strategies = [SellWeeklyPuts(market, ideal_strike=k) for k in [0.9, 1.0, 1.1]]
+        market.__next__()
+        for strategy in strategies:
+            strategy.run()
+        assert get_market_values(strategies) == [
+            strategy.get_current_market_value() for strategy in strategies
+        ]
+
+
+class TestEquityRecorder:
+    def test_append(self):
+        recorder = EquityRecorder(1)
+        recorder.append(pd.Timestamp("2020-01-01"), 1, 2, 3)
+        # Grows beyond the preallocated days
+        recorder.append(pd.Timestamp("2020-01-02"), 4, 5, 6)
+        assert len(recorder) == 2
+        assert recorder.cash.tolist() == [1, 4]
+        assert recorder.value.tolist() == [2, 5]
+        assert recorder.market_value.tolist() == [3, 6]
+        frame = recorder.to_frame()
+        assert list(frame.columns) == ["cash", "value", "market_value"]
+        assert list(frame.index) == list(pd.to_datetime(["2020-01-01", "2020-01-02"]))
+
+    def test_record(self, quotes_1d_df):
+        quotes_df = pd.concat(
+            [
+                quotes_1d_df,
+                quotes_1d_df.assign(
+                    **{"[QUOTE_DATE]": pd.Timestamp("2020-01-02"), "[DTE]": 6}
+                ),
+            ]
+        )
+        market = HistoricalMarket(quotes_df=quotes_df)
+        strategies = [SellWeeklyPuts(market), SellWeeklyPuts(market, ideal_strike=0.9)]
+        one_by_one = SellWeeklyPuts(market)
+        for date, price, quotes in market:
+            for strategy in strategies + [one_by_one]:
+                strategy.run()
+            record(strategies)
+            one_by_one.record()
+            assert strategies[0].recorder.cash[-1] == strategies[0].wallet.cash
+            assert strategies[0].recorder.value[-1] == pytest.approx(
+                strategies[0].get_current_value()
+            )
+            assert strategies[1].recorder.market_value[-1] == pytest.approx(
+                strategies[1].get_current_market_value()
+            )
+        assert len(one_by_one.recorder._dates) == 2  # preallocated
+        np.testing.assert_array_equal(
+            one_by_one.recorder._values, strategies[0].recorder._values
+        )
+
+
+@fixture
+def quotes_3d_df(quotes_1d_df):
+    # The 100 put gets cheaper on the 2nd day, then back to its price
+    day2 = quotes_1d_df.assign(
+        **{
+            "[QUOTE_DATE]": pd.Timestamp("2020-01-02"),
+            "[DTE]": 6,
+            "[P_BID]": [0.05, 0.3, 9.0],
+            "[P_ASK]": [0.1, 0.4, 9.1],
+        }
+    )
+    day3 = quotes_1d_df.assign(
+        **{"[QUOTE_DATE]": pd.Timestamp("2020-01-03"), "[DTE]": 5}
+    )
+    return pd.concat([quotes_1d_df, day2, day3], ignore_index=True)
+
+
+class TestExitRules:
+    def test_check(self):
+        expiration = pd.Timestamp("2020-01-31")
+        ledger = Ledger(
+            [
+                Position(Put(100, expiration), quantity=-1, cost=2.0),
+                Position(Put(90, expiration), quantity=-1, cost=2.0),
+                Position(Put(80, expiration), quantity=1, cost=2.0),
+                Position(Put(70, expiration), quantity=-1, cost=2.0),
+            ]
+        )
+        market_values = np.array([-0.9, -6.5, 3.0, np.nan])
+        date = pd.Timestamp("2020-01-01")
+        assert ExitRules().check(ledger, market_values, date).tolist() == [False] * 4
+        assert ExitRules(profit_target=0.5).check(
+            ledger, market_values, date
+        ).tolist() == [True, False, True, False]
+        assert ExitRules(stop_loss=2.0).check(ledger, market_values, date).tolist() == [
+            False,
+            True,
+            False,
+            False,
+        ]
+        assert ExitRules(dte=30).check(ledger, market_values, date).tolist() == [
+            True,
+            True,
+            True,
+            False,  # Not quoted
+        ]
+        assert not ExitRules(dte=29).check(ledger, market_values, date).any()
+
+
+class TestEarlyExits:
+    def _run(self, quotes_df, **params):
+        market = HistoricalMarket(quotes_df=quotes_df)
+        strategy = SellWeeklyPuts(market, **params)
+        days = []
+        for date, price, quotes in market:
+            strategy.run()
+            days.append(
+                (
+                    strategy.wallet.cash,
+                    len(strategy.wallet.get_held_positions(date)),
+                    strategy.get_current_market_value(),
+                )
+            )
+        return strategy, days
+
+    def test_profit_target(self, quotes_3d_df):
+        strategy, days = self._run(quotes_3d_df, profit_target=0.5)
+        # Sold for 1.0, bought back for 0.4, sold again for 1.0
+        assert days == [
+            (1.0, 1, pytest.approx(-0.1)),
+            (pytest.approx(0.6), 0, pytest.approx(0.6)),
+            (pytest.approx(1.6), 1, pytest.approx(0.5)),
+        ]
+        first, second = strategy.wallet.positions
+        assert first.closed_at == pd.Timestamp("2020-01-02")
+        assert first.close_value == pytest.approx(-0.4)
+        assert second.closed_at is None
+
+    def test_not_hit(self, quotes_3d_df):
+        strategy, days = self._run(quotes_3d_df, profit_target=0.7, stop_loss=1.0)
+        assert len(strategy.wallet.positions) == 1
+        assert [held for _, held, _ in days] == [1, 1, 1]
+
+    def test_exit_dte(self, quotes_3d_df):
+        strategy, days = self._run(quotes_3d_df, exit_dte=5)
+        # Closed on the 3rd day, with 5 days left
+        assert [held for _, held, _ in days] == [1, 1, 0]
+        assert strategy.wallet.positions[0].close_value == -1.1
+
+    def test_roll(self, quotes_3d_df):
+        # A week later, the puts are quoted for 0.9 more
+        later = quotes_3d_df.assign(
+            **{
+                "[EXPIRE_DATE]": pd.Timestamp("2020-01-15"),
+                "[DTE]": quotes_3d_df["[DTE]"] + 7,
+                "[P_BID]": quotes_3d_df["[P_BID]"] + 0.9,
+                "[P_ASK]": quotes_3d_df["[P_ASK]"] + 0.9,
+            }
+        )
+        quotes_df = pd.concat([quotes_3d_df, later], ignore_index=True)
+        strategy, days = self._run(quotes_df, profit_target=0.5, roll_exits=True)
+        # Bought back for 0.4, and sold for 1.2 a week later, on the same day
+        assert days[1][:2] == (pytest.approx(1.8), 1)
+        first, second = strategy.wallet.positions
+        assert first.closed_at == pd.Timestamp("2020-01-02")
+        assert second.option.expiration == pd.Timestamp("2020-01-15")
+        assert second.cost == pytest.approx(1.2)
+
+    def test_roll_past_exit_dte(self, quotes_3d_df):
+        strategy, days = self._run(quotes_3d_df, exit_dte=5, roll_exits=True)
+        # Nothing expires later, so it's just closed
+        assert [held for _, held, _ in days] == [1, 1, 0]
+        assert len(strategy.wallet.positions) == 1
+
+
+def test_orders(quotes_1d_df):
+    market = HistoricalMarket(quotes_df=quotes_1d_df)
+    strategy = SellWeeklyPuts(market)
+    next(market)
+    positions = strategy.open_order(Order.put_spread(100, 90, 7))
+    # Sold for 1.0, bought for 0.2
+    assert strategy.wallet.cash == pytest.approx(0.8)
+    assert strategy.wallet.positions == positions
+    strategy.close_positions(positions)
+    # Bought back for 1.1, sold for 0.1
+    assert strategy.wallet.cash == pytest.approx(-0.2)
+    assert strategy.wallet.get_held_positions(market.current_date) == []
+
+
+def test_ideal_delta(quotes_1d_df):
+    quotes_1d_df["[P_DELTA]"] = [-0.1, -0.5, -0.9]
+    market = HistoricalMarket(quotes_df=quotes_1d_df)
+    strategy = SellWeeklyPuts(market, ideal_delta=0.2)
+    next(market)
+    strategy.run()
+    assert strategy.wallet.positions[0].option.strike == 90
+    assert strategy.get_greeks()["DELTA"] == pytest.approx(0.1)
+
+
+@pytest.mark.parametrize("StrategyClass", [SellWeeklyPuts, SellMonthlyPuts])
+def test_ideal_dte(quotes_df, StrategyClass):
+    market = HistoricalMarket(quotes_df=quotes_df)
+    default = StrategyClass(market)
+    strategy = StrategyClass(market, ideal_dte=21)
+    next(market)
+    default.run()
+    strategy.run()
+    expiration = strategy.wallet.positions[0].option.expiration
+    # The nearest of the weekly expirations, 18 or 25 days away
+    assert (expiration - market.current_date).days == 18
+    assert default.wallet.positions[0].option.expiration != expiration
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.accounts import AccountTerms
+from src.scheduler import Wakeup
+from src.store import ResultStore
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts, Strategy
+from src import sweep
+from src.markets import ColumnarMarket
+from src.sweep import expand_grid, run_strategies, run_sweep
+
+
+def test_expand_grid():
+    combinations = expand_grid(
+        [SellWeeklyPuts, SellMonthlyPuts], {"ideal_strike": [0.9, 1.0]}
+    )
+    assert combinations == [
+        (SellWeeklyPuts, {"ideal_strike": 0.9}),
+        (SellWeeklyPuts, {"ideal_strike": 1.0}),
+        (SellMonthlyPuts, {"ideal_strike": 0.9}),
+        (SellMonthlyPuts, {"ideal_strike": 1.0}),
+    ]
+
+
+def test_run_sweep(quotes_df):
+    results = run_sweep(
+        quotes_df,
+        [SellWeeklyPuts, SellMonthlyPuts],
+        {"ideal_strike": [0.9, 1.0, 1.1], "hold_the_strike": [False, True]},
+        max_workers=1,
+    )
+    assert len(results) == 12
+    assert list(results.columns) == [
+        "strategy",
+        "ideal_strike",
+        "hold_the_strike",
+        "final_value",
+        "equity_curve",
+    ]
+    assert all(len(curve) == 30 for curve in results["equity_curve"])
+    assert (results["final_value"] == [c[-1] for c in results["equity_curve"]]).all()
+
+
+def test_run_sweep_deterministic(quotes_df):
+    args = (
+        quotes_df,
+        [SellWeeklyPuts, SellMonthlyPuts],
+        {"ideal_strike": [0.9, 1.0, 1.1], "hold_the_strike": [False, True]},
+    )
+    serial = run_sweep(*args, max_workers=1)
+    for max_workers, chunksize in [(2, None), (3, 1)]:
+        parallel = run_sweep(*args, max_workers=max_workers, chunksize=chunksize)
+        pd.testing.assert_frame_equal(
+            serial.drop(columns=["equity_curve"]),
+            parallel.drop(columns=["equity_curve"]),
+        )
+        for a, b in zip(serial["equity_curve"], parallel["equity_curve"]):
+            np.testing.assert_array_equal(a, b)
+
+
+def test_run_sweep_store(quotes_df, tmp_path, monkeypatch):
+    store = ResultStore(tmp_path)
+    args = ([SellWeeklyPuts, SellMonthlyPuts], {"ideal_strike": [0.9, 1.0]})
+    first = run_sweep(quotes_df, *args, max_workers=1, store=store)
+    assert len(store.runs()) == 4
+    trades = store.runs().query("strategy == 'SellWeeklyPuts'")
+    assert len(store.load_trades(SellWeeklyPuts, trades["key"].iloc[0])) > 1
+
+    # Only the new combinations are run
+    ran = []
+    run_strategies = sweep.run_strategies
+
+    def spy(market, combinations, capital=0, profiler=None):
+        ran.extend(combinations)
+        return run_strategies(market, combinations, capital, profiler)
+
+    monkeypatch.setattr(sweep, "run_strategies", spy)
+    args = ([SellWeeklyPuts, SellMonthlyPuts], {"ideal_strike": [0.9, 1.0, 1.1]})
+    second = run_sweep(quotes_df, *args, max_workers=1, store=store)
+    assert ran == [
+        (SellWeeklyPuts, {"ideal_strike": 1.1}),
+        (SellMonthlyPuts, {"ideal_strike": 1.1}),
+    ]
+    cached = second[second["ideal_strike"] < 1.1].reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        cached.drop(columns=["equity_curve"]), first.drop(columns=["equity_curve"])
+    )
+    for a, b in zip(cached["equity_curve"], first["equity_curve"]):
+        np.testing.assert_array_equal(a, b)
+
+    # Everything is run again when the quotes change
+    ran.clear()
+    changed = quotes_df.assign(**{"[P_BID]": quotes_df["[P_BID]"] + 0.01})
+    run_sweep(changed, *args, max_workers=1, store=store)
+    assert len(ran) == 6
+
+
+class Idle(Strategy):
+    """Never trades, just wakes up every other week."""
+
+    def handle_no_open_positions(self):
+        pass
+
+    def next_wakeup(self):
+        return Wakeup(date=self.market.current_date + pd.Timedelta(days=14))
+
+
+def test_run_strategies_idle_days(quotes_df):
+    market = ColumnarMarket(quotes_df)
+    sliced = []
+    day_columns = market._day_columns
+
+    def spy():
+        if market._current_columns is None:
+            sliced.append(market.current_date)
+        return day_columns()
+
+    market._day_columns = spy
+    ((final_value, curve, _),) = run_strategies(market, [(Idle, {})], capital=100)
+    # Nothing held, nothing to value, so the quotes are never needed
+    assert sliced == []
+    assert (curve == 100).all()
+
+
+@pytest.mark.parametrize("terms", [None, AccountTerms(cash_rate=0.05, commission=0.01)])
+def test_run_sweep_same_as_every_day(quotes_df, terms):
+    grid = {"ideal_strike": [0.9, 1.0, 1.1], "terms": [terms]}
+    results = run_sweep(
+        quotes_df, [SellWeeklyPuts, SellMonthlyPuts], grid, capital=100, max_workers=1
+    )
+    for row in results.itertuples():
+        # A plain daily loop, valuing the strategy on its own
+        market = ColumnarMarket(quotes_df)
+        StrategyClass = {c.__name__: c for c in (SellWeeklyPuts, SellMonthlyPuts)}[
+            row.strategy
+        ]
+        strategy = StrategyClass(
+            market, capital=100, ideal_strike=row.ideal_strike, terms=terms
+        )
+        curve = []
+        for _ in market:
+            strategy.run()
+            curve.append(strategy.get_current_market_value())
+        np.testing.assert_allclose(row.equity_curve, curve, rtol=1e-12)
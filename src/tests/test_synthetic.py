@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pytest import fixture
+
+from src.markets import HistoricalMarket
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts
+from src.synthetic import black_scholes, generate_chains, generate_quotes
+
+
+@fixture
+def series():
+    dates = pd.bdate_range("2020-01-06", periods=60)
+    rng = np.random.default_rng(0)
+    spy = pd.Series(300 * np.exp(np.cumsum(rng.normal(0, 0.01, 60))), index=dates)
+    vix = pd.Series(np.linspace(15, 30, 60), index=dates)
+    return spy, vix
+
+
+class TestBlackScholes:
+    def test_put_call_parity(self):
+        strikes = np.array([80.0, 100.0, 120.0])
+        puts, calls = black_scholes(100.0, strikes, 0.5, 0.2, rate=0.03)
+        np.testing.assert_allclose(calls - puts, 100 - strikes * np.exp(-0.03 * 0.5))
+
+    def test_known_value(self):
+        puts, calls = black_scholes(100.0, 100.0, 1.0, 0.2)
+        assert calls == pytest.approx(7.9656, abs=1e-4)
+        assert puts == pytest.approx(7.9656, abs=1e-4)
+
+    def test_expired(self):
+        puts, calls = black_scholes(100.0, np.array([90.0, 110.0]), 0.0, 0.2)
+        assert puts.tolist() == [0, 10]
+        assert calls.tolist() == [10, 0]
+
+
+class TestGenerateChains:
+    def test_format(self, series):
+        quotes = generate_quotes(*series, max_strike_distance_pct=0.1)
+        assert list(quotes.columns) == [
+            "[QUOTE_DATE]",
+            "[UNDERLYING_LAST]",
+            "[EXPIRE_DATE]",
+            "[DTE]",
+            "[STRIKE]",
+            "[P_BID]",
+            "[P_ASK]",
+            "[P_IV]",
+            "[C_BID]",
+            "[C_ASK]",
+            "[C_IV]",
+            "[STRIKE_DISTANCE]",
+            "[STRIKE_DISTANCE_PCT]",
+        ]
+        assert quotes["[QUOTE_DATE]"].nunique() == 60
+        assert (quotes["[STRIKE_DISTANCE_PCT]"] <= 0.1).all()
+        assert (quotes["[P_BID]"] <= quotes["[P_ASK]"]).all()
+        assert (quotes["[C_BID]"] <= quotes["[C_ASK]"]).all()
+        assert (quotes["[DTE]"] >= 0).all()
+        assert (quotes["[EXPIRE_DATE]"].dt.weekday == 4).all()
+
+    def test_chunks(self, series):
+        chunks = list(generate_chains(*series, chunk_days=25, calls=False))
+        assert [chunk["[QUOTE_DATE]"].nunique() for chunk in chunks] == [25, 25, 10]
+        assert "[C_BID]" not in chunks[0].columns
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks, ignore_index=True),
+            generate_quotes(*series, chunk_days=60, calls=False),
+        )
+
+    def test_skew(self, series):
+        quotes = generate_quotes(*series)
+        day = quotes[quotes["[QUOTE_DATE]"] == quotes["[QUOTE_DATE]"].iloc[0]]
+        otm = day[day["[STRIKE]"] < day["[UNDERLYING_LAST]"]]
+        # Further OTM puts have a higher implied volatility
+        assert otm.sort_values("[STRIKE]")["[P_IV]"].is_monotonic_decreasing
+
+    @pytest.mark.parametrize("StrategyClass", [SellWeeklyPuts, SellMonthlyPuts])
+    def test_backtest(self, series, StrategyClass):
+        market = HistoricalMarket(quotes_df=generate_quotes(*series))
+        strategy = StrategyClass(market, ideal_strike=0.95)
+        for date, price, quotes in market:
+            strategy.run()
+        assert len(strategy.wallet.positions) > 1
+        assert strategy.wallet.cash > 0
@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from benchmarks.synthetic import make_quotes
+from src.markets import ColumnarMarket, HistoricalMarket
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts, Strategy
+from src.vectorized import VectorizedBacktest
+
+
+def _run_event_driven(quotes_df, StrategyClass, **params):
+    market = HistoricalMarket(quotes_df=quotes_df)
+    strategy = StrategyClass(market, **params)
+    rows, dates = [], []
+    for date, price, quotes in market:
+        dates.append(date)
+        strategy.run()
+        rows.append(
+            {
+                "cash": strategy.wallet.cash,
+                "value": strategy.get_current_value(),
+                "market_value": strategy.get_current_market_value(),
+            }
+        )
+    curves = pd.DataFrame(rows, index=pd.DatetimeIndex(dates))
+    trades = pd.DataFrame(
+        {
+            "opened_at": [None] * len(strategy.wallet.positions),
+            "strike": [p.option.strike for p in strategy.wallet.positions],
+            "expiration": [p.option.expiration for p in strategy.wallet.positions],
+            "cost": [p.cost for p in strategy.wallet.positions],
+            "closed_at": [p.closed_at for p in strategy.wallet.positions],
+            "close_value": [p.close_value for p in strategy.wallet.positions],
+        }
+    )
+    return trades, curves
+
+
+def _assert_same(quotes_df, StrategyClass, **params):
+    trades, curves = _run_event_driven(quotes_df, StrategyClass, **params)
+    result = VectorizedBacktest(ColumnarMarket(quotes_df)).run(StrategyClass, **params)
+    assert_frame_equal(
+        result.curves,
+        curves.astype(float),
+        check_exact=True,
+        check_names=False,
+        check_index_type=False,
+    )
+    columns = ["strike", "expiration", "cost", "closed_at", "close_value"]
+    assert_frame_equal(
+        result.trades[columns],
+        trades[columns].astype(result.trades[columns].dtypes.to_dict()),
+        check_exact=True,
+    )
+    return result
+
+
+PARAMS = [
+    (StrategyClass, ideal_strike, hold_the_strike)
+    for StrategyClass in [SellWeeklyPuts, SellMonthlyPuts]
+    for ideal_strike in [0.9, 1.0, 1.1]
+    for hold_the_strike in [False, True]
+]
+
+
+class TestVectorizedBacktest:
+    @pytest.mark.parametrize("StrategyClass, ideal_strike, hold_the_strike", PARAMS)
+    def test_same_as_event_driven(
+        self, quotes_df, StrategyClass, ideal_strike, hold_the_strike
+    ):
+        result = _assert_same(
+            quotes_df,
+            StrategyClass,
+            ideal_strike=ideal_strike,
+            hold_the_strike=hold_the_strike,
+        )
+        assert len(result.trades) > 1
+
+    @pytest.mark.parametrize(
+        "StrategyClass, ideal_strike, hold_the_strike", PARAMS[1::3]
+    )
+    def test_same_as_event_driven_multi_year(
+        self, StrategyClass, ideal_strike, hold_the_strike
+    ):
+        quotes_df = make_quotes(years=3, strikes_per_expiry=20, expiries_per_day=6)
+        _assert_same(
+            quotes_df,
+            StrategyClass,
+            capital=1000,
+            ideal_strike=ideal_strike,
+            hold_the_strike=hold_the_strike,
+        )
+
+    def test_lookup(self, quotes_df):
+        backtest = VectorizedBacktest(ColumnarMarket(quotes_df))
+        rows = backtest.lookup(
+            [0, 0, 1, 29],
+            [100, 101, 85, 115],
+            pd.to_datetime(["2020-01-10", "2020-01-10", "2020-01-17", "2020-03-13"]),
+        )
+        assert rows[1] == -1
+        assert backtest._strikes[rows[[0, 2, 3]]].tolist() == [100, 85, 115]
+
+    def test_unsupported(self, quotes_df):
+        backtest = VectorizedBacktest(ColumnarMarket(quotes_df))
+        with pytest.raises(TypeError):
+            backtest.run(Strategy)
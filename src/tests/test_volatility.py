@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pytest import fixture
+
+from src.chains import QuoteChain
+from src.markets import ColumnarMarket, HistoricalMarket
+from src.options import Call, Put
+from src.synthetic import black_scholes
+from src.volatility import VolSurface, greeks, implied_vols
+from src.wallet import Position, Wallet
+
+DATE = pd.Timestamp("2020-01-02")
+
+
+@fixture
+def quotes_df():
+    # A chain priced at a flat 20% volatility, with a 0.1 bid/ask spread
+    strikes, dte = np.meshgrid(np.arange(80.0, 121.0, 5), [7, 14, 28, 56])
+    strikes, dte = strikes.ravel(), dte.ravel()
+    puts, calls = black_scholes(100.0, strikes, dte / 365, 0.2)
+    return pd.DataFrame(
+        {
+            "[QUOTE_DATE]": DATE,
+            "[UNDERLYING_LAST]": 100.0,
+            "[EXPIRE_DATE]": DATE + pd.to_timedelta(dte, "D"),
+            "[DTE]": dte.astype(float),
+            "[STRIKE]": strikes,
+            "[P_BID]": puts - 0.05,
+            "[P_ASK]": puts + 0.05,
+            "[C_BID]": calls - 0.05,
+            "[C_ASK]": calls + 0.05,
+        }
+    )
+
+
+def test_implied_vols():
+    strikes = np.array([90.0, 100.0, 110.0])
+    puts, calls = black_scholes(100.0, strikes, 0.1, np.array([0.3, 0.2, 0.15]))
+    np.testing.assert_allclose(
+        implied_vols(puts, 100.0, strikes, 0.1, -1), [0.3, 0.2, 0.15], rtol=1e-6
+    )
+    np.testing.assert_allclose(
+        implied_vols(calls, 100.0, strikes, 0.1, 1), [0.3, 0.2, 0.15], rtol=1e-6
+    )
+    # Below the intrinsic value, or expired
+    assert np.isnan(implied_vols([5.0, 1.0], 100.0, [110.0, 90.0], [0.1, 0], -1)).all()
+
+
+def test_surface(quotes_df):
+    chain = QuoteChain(quotes_df.drop(columns=["[QUOTE_DATE]", "[UNDERLYING_LAST]"]))
+    surface = VolSurface.from_chain(chain, 100.0)
+    np.testing.assert_allclose(
+        surface.vols([85, 100, 130], [0.05, 0.1, 1.0]), 0.2, atol=1e-4
+    )
+    np.testing.assert_allclose(surface.half_spreads, [0.05, 0.05])
+    bids = surface.prices(chain.strikes, chain.dte / 365, -1, "BID")
+    np.testing.assert_allclose(bids, chain.column("[P_BID]").clip(0), atol=0.01)
+
+
+@pytest.mark.parametrize("MarketClass", [HistoricalMarket, ColumnarMarket])
+def test_fallback(quotes_df, MarketClass):
+    expiration = DATE + pd.Timedelta(days=14)
+    missing = (quotes_df["[STRIKE]"] == 95) & (quotes_df["[EXPIRE_DATE]"] == expiration)
+    put, call = Put(95, expiration), Call(95, expiration)
+    expected = quotes_df[missing].iloc[0]
+
+    market = MarketClass(quotes_df[~missing])
+    next(market)
+    with pytest.raises(IndexError):
+        market.buy(put)
+    assert np.isnan(market.value_positions([Position(put, -1, 1.0)])[0]).all()
+
+    market = MarketClass(quotes_df[~missing], surface_fallback=True)
+    next(market)
+    assert market.buy(put) == pytest.approx(expected["[P_ASK]"], abs=0.01)
+    assert market.sell(call) == pytest.approx(expected["[C_BID]"], abs=0.01)
+    market_values, _ = market.value_positions(
+        [
+            Position(put, -1, 1.0),
+            Position(call, 2, 1.0),
+            Position(Put(100, expiration), -1, 1.0),
+        ]
+    )
+    np.testing.assert_allclose(
+        market_values,
+        [
+            -expected["[P_ASK]"],
+            2 * expected["[C_BID]"],
+            -quotes_df[
+                (quotes_df["[STRIKE]"] == 100)
+                & (quotes_df["[EXPIRE_DATE]"] == expiration)
+            ]["[P_ASK]"].iloc[0],
+        ],
+        atol=0.02,
+    )
+    # Fitted only once a day
+    assert market.surface is market.surface
+
+
+def test_greeks():
+    strikes, directions = np.array([90.0, 100.0, 110.0]), np.array([-1, 1, -1])
+    result = greeks(100.0, strikes, 0.1, 0.2, directions)
+
+    def price(underlying=100.0, years=0.1, vols=0.2):
+        puts, calls = black_scholes(underlying, strikes, years, vols)
+        return np.where(directions > 0, calls, puts)
+
+    # Same as the finite differences (theta per day, vega per volatility point)
+    h = 1e-3
+    np.testing.assert_allclose(
+        result["DELTA"], (price(100 + h) - price(100 - h)) / (2 * h), rtol=1e-5
+    )
+    np.testing.assert_allclose(
+        result["GAMMA"],
+        (price(100 + h) - 2 * price() + price(100 - h)) / h**2,
+        rtol=1e-3,
+    )
+    np.testing.assert_allclose(
+        result["THETA"], (price(years=0.1 - 1 / 365) - price()), rtol=0.03
+    )
+    np.testing.assert_allclose(
+        result["VEGA"],
+        (price(vols=0.2 + h) - price(vols=0.2 - h)) / (2 * h) / 100,
+        rtol=1e-5,
+    )
+    # Expired
+    expired = greeks(100.0, strikes, 0, 0.2, directions)
+    assert expired["DELTA"].tolist() == [0, 0, -1]
+    assert expired["GAMMA"].tolist() == [0, 0, 0]
+
+
+class TestMarketGreeks:
+    def test_computed(self, quotes_df):
+        market = HistoricalMarket(quotes_df)
+        next(market)
+        chain = market.chain
+        expected = greeks(100.0, chain.strikes, chain.dte / 365, 0.2, -1)
+        result = market.chain_greeks(-1)
+        # The implied volatilities of the mid prices
+        np.testing.assert_allclose(result["IV"], 0.2, atol=1e-4)
+        np.testing.assert_allclose(result["DELTA"], expected["DELTA"], atol=1e-4)
+        assert market.chain_greeks(-1) is result
+
+    def test_quoted(self, quotes_df):
+        quotes_df["[P_DELTA]"] = -0.5
+        quotes_df.loc[0, "[P_DELTA]"] = np.nan
+        market = HistoricalMarket(quotes_df)
+        next(market)
+        deltas = market.chain_greeks(-1)["DELTA"]
+        # The missing ones are computed
+        assert (deltas == -0.5).sum() == len(deltas) - 1
+        chain = market.chain
+        row = np.flatnonzero(deltas != -0.5)[0]
+        assert deltas[row] == pytest.approx(
+            greeks(100.0, chain.strikes[row], chain.dte[row] / 365, 0.2, -1)["DELTA"],
+            abs=1e-4,
+        )
+
+    def test_strike_for_delta(self, quotes_df):
+        market = ColumnarMarket(quotes_df)
+        next(market)
+        strike = market.strike_for_delta(Put, -0.16, 28)
+        chain = market.chain
+        rows = chain.expirations == np.datetime64(DATE + pd.Timedelta(days=28))
+        deltas = market.chain_greeks(-1)["DELTA"][rows]
+        assert strike == chain.strikes[rows][np.abs(deltas + 0.16).argmin()]
+        assert market.strike_for_delta(Call, 0.5, 28) == 100
+
+    def test_wallet(self, quotes_df):
+        expiration = DATE + pd.Timedelta(days=28)
+        missing = (quotes_df["[STRIKE]"] == 90) & (
+            quotes_df["[EXPIRE_DATE]"] == expiration
+        )
+        market = HistoricalMarket(quotes_df[~missing])
+        next(market)
+        wallet = Wallet()
+        wallet.add_position(Position(Put(95, expiration), -2, 1.0))
+        wallet.add_position(Position(Put(90, expiration), 1, 1.0))
+        result = wallet.get_greeks(market)
+        # The missing one from the surface
+        expected = greeks(100.0, [95, 90], 28 / 365, 0.2, -1)
+        for greek in ("DELTA", "GAMMA", "THETA", "VEGA"):
+            assert result[greek] == pytest.approx(expected[greek] @ [-2, 1], rel=1e-3)
+        assert Wallet().get_greeks(market) == dict.fromkeys(
+            ("DELTA", "GAMMA", "THETA", "VEGA"), 0
+        )
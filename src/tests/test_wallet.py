@@ -1,4 +1,13 @@
-from src.wallet import Wallet
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.options import Put
+from src.wallet import Ledger, Position, Wallet
+
+
+def _position(expiration, strike=100):
+    return Position(Put(strike, pd.to_datetime(expiration)), quantity=-1, cost=1.0)
 
 
 class TestWallet:
@@ -6,3 +15,121 @@ class TestWallet:
         wallet = Wallet(0)
         assert wallet.cash == 0
         assert wallet.positions == []
+
+    def test_add_position(self):
+        wallet = Wallet(10)
+        wallet.add_position(_position("2020-01-10"))
+        assert wallet.cash == 11
+        wallet.add_position(_position("2020-01-10"), update_cash=False)
+        assert wallet.cash == 11
+        assert len(wallet.positions) == 2
+
+    def test_queries(self):
+        wallet = Wallet(0)
+        first = _position("2020-01-17")
+        second = _position("2020-01-10")
+        third = _position("2020-01-17", strike=90)
+        for position in [first, second, third]:
+            wallet.add_position(position)
+
+        date = pd.to_datetime("2020-01-10")
+        assert wallet.get_open_positions(date) == [first, second, third]
+        assert wallet.get_expiring_positions(date) == [second]
+        assert wallet.get_expired_positions(date) == []
+
+        date = pd.to_datetime("2020-01-13")
+        assert wallet.get_open_positions(date) == [first, third]
+        assert wallet.get_expiring_positions(date) == []
+        assert wallet.get_expired_positions(date) == [second]
+
+        date = pd.to_datetime("2020-01-20")
+        assert wallet.get_open_positions(date) == []
+        assert wallet.get_expired_positions(date) == [first, second, third]
+        assert wallet.positions == [first, second, third]
+
+    def test_add_expired_position(self):
+        wallet = Wallet(0)
+        assert wallet.get_open_positions(pd.to_datetime("2020-01-13")) == []
+        position = _position("2020-01-10")
+        wallet.add_position(position)
+        assert wallet.get_open_positions(pd.to_datetime("2020-01-13")) == []
+        assert wallet.get_expired_positions(pd.to_datetime("2020-01-13")) == [position]
+
+    def test_closed_early(self):
+        wallet = Wallet(0)
+        closed, held = _position("2020-01-17"), _position("2020-01-17", strike=90)
+        wallet.add_position(closed)
+        wallet.add_position(held)
+        closed.close(pd.to_datetime("2020-01-10"), -0.5)
+
+        # Still open until the end of the day it was closed on, but not held
+        date = pd.to_datetime("2020-01-10")
+        assert wallet.get_open_positions(date) == [closed, held]
+        assert wallet.get_held_positions(date) == [held]
+        assert len(wallet.get_ledger(date)) == 1
+
+        date = pd.to_datetime("2020-01-17")
+        assert wallet.get_open_positions(date) == [held]
+        assert wallet.get_expiring_positions(date) == [held]
+
+    def test_going_back_in_time(self):
+        wallet = Wallet(0)
+        position = _position("2020-01-10")
+        wallet.add_position(position)
+        assert wallet.get_open_positions(pd.to_datetime("2020-01-13")) == []
+        # Not what the strategies do, but still works (just slower)
+        assert wallet.get_open_positions(pd.to_datetime("2020-01-09")) == [position]
+        assert wallet.get_expiring_positions(pd.to_datetime("2020-01-10")) == [position]
+
+
+class TestLedger:
+    def test_arrays(self):
+        positions = [_position("2020-01-10", 100), _position("2020-01-17", 90)]
+        ledger = Ledger(positions)
+        assert len(ledger) == 2
+        assert ledger.strikes.tolist() == [100, 90]
+        assert ledger.quantities.tolist() == [-1, -1]
+        assert ledger.is_itm(95).tolist() == [True, False]
+        assert ledger.intrinsic_values(95).tolist() == [
+            p.option.intrinsic_value(95) for p in positions
+        ]
+        date = pd.to_datetime("2020-01-10")
+        assert ledger.is_expiring(date).tolist() == [True, False]
+        assert ledger.is_expired(date + pd.Timedelta(days=1)).tolist() == [True, False]
+
+    def test_close(self):
+        positions = [_position("2020-01-10", 100), _position("2020-01-17", 90)]
+        ledger = Ledger(positions)
+        assert np.isnan(ledger.close_values).all()
+        date = pd.to_datetime("2020-01-10")
+        ledger.close(date, [-5.0, -0.5])
+        assert [p.close_value for p in positions] == [-5.0, -0.5]
+        assert [p.closed_at for p in positions] == [date, date]
+
+    def test_wallet_ledger(self):
+        wallet = Wallet(0)
+        wallet.add_position(_position("2020-01-10", 100))
+        wallet.add_position(_position("2020-01-17", 90))
+        assert len(wallet.get_ledger()) == 2
+        assert wallet.get_ledger(pd.to_datetime("2020-01-13")).strikes.tolist() == [90]
+
+
+def test_accrue_interest():
+    wallet = Wallet(365)
+    assert wallet.accrue_interest(pd.Timestamp("2020-01-01"), 0.1) == 0
+    assert wallet.accrue_interest(pd.Timestamp("2020-01-03"), 0.1) == pytest.approx(
+        365 * ((1 + 0.1 / 365) ** 2 - 1)
+    )
+    # The same, however often it's called
+    other = Wallet(365)
+    for day in range(1, 4):
+        other.accrue_interest(pd.Timestamp(f"2020-01-0{day}"), 0.1)
+    assert other.cash == pytest.approx(
+        wallet.cash + wallet.accrue_interest(pd.Timestamp("2020-01-03"), 0.1)
+    )
+    wallet.cash = -365
+    # Only the margin rate applies to a negative balance
+    assert wallet.accrue_interest(
+        pd.Timestamp("2020-01-04"), 0.1, 0.2
+    ) == pytest.approx(-0.2)
+    assert wallet.cash == pytest.approx(-365.2)
@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+
+from src.chains import QuoteChain
+from src.strategies import SellMonthlyPuts, SellWeeklyPuts
+
+
+def _weekly_dte(dates):
+    # Same as SellWeeklyPuts._get_ideal_dte, for all dates at once
+    ideal_dte = 5 - dates.weekday.to_numpy()
+    ideal_dte[ideal_dte == 0] = 7
+    return ideal_dte
+
+
+def _monthly_dte(dates):
+    # Same as SellMonthlyPuts._get_ideal_dte
+    return np.full(len(dates), 30)
+
+
+# The strategies supported by VectorizedBacktest, and their ideal dte rules.
+# Only these exact classes, because subclasses might change the rules.
+IDEAL_DTE = {
+    SellWeeklyPuts: _weekly_dte,
+    SellMonthlyPuts: _monthly_dte,
+}
+
+
+class BacktestResult:
+    """
+    The outcome of a vectorized backtest.
+
+    trades : pd.DataFrame, one row per position, in the order they were opened:
+        opened_at, strike, expiration, cost, closed_at, close_value
+        (closed_at and close_value are NaN/NaT for positions which expired worthless)
+    curves : pd.DataFrame, one row per day, indexed by date:
+        cash - as in `strategy.wallet.cash`
+        value - as in `strategy.get_current_value()`
+        market_value - as in `strategy.get_current_market_value()`
+    """
+
+    def __init__(self, trades, curves):
+        self.trades = trades
+        self.curves = curves
+
+    def __repr__(self):
+        return f"BacktestResult({len(self.trades)} trades, {len(self.curves)} days)"
+
+
+class VectorizedBacktest:
+    """
+    A fast path for the simple put-writing strategies (see IDEAL_DTE).
+
+    These strategies always hold a single short put, and only decide anything
+    when opening a new one, so instead of stepping through every day,
+    this jumps straight from one opening to the next (a binary search each),
+    and then values all positions on all days at once with array operations.
+
+    The results are exactly the same as running the strategy with `Strategy.run`.
+    The market is indexed once, and can be reused for many runs.
+    """
+
+    def __init__(self, market):
+        """
+        :param market: a ColumnarMarket (only its arrays are used, not its state)
+        """
+        arrays = market.to_arrays()
+        self.dates = pd.DatetimeIndex(arrays["dates"])
+        self.underlying = arrays["underlying"]
+        self._arrays = arrays
+        self._offsets = arrays["offsets"]
+        self._dates = arrays["dates"].astype("datetime64[ns]")
+        self._strikes = np.asarray(arrays["[STRIKE]"], dtype=float)
+        self._expirations = arrays["[EXPIRE_DATE]"].astype("datetime64[ns]")
+        self._asks = arrays["[P_ASK]"]
+        self._bids = arrays["[P_BID]"]
+
+        # A single sorted key per quote (day, strike, expiration),
+        # so that any set of contracts can be looked up with one binary search
+        days = np.repeat(np.arange(len(self.dates)), np.diff(self._offsets))
+        self._unique_strikes, strike_ranks = np.unique(
+            self._strikes, return_inverse=True
+        )
+        self._unique_expirations, expiration_ranks = np.unique(
+            self._expirations, return_inverse=True
+        )
+        self._keys = self._key(days, strike_ranks, expiration_ranks)
+
+    def _key(self, days, strike_ranks, expiration_ranks):
+        n_strikes = len(self._unique_strikes)
+        n_expirations = len(self._unique_expirations)
+        return (days * n_strikes + strike_ranks) * n_expirations + expiration_ranks
+
+    def lookup(self, days, strikes, expirations):
+        """Find the quotes of many contracts at once.
+
+        :param days: the day numbers (0 for the first day of the market)
+        :param strikes: the strikes of the contracts
+        :param expirations: the expirations of the contracts
+        :returns: The row of each contract in the market's arrays, or -1 if not quoted
+        """
+        strikes = np.asarray(strikes, dtype=float)
+        expirations = np.asarray(expirations, dtype="datetime64[ns]")
+        found = np.ones(len(strikes), dtype=bool)
+        ranks = []
+        for values, unique in (
+            (strikes, self._unique_strikes),
+            (expirations, self._unique_expirations),
+        ):
+            rank = np.searchsorted(unique, values)
+            clipped = np.minimum(rank, len(unique) - 1)
+            found &= (rank < len(unique)) & (unique[clipped] == values)
+            ranks.append(clipped)
+        keys = self._key(np.asarray(days), *ranks)
+        rows = np.searchsorted(self._keys, keys)
+        clipped = np.minimum(rows, len(self._keys) - 1)
+        found &= (rows < len(self._keys)) & (self._keys[clipped] == keys)
+        return np.where(found, rows, -1)
+
+    def _chain(self, day):
+        start, end = self._offsets[day], self._offsets[day + 1]
+        quotes = {
+            name: self._arrays[name][start:end]
+            for name in ("[STRIKE]", "[EXPIRE_DATE]", "[DTE]")
+            if name in self._arrays
+        }
+        return QuoteChain(
+            quotes,
+            self.dates[day],
+            presorted=True,
+            positions=self._arrays["positions"][start:end],
+        )
+
+    def run(self, StrategyClass, capital=0, ideal_strike=1.0, hold_the_strike=False):
+        """Backtest one of the supported strategies, with the given parameters.
+
+        The parameters are the same as for the strategy itself
+        (but without any exit rules, which need to check every day).
+
+        :returns: A BacktestResult
+        :raises TypeError: If the strategy isn't supported (see IDEAL_DTE)
+        """
+        if StrategyClass not in IDEAL_DTE:
+            raise TypeError(f"{StrategyClass.__name__} can't be backtested this way")
+        n_days = len(self.dates)
+        ideal_dtes = IDEAL_DTE[StrategyClass](self.dates)
+        ideal_strikes = self.underlying * ideal_strike
+
+        # Open a new position whenever the previous one has expired
+        opened, rows = [], []
+        day, last_ideal_strike = 0, None
+        while day < n_days:
+            strike = ideal_strikes[day]
+            if hold_the_strike:
+                if last_ideal_strike is not None and last_ideal_strike < strike:
+                    strike = last_ideal_strike
+                last_ideal_strike = strike
+            row = self._offsets[day] + self._chain(day).nearest(strike, ideal_dtes[day])
+            opened.append(day)
+            rows.append(row)
+            # The first day after the expiration
+            day = max(
+                np.searchsorted(self._dates, self._expirations[row], "right"), day + 1
+            )
+        opened = np.array(opened, dtype=int)
+        rows = np.array(rows, dtype=int)
+        strikes = self._strikes[rows]
+        expirations = self._expirations[rows]
+        costs = self._bids[rows]
+
+        # The last day each position is open (it's open on its expiration day too)
+        last = np.searchsorted(self._dates, expirations, "right") - 1
+        lengths = np.maximum(last - opened + 1, 0)
+        trade = np.repeat(np.arange(len(rows)), lengths)
+        days = (
+            opened[trade]
+            + np.arange(lengths.sum())
+            - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        )
+
+        underlying = self.underlying[days]
+        itm = underlying < strikes[trade]
+        intrinsic = np.where(itm, np.abs(strikes[trade] - underlying), 0)
+        expiring = self._dates[days] == expirations[trade]
+        found = self.lookup(days, strikes[trade], expirations[trade])
+
+        # The cost of buying back each position on each day (same as market.close)
+        close_values = np.where(found >= 0, self._asks[found] * -1, np.nan)
+        worthless = expiring & ~itm
+        close_values[worthless] = 0
+
+        # ITM positions are bought back on their expiration day
+        closing = expiring & itm
+        if np.any(closing & (found < 0)):
+            raise IndexError("No quote for buying back an expiring position")
+        closed_at = np.full(len(rows), np.datetime64("NaT"), dtype="datetime64[ns]")
+        closed_at[trade[closing]] = self._dates[days[closing]]
+        trade_close_values = np.full(len(rows), np.nan)
+        trade_close_values[trade[closing]] = close_values[closing]
+
+        # The premiums are received on the day each position is opened,
+        # and the ITM ones are paid for when they're bought back
+        flows = np.zeros(n_days)
+        flows[0] = capital
+        flows[opened] += costs
+        np.add.at(flows, days[closing], close_values[closing])
+        cash = np.cumsum(flows)
+
+        # Once bought back, a position is only in the cash
+        held = ~closing
+        value = cash.copy()
+        value[days[held]] += intrinsic[held] * -1
+        market_value = cash.copy()
+        # Unquoted positions are valued at their intrinsic value,
+        # as in Strategy.get_current_market_value
+        market_value[days[held]] += np.where(
+            np.isnan(close_values), intrinsic * -1, close_values
+        )[held]
+
+        trades = pd.DataFrame(
+            {
+                "opened_at": self.dates[opened],
+                "strike": strikes,
+                "expiration": pd.DatetimeIndex(expirations),
+                "cost": costs,
+                "closed_at": pd.DatetimeIndex(closed_at),
+                "close_value": trade_close_values,
+            }
+        )
+        curves = pd.DataFrame(
+            {"cash": cash, "value": value, "market_value": market_value},
+            index=self.dates,
+        )
+        return BacktestResult(trades, curves)
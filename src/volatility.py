@@ -0,0 +1,199 @@
+import numpy as np
+from scipy.special import ndtr
+
+from src.synthetic import black_scholes
+
+# The range of the implied volatilities searched for
+MIN_VOL, MAX_VOL = 1e-4, 5.0
+
+# The Greeks, as named in the OptionsDX columns, e.g. [P_DELTA]
+GREEKS = ("DELTA", "GAMMA", "THETA", "VEGA", "IV")
+
+
+def implied_vols(prices, underlying, strikes, years, directions, iterations=60):
+    """Solve the implied volatilities of many options at once (by bisection).
+
+    All the options are solved together, as arrays, so it's about as fast
+    as pricing them `iterations` times.
+
+    :param prices: the option prices (e.g. the mid prices)
+    :param directions: -1 for puts, +1 for calls (see `Option.direction`)
+    :returns: An array of volatilities, NaN where there's none (e.g. a price
+        below the intrinsic value, or an expired option)
+    """
+    prices, strikes, years, directions = np.broadcast_arrays(
+        np.asarray(prices, dtype=float),
+        np.asarray(strikes, dtype=float),
+        np.asarray(years, dtype=float),
+        np.asarray(directions, dtype=float),
+    )
+    calls = directions > 0
+    low = np.full(prices.shape, MIN_VOL)
+    high = np.full(prices.shape, MAX_VOL)
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        puts_, calls_ = black_scholes(underlying, strikes, years, middle)
+        # The price grows with the volatility
+        too_low = np.where(calls, calls_, puts_) < prices
+        low = np.where(too_low, middle, low)
+        high = np.where(too_low, high, middle)
+    vols = (low + high) / 2
+
+    intrinsic = np.maximum(directions * (underlying - strikes), 0)
+    puts_, calls_ = black_scholes(
+        underlying, strikes, years, np.full_like(vols, MAX_VOL)
+    )
+    solvable = (
+        (years > 0) & (prices > intrinsic) & (prices < np.where(calls, calls_, puts_))
+    )
+    return np.where(solvable, vols, np.nan)
+
+
+def greeks(underlying, strikes, years, vols, directions, rate=0.0):
+    """The Black-Scholes Greeks of many options at once (any broadcastable shapes).
+
+    Same units as the OptionsDX data: theta per day, vega per volatility point.
+
+    :param directions: -1 for puts, +1 for calls
+    :returns: A dict of "DELTA", "GAMMA", "THETA", "VEGA" and "IV" -> array
+        (NaN where the volatility is, zeros but the delta for expired options)
+    """
+    underlying, strikes, years, vols, directions = np.broadcast_arrays(
+        underlying,
+        np.asarray(strikes, dtype=float),
+        np.asarray(years, dtype=float),
+        np.asarray(vols, dtype=float),
+        np.asarray(directions, dtype=float),
+    )
+    live = years > 0
+    t = np.where(live, years, 1.0)
+    sqrt_t = np.sqrt(t)
+    calls = directions > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(underlying / strikes) + (rate + 0.5 * vols**2) * t) / (
+            vols * sqrt_t
+        )
+        d2 = d1 - vols * sqrt_t
+        density = np.exp(-0.5 * d1**2) / np.sqrt(2 * np.pi)
+        discounted = strikes * np.exp(-rate * t)
+        delta = np.where(calls, ndtr(d1), ndtr(d1) - 1)
+        gamma = density / (underlying * vols * sqrt_t)
+        vega = underlying * density * sqrt_t
+        theta = -underlying * density * vols / (
+            2 * sqrt_t
+        ) - rate * discounted * np.where(calls, ndtr(d2), -ndtr(-d2))
+    itm = directions * (underlying - strikes) > 0
+    return {
+        "DELTA": np.where(live, delta, np.where(itm, directions, 0.0)),
+        "GAMMA": np.where(live, gamma, 0.0),
+        "THETA": np.where(live, theta / 365, 0.0),
+        "VEGA": np.where(live, vega / 100, 0.0),
+        "IV": vols,
+    }
+
+
+class VolSurface:
+    """
+    The implied volatility surface of a single day, to price the contracts
+    which aren't quoted (e.g. a held contract missing from the day's chain).
+
+    The implied volatilities of the out-of-the-money quotes (from their mid prices)
+    are fitted by least squares with a smile in the log-moneyness,
+    which flattens with the time to expiration:
+
+        vol = a + b k + c k^2 + d sqrt(t) + e k sqrt(t),  k = log(strike / underlying)
+
+    Outside of the quoted strikes and expirations, the closest ones are used.
+    """
+
+    def __init__(self, underlying, coefficients, bounds, half_spreads):
+        """
+        :param coefficients: the (a, b, c, d, e) above
+        :param bounds: the ranges of (k, t, vol) that were fitted
+        :param half_spreads: the typical half bid/ask spread of (puts, calls)
+        """
+        self.underlying = underlying
+        self.coefficients = coefficients
+        self.bounds = bounds
+        self.half_spreads = half_spreads
+
+    @staticmethod
+    def _features(k, t):
+        sqrt_t = np.sqrt(t)
+        return np.stack([np.ones_like(k), k, k**2, sqrt_t, k * sqrt_t], axis=-1)
+
+    @classmethod
+    def from_chain(cls, chain, underlying):
+        """Fit the surface of a day's chain (a QuoteChain), both puts and calls if quoted.
+
+        :returns: A VolSurface, or None if there are no quotes to fit
+        """
+        strikes, years = chain.strikes, chain.dte / 365
+        ks, ts, vols, half_spreads = [], [], [], []
+        for direction in (-1, 1):
+            kind = "C" if direction > 0 else "P"
+            bid, ask = f"[{kind}_BID]", f"[{kind}_ASK]"
+            if bid not in chain.quotes or ask not in chain.quotes:
+                half_spreads.append(np.nan)
+                continue
+            bids = chain.column(bid).astype(float)
+            asks = chain.column(ask).astype(float)
+            # Only the out-of-the-money ones, their prices are mostly time value
+            rows = (
+                (bids > 0) & (asks >= bids) & (direction * (strikes - underlying) > 0)
+            )
+            half_spreads.append(
+                np.median((asks - bids)[rows]) / 2 if rows.any() else np.nan
+            )
+            row_vols = implied_vols(
+                (bids[rows] + asks[rows]) / 2,
+                underlying,
+                strikes[rows],
+                years[rows],
+                direction,
+            )
+            solved = ~np.isnan(row_vols)
+            ks.append(np.log(strikes[rows][solved] / underlying))
+            ts.append(years[rows][solved])
+            vols.append(row_vols[solved])
+
+        k, t, vols = (np.concatenate(x) if x else np.zeros(0) for x in (ks, ts, vols))
+        if len(vols) == 0:
+            return None
+        features = cls._features(k, t)
+        if len(vols) > features.shape[1]:
+            coefficients = np.linalg.lstsq(features, vols, rcond=None)[0]
+        else:
+            # Too few to fit a smile, just a flat surface
+            coefficients = np.array([np.median(vols), 0, 0, 0, 0])
+        bounds = ((k.min(), k.max()), (t.min(), t.max()), (vols.min(), vols.max()))
+        return cls(underlying, coefficients, bounds, np.nan_to_num(half_spreads))
+
+    def vols(self, strikes, years):
+        """The volatilities of some contracts, from the fitted surface."""
+        (k_min, k_max), (t_min, t_max), (vol_min, vol_max) = self.bounds
+        k = np.clip(np.log(np.asarray(strikes, float) / self.underlying), k_min, k_max)
+        t = np.clip(np.asarray(years, float), t_min, t_max)
+        return np.clip(self._features(k, t) @ self.coefficients, vol_min, vol_max)
+
+    def prices(self, strikes, years, directions, side):
+        """Price some contracts from the surface, as if they were quoted.
+
+        :param directions: -1 for puts, +1 for calls
+        :param side: "BID" or "ASK", the model (mid) price less or plus a half spread
+        :returns: An array of prices
+        """
+        strikes, years, directions = np.broadcast_arrays(
+            np.asarray(strikes, float),
+            np.asarray(years, float),
+            np.asarray(directions, float),
+        )
+        puts, calls = black_scholes(
+            self.underlying, strikes, years, self.vols(strikes, years)
+        )
+        mids = np.where(directions > 0, calls, puts)
+        put_spread, call_spread = self.half_spreads
+        half_spreads = np.where(directions > 0, call_spread, put_spread)
+        if side == "BID":
+            return np.maximum(mids - half_spreads, 0)
+        return mids + half_spreads
@@ -1,10 +1,22 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from src.options import to_day
+from src.volatility import GREEKS
+
+
 class Position:
-    def __init__(self, option, quantity, cost):
+    __slots__ = ("option", "quantity", "cost", "close_value", "closed_at", "symbol")
+
+    def __init__(self, option, quantity, cost, symbol=None):
         self.option = option
         self.quantity = quantity  # positive for long, negative for short
         self.cost = cost
         self.close_value = None
         self.closed_at = None
+        self.symbol = symbol  # of the underlying, only needed with a PortfolioMarket
 
     def __repr__(self):
         return f"Position({self.option}, {self.quantity}, {self.cost})"
@@ -20,21 +32,206 @@ class Position:
         self.closed_at = date
 
 
+class Ledger:
+    """
+    A list of positions, stored as arrays (one per attribute) for bulk valuation.
+
+    The arrays are a snapshot of the positions when the ledger was created,
+    except for `close`, which closes both the positions and their ledger entries.
+    """
+
+    def __init__(self, positions):
+        self.positions = list(positions)
+        options = [p.option for p in self.positions]
+        self.strikes = np.array([o.strike for o in options], dtype=float)
+        self.expiries = np.array([o.expiry for o in options], dtype=np.int64)
+        self.directions = np.array([o.direction for o in options], dtype=float)
+        self.quantities = np.array([p.quantity for p in self.positions], dtype=float)
+        self.costs = np.array([p.cost for p in self.positions], dtype=float)
+        self.close_values = np.array(
+            [
+                np.nan if p.close_value is None else p.close_value
+                for p in self.positions
+            ],
+            dtype=float,
+        )
+
+    def __len__(self):
+        return len(self.positions)
+
+    def is_itm(self, underlying):
+        return self.directions * (underlying - self.strikes) > 0
+
+    def is_expiring(self, date):
+        return self.expiries == to_day(date)
+
+    def is_expired(self, date):
+        return self.expiries < to_day(date)
+
+    def intrinsic_values(self, underlying):
+        """Same as `Option.intrinsic_value`, for all positions (always positive)."""
+        return np.maximum(self.directions * (underlying - self.strikes), 0)
+
+    def close(self, date, close_values):
+        """Close all the positions, same as `Position.close` for each of them."""
+        self.close_values = np.asarray(close_values, dtype=float)
+        for position, close_value in zip(self.positions, close_values):
+            position.close(date, close_value)
+
+
 class Wallet:
+    """
+    Holds the cash and all the positions, ever.
+
+    Besides the full history in `positions`, the wallet keeps an index
+    of the positions which haven't expired yet, by their expiration.
+    As the date moves forward, the expired ones are moved out of the index,
+    so the daily queries only look at the positions which might still be open.
+    """
+
     def __init__(self, cash=0):
         self.cash = cash
         self.positions = []
+        # Not yet expired positions, by expiry, as lists of (sequence, position),
+        # plus a heap of those expirations, to find the next one to expire
+        self._by_expiration = {}
+        self._expirations = []
+        # Expired positions, as (sequence, position)
+        self._expired = []
+        # The latest day number the index was updated for
+        self._date = None
+        # The day the interest was last paid up to
+        self._interest_day = None
 
     def add_position(self, position, update_cash=True):
         if update_cash:
             self.cash -= position.quantity * position.cost
+        item = (len(self.positions), position)
         self.positions.append(position)
 
+        expiration = position.option.expiry
+        if self._date is not None and expiration < self._date:
+            self._expired.append(item)
+        else:
+            if expiration not in self._by_expiration:
+                self._by_expiration[expiration] = []
+                heapq.heappush(self._expirations, expiration)
+            self._by_expiration[expiration].append(item)
+
+    def accrue_interest(self, date, cash_rate, margin_rate=None):
+        """Add the interest on the cash since the last call (compounded daily, 365 a year).
+
+        Compounded daily, it doesn't matter how often it's called: e.g. only
+        on the days a strategy runs (see Scheduler), or on every day.
+
+        :param cash_rate: the annual rate earned on the cash
+        :param margin_rate: the annual rate paid while the cash is negative
+            (the cash rate, if None)
+        :returns: The interest (negative if paid)
+        """
+        day = to_day(date)
+        days = 0 if self._interest_day is None else max(day - self._interest_day, 0)
+        self._interest_day = max(day, self._interest_day or day)
+        if margin_rate is None or self.cash >= 0:
+            margin_rate = cash_rate
+        interest = self.cash * ((1 + margin_rate / 365) ** days - 1)
+        self.cash += interest
+        return interest
+
+    def _advance(self, date):
+        """Move the positions which have expired by the date out of the index.
+
+        :returns: False if the date is earlier than before (so the index can't be used)
+        """
+        day = to_day(date)
+        if self._date is not None and day < self._date:
+            return False
+        self._date = day
+        while self._expirations and self._expirations[0] < day:
+            expiration = heapq.heappop(self._expirations)
+            self._expired.extend(self._by_expiration.pop(expiration))
+        return True
+
+    def to_frame(self):
+        """All the positions, ever, as a dataframe (one row per position, in order).
+
+        Columns: option (the type), strike, expiration, quantity, cost,
+        close_value and closed_at (NaN/NaT for the positions never closed)
+        """
+        return pd.DataFrame(
+            {
+                "option": [type(p.option).__name__ for p in self.positions],
+                "strike": np.array([p.option.strike for p in self.positions], float),
+                "expiration": pd.DatetimeIndex(
+                    [p.option.expiration for p in self.positions]
+                ),
+                "quantity": np.array([p.quantity for p in self.positions], float),
+                "cost": np.array([p.cost for p in self.positions], float),
+                "close_value": np.array(
+                    [
+                        np.nan if p.close_value is None else p.close_value
+                        for p in self.positions
+                    ],
+                    float,
+                ),
+                "closed_at": pd.DatetimeIndex([p.closed_at for p in self.positions]),
+            }
+        )
+
+    def get_ledger(self, date=None):
+        """Get the positions as a Ledger (the held ones only, if a date is given)."""
+        if date is None:
+            return Ledger(self.positions)
+        return Ledger(self.get_held_positions(date))
+
+    def get_greeks(self, market):
+        """The Greeks of the whole portfolio (the held positions), as of the market's date.
+
+        All the positions are looked up at once, see `market.position_greeks`.
+
+        :returns: A dict of "DELTA", "GAMMA", "THETA" and "VEGA" -> the sum of
+            each position's Greek times its quantity (NaN if any is unknown)
+        """
+        ledger = self.get_ledger(market.current_date)
+        position_greeks = market.position_greeks(ledger)
+        return {
+            greek: float(ledger.quantities @ position_greeks[greek])
+            for greek in GREEKS
+            if greek != "IV"
+        }
+
     def get_expired_positions(self, date):
-        return [p for p in self.positions if p.is_expired(date)]
+        if not self._advance(date):
+            return [p for p in self.positions if p.is_expired(date)]
+        return [p for _, p in sorted(self._expired, key=lambda item: item[0])]
 
     def get_expiring_positions(self, date):
-        return [p for p in self.positions if p.is_expiring(date)]
+        """The positions expiring on the date (except those already closed)."""
+        if not self._advance(date):
+            positions = [p for p in self.positions if p.is_expiring(date)]
+        else:
+            positions = [p for _, p in self._by_expiration.get(self._date, [])]
+        return [p for p in positions if p.closed_at is None]
 
     def get_open_positions(self, date):
-        return [p for p in self.positions if not p.is_expired(date)]
+        """The positions which haven't expired by the date.
+
+        A position closed early still counts as open until the end of the day
+        it was closed on (same as the ones closed on their expiration day).
+        """
+        if not self._advance(date):
+            positions = [p for p in self.positions if not p.is_expired(date)]
+        else:
+            items = [item for items in self._by_expiration.values() for item in items]
+            if len(self._by_expiration) > 1:
+                # Keep the order in which they were added
+                items.sort(key=lambda item: item[0])
+            positions = [p for _, p in items]
+        return [p for p in positions if p.closed_at is None or p.closed_at >= date]
+
+    def get_held_positions(self, date):
+        """The open positions which haven't been closed, i.e. which are still worth something.
+
+        The closed ones are already accounted for in the cash.
+        """
+        return [p for p in self.get_open_positions(date) if p.closed_at is None]